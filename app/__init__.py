@@ -0,0 +1,4 @@
+import time
+
+# When importing the package began; app.main reports its import time against this
+IMPORT_STARTED = time.perf_counter()
@@ -0,0 +1,197 @@
+"""
+Host autotuning of torch intra-op threads and micro-batch size.
+
+``tune`` times the loaded pipeline over a grid of thread counts and batch
+sizes and ``choose_setting`` picks the highest-throughput setting whose p99
+batch latency fits the latency budget. Profiles are saved as JSON with every
+measurement, so a later start with a different budget re-chooses without
+re-benchmarking; a profile measured for another model, backend, CPU count or
+number of serving processes is ignored.
+"""
+
+import json
+import logging
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional, Sequence
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def default_thread_grid() -> List[int]:
+    """Powers of two up to each serving process's share of the CPUs, plus that share itself."""
+    # WORKERS processes each run the model with the chosen thread count at once
+    cpus = max(1, (os.cpu_count() or 1) // max(1, settings.workers))
+    threads = [1]
+    while threads[-1] * 2 <= cpus:
+        threads.append(threads[-1] * 2)
+    if threads[-1] != cpus:
+        threads.append(cpus)
+    return threads
+
+
+def host_key(model_name: str, backend: str) -> Dict[str, Any]:
+    """What a profile was measured on; it only applies to the same combination."""
+    return {"model": model_name, "backend": backend, "cpu_count": os.cpu_count(), "workers": settings.workers}
+
+
+def _set_threads(threads: Optional[int]):
+    if threads is None:
+        return
+    import torch
+    torch.set_num_threads(threads)
+
+
+def _current_threads() -> Optional[int]:
+    # Only report once a model has imported torch; importing it here would stall the scrape
+    torch = sys.modules.get("torch")
+    if torch is None:
+        return None
+    return torch.get_num_threads()
+
+
+def measure(model, texts: List[str], threads: Optional[int], batch_size: int, repeats: int) -> Dict[str, Any]:
+    """Time ``repeats`` model calls on one batch at the given thread count."""
+    _set_threads(threads)
+    batch = (texts * batch_size)[:batch_size]
+    model(batch, batch_size=batch_size, truncation=True)  # warm up this shape
+
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        model(batch, batch_size=batch_size, truncation=True)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    mean = sum(latencies) / len(latencies)
+    return {
+        "intra_op_threads": threads,
+        "batch_size": batch_size,
+        "mean_ms": round(mean * 1000, 3),
+        "p99_ms": round(latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))] * 1000, 3),
+        "throughput": round(batch_size / mean, 2),
+    }
+
+
+def tune(model, model_name: str, backend: str, threads: Optional[Sequence[int]] = None,
+         batch_sizes: Optional[Sequence[int]] = None, sequence_length: Optional[int] = None,
+         repeats: int = 5, latency_budget_ms: Optional[float] = None) -> Dict[str, Any]:
+    """Benchmark the grid on this host and return a profile with the chosen setting.
+
+    ONNX Runtime manages its own threads, so only batch sizes are tuned for it.
+    The thread count in effect afterwards is the chosen one.
+    """
+    threads = list(threads or settings.autotune_threads or default_thread_grid())
+    if backend == "onnx":
+        threads = [None]
+    batch_sizes = list(batch_sizes or settings.autotune_batch_sizes)
+    sequence_length = sequence_length or settings.autotune_sequence_length
+    latency_budget_ms = latency_budget_ms or settings.autotune_latency_budget_ms
+    # Roughly one token per word, leaving room for [CLS] and [SEP]
+    texts = [" ".join(["good"] * max(sequence_length - 2, 1))]
+
+    measurements = []
+    for thread_count in threads:
+        for batch_size in batch_sizes:
+            result = measure(model, texts, thread_count, batch_size, repeats)
+            logger.info(f"Autotune: {result}")
+            measurements.append(result)
+
+    profile = {
+        **host_key(model_name, backend),
+        "sequence_length": sequence_length,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "measurements": measurements,
+    }
+    profile["chosen"] = choose_setting(measurements, latency_budget_ms)
+    _set_threads(profile["chosen"]["intra_op_threads"])
+    return profile
+
+
+def choose_setting(measurements: List[Dict[str, Any]], latency_budget_ms: float) -> Dict[str, Any]:
+    """Highest throughput within the latency budget, or the lowest latency if nothing fits."""
+    within = [m for m in measurements if m["p99_ms"] <= latency_budget_ms]
+    if within:
+        # Prefer fewer threads on ties so co-located workers are not starved
+        best = max(within, key=lambda m: (m["throughput"], -(m["intra_op_threads"] or 0)))
+    else:
+        best = min(measurements, key=lambda m: m["p99_ms"])
+    return {**best, "latency_budget_ms": latency_budget_ms, "within_budget": bool(within)}
+
+
+def save_profile(profile: Dict[str, Any], path: Optional[str] = None):
+    """Write a profile atomically so concurrent readers never see a partial file."""
+    path = path or settings.autotune_profile_path
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(profile, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def load_profile(model_name: str, backend: str, path: Optional[str] = None,
+                 latency_budget_ms: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """Read a saved profile for this host and model, re-choosing for the current budget."""
+    path = path or settings.autotune_profile_path
+    try:
+        with open(path, encoding="utf-8") as f:
+            profile = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable autotune profile {path}: {e}")
+        return None
+
+    expected = host_key(model_name, backend)
+    if any(profile.get(key) != value for key, value in expected.items()):
+        logger.warning(
+            f"Ignoring autotune profile {path}: measured for a different model, backend, host or worker count"
+        )
+        return None
+    profile["chosen"] = choose_setting(
+        profile["measurements"], latency_budget_ms or settings.autotune_latency_budget_ms
+    )
+    return profile
+
+
+def apply_profile(profile: Dict[str, Any], scheduler=None):
+    """Use a profile's thread count in this process and its batch size for micro-batching.
+
+    Models served from the registry other than the default start with the
+    default scheduler's batch size, so they pick up the tuned one as well.
+    """
+    chosen = profile["chosen"]
+    _set_threads(chosen["intra_op_threads"])
+    if scheduler is not None:
+        scheduler.max_batch_size = chosen["batch_size"]
+
+
+def render_metrics(profile: Optional[Dict[str, Any]]) -> str:
+    """The active tuning profile and thread count in Prometheus format."""
+    text = f"""# HELP app_torch_intra_op_threads Torch intra-op threads in this process
+# TYPE app_torch_intra_op_threads gauge
+app_torch_intra_op_threads {_current_threads() or 0}
+"""
+    if profile is None:
+        return text
+    chosen = profile["chosen"]
+    return text + f"""
+# HELP app_autotune_profile Setting chosen by the autotuner (labels hold the setting)
+# TYPE app_autotune_profile gauge
+app_autotune_profile{{intra_op_threads="{chosen["intra_op_threads"] or ""}",batch_size="{chosen["batch_size"]}",within_budget="{str(chosen["within_budget"]).lower()}"}} 1
+
+# HELP app_autotune_expected_throughput Texts per second measured for the chosen setting
+# TYPE app_autotune_expected_throughput gauge
+app_autotune_expected_throughput {chosen["throughput"]}
+
+# HELP app_autotune_expected_p99_seconds p99 batch latency measured for the chosen setting
+# TYPE app_autotune_expected_p99_seconds gauge
+app_autotune_expected_p99_seconds {chosen["p99_ms"] / 1000}
+
+# HELP app_autotune_latency_budget_seconds Latency budget the setting was chosen for
+# TYPE app_autotune_latency_budget_seconds gauge
+app_autotune_latency_budget_seconds {chosen["latency_budget_ms"] / 1000}
+"""
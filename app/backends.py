@@ -0,0 +1,220 @@
+import os
+import re
+from typing import Any, Callable, Dict, List, Optional, Union
+from .config import settings
+from .exceptions import ModelError
+from .timing import current_timer, instrument_pipeline, stage
+
+
+# Files needed to load a sequence classification model and its tokenizer
+MODEL_FILE_PATTERNS = ["*.json", "*.safetensors", "*.txt", "*.model"]
+
+
+def pipeline(*args, **kwargs):
+    """``transformers.pipeline``, imported on first use.
+
+    transformers pulls in torch and takes seconds to import; deferring it
+    keeps ``import app.main`` fast, so workers answer probes before any model
+    loads and tests that mock the model never pay for it.
+    """
+    from transformers import pipeline as transformers_pipeline
+    return transformers_pipeline(*args, **kwargs)
+
+
+def revision_for(model_name: str) -> Optional[str]:
+    """Hub revision pinned for the model: ``model_revision`` applies to ``model_name`` only."""
+    return settings.model_revision if model_name == settings.model_name else None
+
+
+def default_onnx_path(model_name: Optional[str] = None, revision: Optional[str] = None) -> str:
+    """Location of the model's ONNX export produced by scripts/download_model.py.
+
+    Each model and revision gets its own directory, so exports of the default
+    and the ``available_models`` never overwrite one another. ``onnx_model_path``
+    overrides the location for the default model only.
+    """
+    model_name = model_name or settings.model_name
+    revision = revision_for(model_name) if revision is None else revision
+    if settings.onnx_model_path and model_name == settings.model_name:
+        return settings.onnx_model_path
+    directory = re.sub(r"[^A-Za-z0-9._-]+", "--", model_name).strip("-.") or "model"
+    if revision:
+        directory += "@" + re.sub(r"[^A-Za-z0-9._-]+", "--", revision)
+    return os.path.join(settings.model_cache_dir, "onnx", directory, "model.onnx")
+
+
+def resolve_model_path(model_name: str, revision: Optional[str] = None,
+                       offline: Optional[bool] = None) -> str:
+    """Return a local directory holding the model's config, tokenizer and safetensors weights.
+
+    Hub models are resolved inside ``model_cache_dir`` at ``revision`` (the
+    latest one when None). In offline mode nothing is downloaded and missing
+    artifacts fail fast with a ModelError.
+    """
+    offline = settings.model_offline if offline is None else offline
+
+    if os.path.isdir(model_name):
+        model_path = model_name
+    else:
+        from huggingface_hub import snapshot_download
+
+        try:
+            model_path = snapshot_download(
+                model_name,
+                revision=revision,
+                cache_dir=settings.model_cache_dir,
+                allow_patterns=MODEL_FILE_PATTERNS,
+                local_files_only=offline
+            )
+        except Exception as e:
+            if offline:
+                raise ModelError(
+                    f"Model '{model_name}' not found in {settings.model_cache_dir} and offline mode "
+                    f"is enabled; run scripts/download_model.py first ({e})"
+                )
+            raise ModelError(f"Failed to download model '{model_name}': {e}")
+
+    if not any(name.endswith(".safetensors") for name in os.listdir(model_path)):
+        raise ModelError(f"No safetensors weights found for model '{model_name}' in {model_path}")
+    return model_path
+
+
+def load_tokenizer(model_name: str):
+    """The model's tokenizer on its own, for processes that do not hold the model."""
+    from transformers import AutoTokenizer
+    return AutoTokenizer.from_pretrained(
+        resolve_model_path(model_name, revision_for(model_name)), local_files_only=True
+    )
+
+
+def _load_pytorch(model_name: str, model_path: str):
+    """Eager float32 PyTorch pipeline."""
+    # safetensors weights are memory-mapped rather than unpickled into fresh buffers
+    return instrument_pipeline(pipeline(
+        "sentiment-analysis",
+        model=model_path,
+        model_kwargs={"use_safetensors": True}
+    ))
+
+
+def _load_pytorch_int8(model_name: str, model_path: str):
+    """PyTorch pipeline with Linear layers dynamically quantized to int8."""
+    import torch
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+    model = AutoModelForSequenceClassification.from_pretrained(
+        model_path, use_safetensors=True, local_files_only=True
+    )
+    model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return instrument_pipeline(pipeline(
+        "sentiment-analysis",
+        model=model,
+        tokenizer=AutoTokenizer.from_pretrained(model_path, local_files_only=True)
+    ))
+
+
+def _load_onnx(model_name: str, model_path: str):
+    """ONNX Runtime pipeline over the model exported at build time."""
+    return OnnxSentimentPipeline(model_path, default_onnx_path(model_name))
+
+
+class OnnxSentimentPipeline:
+    """Text classification pipeline backed by an ONNX Runtime session.
+
+    Mirrors the transformers pipeline call contract: a list of texts in, one
+    ``{"label", "score"}`` dict per text out, with a ``tokenizer`` attribute.
+    """
+
+    def __init__(self, model_path: str, onnx_path: str):
+        try:
+            import onnxruntime
+        except ImportError:
+            raise ModelError("The onnx backend requires onnxruntime (pip install onnxruntime)")
+        from transformers import AutoConfig, AutoTokenizer
+
+        if not os.path.exists(onnx_path):
+            raise ModelError(
+                f"ONNX model not found at {onnx_path}; run scripts/download_model.py --onnx"
+            )
+
+        self.onnx_path = onnx_path
+        self.tokenizer = AutoTokenizer.from_pretrained(model_path, local_files_only=True)
+        self.id2label = AutoConfig.from_pretrained(model_path, local_files_only=True).id2label
+        self.session = onnxruntime.InferenceSession(onnx_path, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def __call__(self, inputs: Union[str, List[str]], batch_size: int = 1,
+                 truncation: bool = True, **kwargs) -> List[Dict[str, Any]]:
+        import numpy as np
+
+        texts = [inputs] if isinstance(inputs, str) else list(inputs)
+        results = []
+        for start in range(0, len(texts), batch_size):
+            # Pad each batch only to its own longest text
+            with stage("tokenization"):
+                encoded = self.tokenizer(
+                    texts[start:start + batch_size],
+                    padding=True,
+                    truncation=truncation,
+                    return_tensors="np"
+                )
+                feed = {name: value.astype(np.int64) for name, value in encoded.items() if name in self.input_names}
+                timer = current_timer()
+                if timer is not None:
+                    timer.tokens += int(encoded["attention_mask"].sum())
+
+            with stage("forward"):
+                logits = self.session.run(None, feed)[0]
+
+            with stage("postprocess"):
+                logits = logits - logits.max(axis=-1, keepdims=True)
+                probabilities = np.exp(logits)
+                probabilities /= probabilities.sum(axis=-1, keepdims=True)
+                for row in probabilities:
+                    best = int(row.argmax())
+                    results.append({"label": self.id2label[best], "score": float(row[best])})
+        return results
+
+
+def export_onnx(model_name: str, output_path: Optional[str] = None) -> str:
+    """Export the model to ONNX with dynamic batch and sequence axes."""
+    import torch
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+    output_path = output_path or default_onnx_path(model_name)
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+    model_path = resolve_model_path(model_name, revision_for(model_name))
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    model = AutoModelForSequenceClassification.from_pretrained(model_path, use_safetensors=True)
+    model.eval()
+    sample = tokenizer(["export sample", "a second, longer export sample"], padding=True, return_tensors="pt")
+
+    dynamic_axes = {"input_ids": {0: "batch", 1: "sequence"}, "attention_mask": {0: "batch", 1: "sequence"}}
+    torch.onnx.export(
+        model,
+        (sample["input_ids"], sample["attention_mask"]),
+        output_path,
+        input_names=["input_ids", "attention_mask"],
+        output_names=["logits"],
+        dynamic_axes={**dynamic_axes, "logits": {0: "batch"}},
+        opset_version=17,
+        dynamo=False
+    )
+    return output_path
+
+
+# Loaders take the model name and its resolved local directory
+BACKENDS: Dict[str, Callable[[str, str], Any]] = {
+    "pytorch": _load_pytorch,
+    "pytorch-int8": _load_pytorch_int8,
+    "onnx": _load_onnx,
+}
+
+
+def load_pipeline(model_name: str, backend: Optional[str] = None):
+    """Load a sentiment pipeline for the model using the configured inference backend."""
+    backend = backend or settings.inference_backend
+    if backend not in BACKENDS:
+        raise ModelError(f"Unknown inference backend '{backend}'; choose from {sorted(BACKENDS)}")
+    return BACKENDS[backend](model_name, resolve_model_path(model_name, revision_for(model_name)))
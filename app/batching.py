@@ -0,0 +1,537 @@
+import asyncio
+import math
+from collections import defaultdict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Sequence, Set, Union
+from .config import settings
+from .exceptions import DeadlineExceededError, QueueFullError
+from .metrics import Histogram
+from .timing import StageTimer
+
+# Client of requests that do not identify themselves
+ANONYMOUS_CLIENT = "anonymous"
+# Distinct clients given their own metric labels; later ones are reported as "other"
+MAX_CLIENT_LABELS = 100
+
+
+class _Client:
+    """A client's queue and scheduling state.
+
+    ``finish`` is the virtual time at which the client's last queued request
+    completes its weighted share; ``inflight`` counts its texts in batches
+    being collected or predicted.
+    """
+
+    __slots__ = ("name", "label", "weight", "max_inflight", "items", "inflight", "finish")
+
+    def __init__(self, name: str, label: str, weight: float, max_inflight: int):
+        self.name = name
+        self.label = label
+        self.weight = weight
+        self.max_inflight = max_inflight
+        self.items: Deque["_Pending"] = deque()
+        self.inflight = 0
+        self.finish = 0.0
+
+    @property
+    def eligible(self) -> bool:
+        return bool(self.items) and (not self.max_inflight or self.inflight < self.max_inflight)
+
+
+class _Pending:
+    """A queued request: its text, the future its callers await and their timing bookkeeping.
+
+    Identical concurrent requests share one _Pending; ``waiters`` counts the
+    callers still awaiting it and ``timings`` holds each caller's dict.
+    """
+
+    __slots__ = ("text", "future", "enqueued_at", "deadline", "timings", "waiters", "client", "start")
+
+    def __init__(self, text: str, future: asyncio.Future, enqueued_at: float,
+                 deadline: Optional[float], timings: Optional[Dict[str, float]]):
+        self.text = text
+        self.future = future
+        self.enqueued_at = enqueued_at
+        self.deadline = deadline
+        self.timings = [timings] if timings is not None else []
+        self.waiters = 1
+        self.client: Optional[_Client] = None
+        # Virtual start time used to order requests fairly across clients
+        self.start = 0.0
+
+    def join(self, deadline: Optional[float], timings: Optional[Dict[str, float]]):
+        """Add a caller, keeping the request alive until the latest caller's deadline."""
+        self.waiters += 1
+        if self.deadline is not None:
+            self.deadline = None if deadline is None else max(self.deadline, deadline)
+        if timings is not None:
+            self.timings.append(timings)
+
+
+class BatchScheduler:
+    """Collects concurrent prediction requests into micro-batches for the model.
+
+    The queue is bounded: when it is full, ``submit`` fails fast with
+    QueueFullError instead of letting latency grow without limit. Requests whose
+    deadline passes while they are queued are dropped before inference.
+    Concurrent requests for a text that is already queued or being predicted
+    wait on the same pending inference instead of running it again.
+
+    Every client has its own queue. Batches are filled by start-time fair
+    queueing: each request is tagged with a virtual start time that advances
+    by 1/weight per request of its client, and the queued request with the
+    smallest tag goes next. Backlogged clients therefore share the model in
+    proportion to their weights, and a client with a short queue never waits
+    behind another client's backlog. Clients at their in-flight cap are skipped
+    until one of their batches finishes.
+    """
+
+    def __init__(self, model_manager, max_batch_size: Optional[int] = None,
+                 max_wait_ms: Optional[float] = None, max_concurrent_batches: Optional[int] = None,
+                 max_queue_size: Optional[int] = None, coalesce: Optional[bool] = None,
+                 client_weights: Optional[Dict[str, float]] = None,
+                 client_max_inflight: Optional[Dict[str, int]] = None,
+                 client_max_queue_size: Optional[int] = None):
+        self.model_manager = model_manager
+        self.max_batch_size = max_batch_size or settings.batch_max_size
+        self.max_wait_ms = settings.batch_max_wait_ms if max_wait_ms is None else max_wait_ms
+        # One batch in flight per inference worker
+        self.max_concurrent_batches = max_concurrent_batches or settings.inference_workers
+        self.max_queue_size = settings.batch_max_queue_size if max_queue_size is None else max_queue_size
+        self.coalesce = settings.batch_coalesce_identical if coalesce is None else coalesce
+        self.client_weights = settings.client_weights if client_weights is None else client_weights
+        self.client_max_inflight = (
+            settings.client_max_inflight if client_max_inflight is None else client_max_inflight
+        )
+        self.client_max_queue_size = (
+            settings.client_max_queue_size if client_max_queue_size is None else client_max_queue_size
+        )
+        self.rejected = 0
+        self.expired = 0
+        # Requests answered by joining an identical in-flight request
+        self.coalesced = 0
+        # Smoothed duration of one model call, used for Retry-After hints
+        self._batch_seconds = 0.0
+        self._clients: Dict[str, _Client] = {}
+        self._depth = 0
+        self._vtime = 0.0
+        # Set whenever a request is queued or a client's in-flight count drops
+        self._changed: Optional[asyncio.Event] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._inflight: Set[asyncio.Task] = set()
+        # Unresolved requests by text, for single-flight deduplication
+        self._flights: Dict[str, _Pending] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._labels: Dict[str, str] = {}
+        self.client_rejected: Dict[str, int] = defaultdict(int)
+        self.client_latency = Histogram(
+            "app_client_request_seconds",
+            "Time from queueing to prediction per client in seconds",
+            label_names=("client",)
+        )
+
+    @property
+    def queue_depth(self) -> int:
+        """Requests waiting to be batched."""
+        return self._depth
+
+    @property
+    def busy(self) -> bool:
+        """Whether interactive requests are waiting or being predicted."""
+        return self.queue_depth > 0 or bool(self._inflight)
+
+    def retry_after(self) -> int:
+        """Seconds a rejected client should wait: roughly the time to drain the queue."""
+        batches = self.queue_depth / (self.max_batch_size * self.max_concurrent_batches)
+        return max(1, math.ceil(batches * self._batch_seconds))
+
+    def _ensure_worker(self):
+        """Start the batching worker on the running event loop if needed."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._clients = {}
+            self._depth = 0
+            self._vtime = 0.0
+            self._changed = asyncio.Event()
+            self._slots = asyncio.Semaphore(self.max_concurrent_batches)
+            self._flights = {}
+            self._worker = loop.create_task(self._run())
+
+    def close(self):
+        """Stop the batching worker; the scheduler restarts it on the next submit."""
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+
+    def _label(self, name: str) -> str:
+        label = self._labels.get(name)
+        if label is not None:
+            return label
+        # Only the first clients are remembered, so arbitrary client ids cannot grow the map
+        if len(self._labels) >= MAX_CLIENT_LABELS:
+            return "other"
+        self._labels[name] = name
+        return name
+
+    def _client(self, name: str) -> _Client:
+        client = self._clients.get(name)
+        if client is None:
+            client = self._clients[name] = _Client(
+                name, self._label(name),
+                weight=self.client_weights.get(name, settings.client_default_weight),
+                max_inflight=self.client_max_inflight.get(name, settings.client_default_max_inflight)
+            )
+        return client
+
+    def admit(self, count: int = 1, client: str = ANONYMOUS_CLIENT):
+        """Raise QueueFullError unless ``count`` more requests for ``client`` fit in the queues."""
+        state = self._clients.get(client)
+        queued = len(state.items) if state is not None else 0
+        if self.max_queue_size and self._depth + count > self.max_queue_size:
+            self.rejected += 1
+            self.client_rejected[self._label(client)] += 1
+            raise QueueFullError(
+                f"Inference queue is full ({self.max_queue_size} requests waiting)",
+                retry_after=self.retry_after()
+            )
+        if self.client_max_queue_size and queued + count > self.client_max_queue_size:
+            self.rejected += 1
+            self.client_rejected[self._label(client)] += 1
+            raise QueueFullError(
+                f"Too many queued requests for client '{client}' ({self.client_max_queue_size} waiting)",
+                retry_after=self.retry_after()
+            )
+
+    def _enqueue(self, item: _Pending, client: _Client):
+        """Queue a request, or raise QueueFullError if the scheduler or the client is full."""
+        self.admit(1, client.name)
+        # An idle client starts at the current virtual time instead of cashing in unused share
+        item.start = max(self._vtime, client.finish)
+        client.finish = item.start + 1.0 / client.weight
+        item.client = client
+        client.items.append(item)
+        self._depth += 1
+        self._changed.set()
+
+    def _pop(self) -> Optional[_Pending]:
+        """Take the fairest next request from the clients below their in-flight cap."""
+        while True:
+            eligible = [client for client in self._clients.values() if client.eligible]
+            if not eligible:
+                return None
+            client = min(eligible, key=lambda c: c.items[0].start)
+            item = client.items.popleft()
+            self._depth -= 1
+            self._vtime = item.start
+            if item.future.done():
+                # Its callers gave up while it was queued
+                self._forget_if_idle(client)
+                continue
+            client.inflight += 1
+            return item
+
+    def _forget_if_idle(self, client: _Client):
+        # Clients sharing the "other" label are not reported, so drop their state when idle
+        if client.label == "other" and not client.items and not client.inflight:
+            self._clients.pop(client.name, None)
+
+    def _release(self, batch: List[_Pending]):
+        """Return a finished batch's in-flight slots to its clients."""
+        for item in batch:
+            item.client.inflight -= 1
+            self._forget_if_idle(item.client)
+        self._changed.set()
+
+    async def _get(self) -> _Pending:
+        """Wait until some client has a request it is allowed to run."""
+        while True:
+            item = self._pop()
+            if item is not None:
+                return item
+            self._changed.clear()
+            await self._changed.wait()
+
+    async def submit(self, text: str, timings: Optional[Dict[str, float]] = None,
+                     timeout: Optional[float] = None, client: str = ANONYMOUS_CLIENT) -> Dict[str, Any]:
+        """Queue a single text for ``client`` and wait for its prediction.
+
+        If ``timings`` is given it is filled with the request's queue wait and the
+        stage durations of the batch it ran in, in seconds. ``timeout`` is the
+        request's remaining budget in seconds; DeadlineExceededError is raised
+        once it runs out. A request joining an identical in-flight one rides on
+        the first client's place in the queue. Texts the cascade or the caches
+        can answer are returned without queueing, so they never wait for a batch.
+        """
+        self._ensure_worker()
+        self._check_budget(timeout)
+
+        now = self._loop.time()
+        known = (await self.model_manager.lookup([text]))[0]
+        if known is not None:
+            self.client_latency.observe(self._loop.time() - now, self._label(client))
+            return dict(known)
+        return await self._wait(text, timings, timeout, client, now)
+
+    def _check_budget(self, timeout: Optional[float]):
+        if timeout is not None and timeout <= 0:
+            self.expired += 1
+            raise DeadlineExceededError("Request deadline expired before it was queued")
+
+    async def _wait(self, text: str, timings: Optional[Dict[str, float]], timeout: Optional[float],
+                    client: str, now: float) -> Dict[str, Any]:
+        """Queue a text nothing could answer, or join its in-flight twin, and wait for the model."""
+        deadline = now + timeout if timeout is not None else None
+        item = self._flights.get(text) if self.coalesce else None
+        if item is not None and not item.future.done():
+            item.join(deadline, timings)
+            self.coalesced += 1
+        else:
+            item = _Pending(text, self._loop.create_future(), now, deadline, timings)
+            self._enqueue(item, self._client(client))
+            if self.coalesce:
+                self._flights[text] = item
+                item.future.add_done_callback(lambda _: self._land(item))
+
+        try:
+            # Shielded so one caller giving up does not cancel the others' result
+            result = await asyncio.wait_for(asyncio.shield(item.future), timeout)
+        except asyncio.TimeoutError:
+            self.expired += 1
+            raise DeadlineExceededError(f"Request deadline of {timeout * 1000:.0f}ms exceeded")
+        finally:
+            self.client_latency.observe(self._loop.time() - now, self._label(client))
+            item.waiters -= 1
+            if not item.waiters and not item.future.done():
+                # The cancelled future makes _dispatch skip the request if it is still queued
+                item.future.cancel()
+        # Callers sharing a prediction each get their own copy
+        return dict(result)
+
+    async def submit_many(self, texts: List[str], timeout: Optional[float] = None,
+                          client: str = ANONYMOUS_CLIENT) -> List[Dict[str, Any]]:
+        """Queue texts for ``client`` together and wait for all their predictions.
+
+        The whole group is looked up in one call and only the texts nothing
+        could answer are queued. Admission is checked for all of them up front,
+        so a full queue rejects the group before any of it is queued. If one
+        text still fails, the others are cancelled and its error is raised.
+        """
+        self._ensure_worker()
+        self._check_budget(timeout)
+
+        now = self._loop.time()
+        results: List[Optional[Dict[str, Any]]] = [
+            dict(known) if known is not None else None for known in await self.model_manager.lookup(texts)
+        ]
+        missing = [i for i, result in enumerate(results) if result is None]
+        label = self._label(client)
+        for _ in range(len(texts) - len(missing)):
+            self.client_latency.observe(self._loop.time() - now, label)
+        if not missing:
+            return results
+
+        self.admit(len(missing), client)
+        tasks = [asyncio.ensure_future(self._wait(texts[i], None, timeout, client, now)) for i in missing]
+        try:
+            for i, result in zip(missing, await asyncio.gather(*tasks)):
+                results[i] = result
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        return results
+
+    async def submit_batch(self, texts: List[str], timeout: Optional[float] = None,
+                           client: str = ANONYMOUS_CLIENT, bucket_size: Optional[int] = None
+                           ) -> List[Union[Dict[str, Any], Exception]]:
+        """Schedule many texts for ``client`` in length-sorted sub-batches.
+
+        Sub-batches are at most one model batch long, so each runs as a single
+        forward pass padded to its own longest text, and several are queued at
+        once within the client's caps (see ``_bucket_window``). Each goes
+        through the client's fair queue like any other request, so it can share
+        a batch with other clients' texts while they are backlogged. Results
+        come back in input order; a sub-batch whose prediction fails yields the
+        exception for each of its items, while a full queue or an expired
+        deadline fails the whole call.
+        """
+        self._ensure_worker()
+        bucket_size = min(bucket_size or settings.batch_bucket_size, self.max_batch_size)
+        deadline = self._loop.time() + timeout if timeout is not None else None
+        lengths = await self.model_manager.token_lengths(texts)
+        results: List[Union[Dict[str, Any], Exception]] = [None] * len(texts)
+        # FIFO, so the shortest sub-batches are queued first
+        window = asyncio.Semaphore(self._bucket_window(client, bucket_size))
+
+        async def run(bucket: List[int]):
+            async with window:
+                remaining = deadline - self._loop.time() if deadline is not None else None
+                try:
+                    predictions = await self.submit_many([texts[i] for i in bucket], remaining, client)
+                except (QueueFullError, DeadlineExceededError):
+                    raise
+                except Exception as e:
+                    predictions = [e] * len(bucket)
+            for i, prediction in zip(bucket, predictions):
+                results[i] = prediction
+
+        tasks = [asyncio.ensure_future(run(bucket)) for bucket in bucket_by_length(lengths, bucket_size)]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        return results
+
+    def _bucket_window(self, client: str, bucket_size: int) -> int:
+        """Sub-batches of one batch request to queue at once: one per batch slot, within the client's caps."""
+        window = self.max_concurrent_batches
+        max_inflight = self.client_max_inflight.get(client, settings.client_default_max_inflight)
+        for cap in (max_inflight, self.client_max_queue_size):
+            if cap:
+                window = min(window, max(1, cap // bucket_size))
+        return window
+
+    def _land(self, item: _Pending):
+        """Forget a resolved request so later identical texts run (or hit the cache) afresh."""
+        if self._flights.get(item.text) is item:
+            del self._flights[item.text]
+
+    async def _collect_batch(self) -> List[_Pending]:
+        """Wait for one item, then gather more until the batch is full or the wait expires."""
+        batch = [await self._get()]
+        flush_at = self._loop.time() + self.max_wait_ms / 1000
+
+        while len(batch) < self.max_batch_size:
+            # Drain whatever is already queued without waiting
+            item = self._pop()
+            if item is not None:
+                batch.append(item)
+                continue
+
+            remaining = flush_at - self._loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._get(), remaining))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _run(self):
+        """Worker loop that dispatches collected batches while inference slots are free."""
+        while True:
+            # Requests keep queueing while every slot is busy, so batches grow under load
+            await self._slots.acquire()
+            try:
+                batch = await self._collect_batch()
+            except BaseException:
+                self._slots.release()
+                raise
+            task = self._loop.create_task(self._dispatch(batch))
+            # Hold a reference so in-flight batches are not garbage collected
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch(self, batch: List[_Pending]):
+        """Run one model call for a batch and resolve each caller's future."""
+        try:
+            started = self._loop.time()
+            live = []
+            for item in batch:
+                # Skip requests whose callers have gone away or whose deadline passed in the queue
+                if item.future.done():
+                    continue
+                if item.deadline is not None and started >= item.deadline:
+                    self.expired += 1
+                    item.future.set_exception(DeadlineExceededError("Request deadline expired while queued"))
+                    continue
+                live.append(item)
+            if not live:
+                return
+
+            for item in live:
+                self.model_manager.stage_duration.observe(started - item.enqueued_at, "queue_wait")
+                for timings in item.timings:
+                    timings["queue_wait"] = started - item.enqueued_at
+
+            timer = StageTimer()
+            try:
+                # Every text was looked up when it was submitted
+                results = await self.model_manager.predict([item.text for item in live], timer=timer, lookup=False)
+            except Exception as e:
+                for item in live:
+                    if not item.future.done():
+                        item.future.set_exception(e)
+                return
+            finally:
+                elapsed = self._loop.time() - started
+                self._batch_seconds = elapsed if not self._batch_seconds else 0.8 * self._batch_seconds + 0.2 * elapsed
+
+            for item, result in zip(live, results):
+                for timings in item.timings:
+                    timings.update(timer.stages)
+                if not item.future.done():
+                    item.future.set_result(result)
+        finally:
+            self._release(batch)
+            self._slots.release()
+
+    def render_client_metrics(self) -> str:
+        """Per-client queue depth, in-flight texts, rejections and latency in Prometheus format."""
+        depth: Dict[str, int] = defaultdict(int)
+        inflight: Dict[str, int] = defaultdict(int)
+        for client in self._clients.values():
+            depth[client.label] += len(client.items)
+            inflight[client.label] += client.inflight
+
+        lines = [
+            "# HELP app_client_queue_depth Requests waiting for a batch per client",
+            "# TYPE app_client_queue_depth gauge",
+            *(f'app_client_queue_depth{{client="{label}"}} {count}' for label, count in sorted(depth.items())),
+            "",
+            "# HELP app_client_inflight Texts in batches being collected or predicted per client",
+            "# TYPE app_client_inflight gauge",
+            *(f'app_client_inflight{{client="{label}"}} {count}' for label, count in sorted(inflight.items())),
+            "",
+            "# HELP app_client_rejected_total Requests rejected with 429 per client",
+            "# TYPE app_client_rejected_total counter",
+            *(f'app_client_rejected_total{{client="{label}"}} {count}'
+              for label, count in sorted(self.client_rejected.items())),
+            "",
+        ]
+        return "\n".join(lines) + "\n" + self.client_latency.render()
+
+
+def bucket_by_length(lengths: Sequence[int], bucket_size: int) -> List[List[int]]:
+    """Group item indices into sub-batches of similar length, shortest first."""
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    return [order[i:i + bucket_size] for i in range(0, len(order), bucket_size)]
+
+
+async def predict_in_buckets(model_manager, texts: List[str], bucket_size: Optional[int] = None,
+                             pause: Optional[Callable[[], Awaitable[None]]] = None
+                             ) -> List[Union[Dict[str, Any], Exception]]:
+    """Predict many texts in length-sorted sub-batches so each is padded only to its own longest item.
+
+    Results come back in input order; a failed sub-batch yields the exception for each of its items.
+    ``pause``, if given, is awaited before each sub-batch so lower-priority callers can yield.
+    """
+    bucket_size = bucket_size or settings.batch_bucket_size
+    lengths = await model_manager.token_lengths(texts)
+    results: List[Union[Dict[str, Any], Exception]] = [None] * len(texts)
+
+    for bucket in bucket_by_length(lengths, bucket_size):
+        if pause is not None:
+            await pause()
+        try:
+            predictions = await model_manager.predict([texts[i] for i in bucket])
+        except Exception as e:
+            predictions = [e] * len(bucket)
+        for i, prediction in zip(bucket, predictions):
+            results[i] = prediction
+
+    return results
@@ -0,0 +1,195 @@
+"""
+Confidence-gated inference cascade.
+
+A hashed bag-of-words logistic regression, distilled offline from the
+transformer's own labels (scripts/train_cascade.py), answers the texts it is
+confident about; only texts below the confidence threshold are sent to the
+transformer. Scoring a text is a few dictionary lookups, so the first stage
+costs microseconds against the milliseconds of a forward pass.
+"""
+
+import json
+import logging
+import math
+import os
+import random
+import re
+import zlib
+from typing import Any, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+_TOKEN = re.compile(r"[\w']+")
+
+
+def features(text: str, dim: int) -> List[int]:
+    """Hashed unigram and bigram indices present in a text.
+
+    Bigrams let the model tell "good" from "not good". crc32 is used instead of
+    ``hash`` because it is stable across processes.
+    """
+    tokens = _TOKEN.findall(text.lower())
+    grams = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    return sorted({zlib.crc32(gram.encode("utf-8")) % dim for gram in grams})
+
+
+def _sigmoid(z: float) -> float:
+    if z >= 0:
+        return 1.0 / (1.0 + math.exp(-z))
+    e = math.exp(z)
+    return e / (1.0 + e)
+
+
+class CascadeClassifier:
+    """Cheap first-stage classifier that answers only when it is confident.
+
+    ``labels`` are the transformer's two labels, negative class first, so
+    answers look exactly like pipeline output. ``model`` is the identity of the
+    transformer the labels came from; a cascade is only valid in front of it.
+    """
+
+    def __init__(self, model: str, labels: Sequence[str], weights: Dict[int, float], bias: float,
+                 dim: int, threshold: float = 0.95):
+        self.model = model
+        self.labels = list(labels)
+        self.weights = weights
+        self.bias = bias
+        self.dim = dim
+        self.threshold = threshold
+        self.short_circuited = 0
+        self.deferred = 0
+
+    def probability(self, text: str) -> float:
+        """Probability of the second label."""
+        weights = self.weights
+        return _sigmoid(self.bias + sum(weights.get(f, 0.0) for f in features(text, self.dim)))
+
+    def answer(self, probability: float) -> Dict[str, Any]:
+        if probability >= 0.5:
+            return {"label": self.labels[1], "score": probability}
+        return {"label": self.labels[0], "score": 1.0 - probability}
+
+    def classify(self, texts: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """Answer each text at or above the threshold; None marks texts for the transformer."""
+        results: List[Optional[Dict[str, Any]]] = []
+        for text in texts:
+            result = self.answer(self.probability(text))
+            if result["score"] >= self.threshold:
+                results.append(result)
+            else:
+                results.append(None)
+        answered = sum(result is not None for result in results)
+        self.short_circuited += answered
+        self.deferred += len(texts) - answered
+        return results
+
+    @classmethod
+    def train(cls, texts: List[str], labels: List[str], model: str, dim: int = 2 ** 18,
+              epochs: int = 5, learning_rate: float = 0.5, l2: float = 1e-6, seed: int = 0
+              ) -> "CascadeClassifier":
+        """Fit logistic regression to the transformer's labels with plain SGD."""
+        classes = sorted(set(labels))
+        if len(classes) != 2:
+            raise ValueError(f"A cascade needs exactly two labels, got {classes}")
+        examples = [(features(text, dim), label == classes[1]) for text, label in zip(texts, labels)]
+
+        weights: Dict[int, float] = {}
+        bias = 0.0
+        order = list(range(len(examples)))
+        rng = random.Random(seed)
+        for epoch in range(epochs):
+            rng.shuffle(order)
+            rate = learning_rate / (1 + epoch)
+            for i in order:
+                indices, positive = examples[i]
+                error = _sigmoid(bias + sum(weights.get(f, 0.0) for f in indices)) - positive
+                bias -= rate * error
+                for f in indices:
+                    w = weights.get(f, 0.0)
+                    weights[f] = w - rate * (error + l2 * w)
+
+        # Near-zero weights change no decision and only make the file bigger
+        weights = {f: w for f, w in weights.items() if abs(w) >= 1e-4}
+        return cls(model, classes, weights, bias, dim)
+
+    def save(self, path: str):
+        """Write the classifier atomically so a starting worker never reads a partial file."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        data = {
+            "model": self.model,
+            "labels": self.labels,
+            "dim": self.dim,
+            "bias": self.bias,
+            "weights": {str(f): round(w, 6) for f, w in sorted(self.weights.items())},
+        }
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, threshold: float = 0.95) -> "CascadeClassifier":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        weights = {int(f): w for f, w in data["weights"].items()}
+        return cls(data["model"], data["labels"], weights, data["bias"], data["dim"], threshold)
+
+    def get_stats(self) -> dict:
+        """Get the short-circuit counters."""
+        total = self.short_circuited + self.deferred
+        return {
+            "short_circuited": self.short_circuited,
+            "deferred": self.deferred,
+            "ratio": self.short_circuited / total if total else 0.0,
+            "threshold": self.threshold
+        }
+
+
+def load_cascade(path: str, model: str, threshold: float) -> Optional[CascadeClassifier]:
+    """Load a cascade for ``model``; a missing file or one distilled from another model is ignored."""
+    try:
+        cascade = CascadeClassifier.load(path, threshold)
+    except FileNotFoundError:
+        logger.warning(f"Cascade file {path} not found; every text goes to the model")
+        return None
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Ignoring unreadable cascade file {path}: {e}")
+        return None
+    if cascade.model != model:
+        logger.warning(f"Ignoring cascade {path}: trained on {cascade.model}, not {model}")
+        return None
+    return cascade
+
+
+def evaluate(cascade: CascadeClassifier, texts: List[str], labels: List[str],
+             thresholds: Sequence[float]) -> List[Dict[str, float]]:
+    """Measure the cascade against the transformer's labels at each threshold.
+
+    ``short_circuit`` is the fraction of texts the first stage would answer,
+    ``answered_agreement`` how often those answers match the transformer and
+    ``agreement`` the end-to-end agreement, counting deferred texts as matches
+    since the transformer answers them.
+    """
+    answers = [cascade.answer(cascade.probability(text)) for text in texts]
+    rows = []
+    for threshold in thresholds:
+        answered = [answer["label"] == label for answer, label in zip(answers, labels)
+                    if answer["score"] >= threshold]
+        mismatches = len(answered) - sum(answered)
+        rows.append({
+            "threshold": threshold,
+            "short_circuit": len(answered) / len(texts) if texts else 0.0,
+            "answered_agreement": sum(answered) / len(answered) if answered else 1.0,
+            "agreement": 1.0 - mismatches / len(texts) if texts else 1.0,
+        })
+    return rows
+
+
+def choose_threshold(rows: List[Dict[str, float]], min_agreement: float) -> Optional[Dict[str, float]]:
+    """The row short-circuiting the most texts while keeping end-to-end agreement, if any."""
+    within = [row for row in rows if row["agreement"] >= min_agreement]
+    if not within:
+        return None
+    return max(within, key=lambda row: (row["short_circuit"], row["threshold"]))
@@ -1,20 +1,129 @@
 from pydantic_settings import BaseSettings
-from pydantic import ConfigDict
-from typing import Optional
+from pydantic import ConfigDict, NonNegativeInt, PositiveFloat
+from typing import Dict, List, Literal, Optional
 
 
 class Settings(BaseSettings):
     app_name: str = "ML Model Service"
     app_version: str = "1.0.0"
     debug: bool = False
+    # Report per-stage inference timings in a Server-Timing response header
+    server_timing: bool = False
+    # Request logging: fraction of successful requests logged (errors and slow
+    # requests always are) and the size of the queue feeding the log writer
+    log_sample_rate: float = 1.0
+    log_slow_request_ms: float = 1000.0
+    log_queue_size: int = 10000
+    # Admin endpoints (/api/v1/admin/...) require this token in X-Admin-Token;
+    # they are disabled while it is unset
+    admin_token: Optional[str] = None
+    # On-demand profiling: longest capture allowed, and optionally sampling the
+    # stacks of every Nth request into a cumulative profile (0 = off)
+    profile_max_seconds: float = 60.0
+    profile_every_n_requests: int = 0
+    profile_request_interval_ms: float = 1.0
     model_name: str = "distilbert-base-uncased-finetuned-sst-2-english"
     model_cache_dir: str = "./model_cache"
+    # Hub revision of model_name; available_models always track their latest revision
+    model_revision: Optional[str] = None
+    # Load strictly from model_cache_dir without touching the network
+    model_offline: bool = False
+    # Extra models requests may choose with "model", loaded on demand and evicted
+    # least recently used once their estimated weights exceed the budget
+    available_models: List[str] = []
+    model_memory_budget_mb: Optional[float] = None
+    
+    # Inference backend: "pytorch" (float32), "pytorch-int8" (dynamic
+    # quantization) or "onnx" (ONNX Runtime, exported by download_model.py)
+    inference_backend: Literal["pytorch", "pytorch-int8", "onnx"] = "pytorch"
+    onnx_model_path: Optional[str] = None
     max_text_length: int = 1000
     min_text_length: int = 1
     max_request_size: int = 1024 * 1024  # 1MB
     host: str = "0.0.0.0"
     port: int = 8000
     
+    # Pre-fork serving (python -m app.serve): model loaded once, shared by workers
+    workers: int = 1
+    torch_threads_per_worker: Optional[int] = None
+    torch_interop_threads_per_worker: Optional[int] = None
+    memory_report_interval_seconds: float = 60.0
+    
+    # Autotuning of torch intra-op threads and micro-batch size: "load" applies a
+    # saved profile, "startup" also benchmarks the host when no profile matches
+    autotune: Literal["off", "load", "startup"] = "off"
+    autotune_profile_path: str = "./model_cache/autotune.json"
+    autotune_latency_budget_ms: float = 100.0
+    autotune_threads: List[int] = []  # Empty = powers of two up to the CPU count
+    autotune_batch_sizes: List[int] = [1, 4, 8, 16, 32]
+    autotune_sequence_length: int = 64
+    
+    # Dynamic micro-batching for /api/v1/analyze
+    batch_max_size: int = 16
+    batch_max_wait_ms: float = 5.0
+    # Requests allowed to wait for a batch before new ones get 429 (0 = unbounded)
+    batch_max_queue_size: int = 1000
+    # Let concurrent requests for the same text share one pending inference
+    batch_coalesce_identical: bool = True
+    
+    # Weighted fair scheduling across clients, identified by client_header
+    # (requests without it share the "anonymous" client). Backlogged clients get
+    # model time in proportion to their weights; client_max_inflight caps the
+    # texts a client may have in batches at once (0 = no cap) and
+    # client_max_queue_size the requests it may have waiting (0 = no cap).
+    # Weights must be positive: virtual finish times advance by 1 / weight
+    client_header: str = "X-Client-Id"
+    client_weights: Dict[str, PositiveFloat] = {}
+    client_default_weight: PositiveFloat = 1.0
+    client_max_inflight: Dict[str, NonNegativeInt] = {}
+    client_default_max_inflight: NonNegativeInt = 0
+    client_max_queue_size: int = 0
+    
+    # Long-document mode (/api/v1/analyze/document): overlapping token windows
+    # capped at the model's maximum length
+    document_window_tokens: int = 512
+    document_window_stride: int = 64
+    # Sub-batch size for /api/v1/analyze/batch after sorting texts by token length
+    batch_bucket_size: int = 32
+    
+    # Bulk jobs (/api/v1/jobs): state and results checkpointed under jobs_dir and
+    # scored in the background, yielding to interactive requests for up to
+    # job_max_yield_ms before each sub-batch
+    jobs_enabled: bool = True
+    jobs_dir: str = "./jobs"
+    job_chunk_size: int = 256
+    job_batch_size: int = 32
+    job_poll_seconds: float = 1.0
+    job_max_yield_ms: float = 1000.0
+    job_max_upload_bytes: int = 1024 * 1024 * 1024
+    # Finished jobs and their results are deleted this long after finishing (0 = keep)
+    job_retention_hours: float = 168.0
+    
+    # Load and warm up the model in the background at startup
+    eager_model_loading: bool = True
+    warmup_sequence_lengths: List[int] = [16, 64, 128, 256, 512]
+    
+    # In-memory LRU+TTL cache of predictions
+    prediction_cache_enabled: bool = False
+    prediction_cache_max_size: int = 10000
+    prediction_cache_ttl_seconds: float = 3600.0
+    
+    # On-disk result store shared by every worker on the node and kept across
+    # restarts (disabled when no path is set)
+    result_store_path: Optional[str] = None
+    result_store_max_entries: int = 1_000_000
+    
+    # Confidence-gated cascade: a cheap classifier distilled from the default
+    # model (scripts/train_cascade.py) answers texts it is at least
+    # cascade_threshold confident about; the rest go to the model
+    cascade_path: Optional[str] = None
+    cascade_threshold: float = 0.95
+    
+    # Executor used for model loading and inference ("thread" shares one
+    # pipeline, "process" gives every worker its own copy of the model)
+    inference_executor: Literal["thread", "process"] = "thread"
+    inference_workers: int = 1
+    
     # Optional API keys (from environment)
     google_api_key: Optional[str] = None
     
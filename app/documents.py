@@ -0,0 +1,92 @@
+from collections import Counter
+from typing import Any, Dict, List, Sequence, Tuple
+from .exceptions import ModelError, ValidationError
+
+# How window predictions are combined into a document label
+AGGREGATION_STRATEGIES = ("mean", "max", "majority")
+
+
+def split_windows(tokenizer, text: str, window_tokens: int, stride: int) -> List[Tuple[str, int]]:
+    """Split text into overlapping windows that each fit in ``window_tokens`` model tokens.
+
+    The document is tokenized once and sliced into windows of token ids that
+    overlap by ``stride`` tokens; each window is mapped back to its span of the
+    original text through the tokenizer's character offsets. Returns
+    ``(window_text, token_count)`` pairs, so work grows linearly with length.
+    Without a tokenizer, whitespace-separated words stand in for tokens.
+    """
+    if tokenizer is None:
+        words = text.split()
+        pieces, body = words, window_tokens
+        offsets = None
+    else:
+        body = window_tokens - tokenizer.num_special_tokens_to_add(pair=False)
+        fast = getattr(tokenizer, "is_fast", False)
+        encoded = tokenizer(text, add_special_tokens=False, return_offsets_mapping=fast, verbose=False)
+        pieces = encoded["input_ids"]
+        offsets = encoded["offset_mapping"] if fast else None
+
+    if stride >= body:
+        raise ModelError(f"Window stride ({stride}) must be smaller than the window body ({body} tokens)")
+    if not pieces:
+        return [(text, 0)]
+
+    windows = []
+    step = body - stride
+    for start in range(0, len(pieces), step):
+        end = min(start + body, len(pieces))
+        if tokenizer is None:
+            window = " ".join(pieces[start:end])
+        elif offsets is not None:
+            window = text[offsets[start][0]:offsets[end - 1][1]]
+        else:
+            window = tokenizer.decode(pieces[start:end])
+        windows.append((window, end - start))
+        if end == len(pieces):
+            break
+    return windows
+
+
+def _distribution(result: Dict[str, Any], labels: Sequence[str]) -> Dict[str, float]:
+    """Expand a top-1 prediction into a distribution, spreading the remainder over the other labels."""
+    others = [label for label in labels if label != result["label"]]
+    remainder = (1.0 - result["score"]) / len(others) if others else 0.0
+    distribution = {label: remainder for label in others}
+    distribution[result["label"]] = result["score"]
+    return distribution
+
+
+def aggregate_windows(results: List[Dict[str, Any]], weights: Sequence[int],
+                      strategy: str = "mean") -> Tuple[str, float]:
+    """Combine per-window predictions into a document label and score.
+
+    ``mean`` averages the windows' label distributions weighted by their token
+    counts, ``max`` takes the single most confident window and ``majority``
+    takes the most common window label, scored by the mean confidence of the
+    windows that voted for it.
+    """
+    if strategy not in AGGREGATION_STRATEGIES:
+        raise ValidationError(f"Unknown aggregation strategy '{strategy}'; choose from {list(AGGREGATION_STRATEGIES)}")
+
+    if strategy == "max":
+        best = max(results, key=lambda result: result["score"])
+        return best["label"], best["score"]
+
+    if strategy == "majority":
+        votes = Counter(result["label"] for result in results)
+        # Ties go to the label whose windows were more confident in total
+        label = max(votes, key=lambda name: (
+            votes[name], sum(result["score"] for result in results if result["label"] == name)
+        ))
+        scores = [result["score"] for result in results if result["label"] == label]
+        return label, sum(scores) / len(scores)
+
+    labels = sorted({result["label"] for result in results})
+    # Windows with no tokens (e.g. an all-whitespace document) still count once
+    weights = [max(weight, 1) for weight in weights]
+    totals = {label: 0.0 for label in labels}
+    for result, weight in zip(results, weights):
+        for label, probability in _distribution(result, labels).items():
+            totals[label] += probability * weight
+    label = max(totals, key=totals.get)
+    return label, totals[label] / sum(weights)
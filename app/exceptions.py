@@ -10,4 +10,27 @@ class ValidationError(MLServiceError):
 
 class ModelError(MLServiceError):
     """Raised when model loading or prediction fails."""
-    pass
\ No newline at end of file
+    pass
+
+
+class QueueFullError(MLServiceError):
+    """Raised when the inference queue is at capacity."""
+    
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class DeadlineExceededError(MLServiceError):
+    """Raised when a request's deadline passes before it could be served."""
+    pass
+
+
+class AuthorizationError(MLServiceError):
+    """Raised when an admin endpoint is called without a valid admin token."""
+    pass
+
+
+class NotFoundError(MLServiceError):
+    """Raised when a requested resource, such as a bulk job, does not exist."""
+    pass
@@ -0,0 +1,405 @@
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import re
+import time
+import uuid
+from typing import IO, Any, Dict, Iterator, List, Optional, Tuple
+from .batching import predict_in_buckets
+from .config import settings
+from .exceptions import NotFoundError, ValidationError
+
+logger = logging.getLogger(__name__)
+
+JOB_STATUSES = ("queued", "running", "completed", "failed", "cancelled")
+# Statuses a worker still has to (re)start work on
+PENDING_STATUSES = ("queued", "running")
+
+_JOB_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+class JobManager:
+    """Scores bulk jobs in the background, keeping their state on local disk.
+
+    Each job is a directory holding its input as JSONL, the results written so
+    far and ``state.json``, which checkpoints how far the input has been read
+    and the results written. A worker holds an exclusive file lock on the job
+    it is processing, so several worker processes can share the directory, and
+    a restarted process resumes unfinished jobs from their last checkpoint
+    instead of rescoring them.
+
+    Jobs run at low priority: before every sub-batch the worker waits (up to
+    ``max_yield_ms``) while the model's interactive scheduler has requests
+    queued or in flight. Finished jobs are deleted ``retention_hours`` after
+    they finish.
+    """
+
+    def __init__(self, registry, directory: Optional[str] = None, chunk_size: Optional[int] = None,
+                 batch_size: Optional[int] = None, poll_seconds: Optional[float] = None,
+                 max_yield_ms: Optional[float] = None, retention_hours: Optional[float] = None):
+        self.registry = registry
+        self.directory = directory or settings.jobs_dir
+        self.chunk_size = chunk_size or settings.job_chunk_size
+        self.batch_size = batch_size or settings.job_batch_size
+        self.poll_seconds = poll_seconds or settings.job_poll_seconds
+        self.max_yield_ms = settings.job_max_yield_ms if max_yield_ms is None else max_yield_ms
+        self.retention_hours = settings.job_retention_hours if retention_hours is None else retention_hours
+        self.texts_scored = 0
+        self.jobs_finished = 0
+        self.jobs_expired = 0
+        self.yield_seconds = 0.0
+        self._worker: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+
+    # Job files
+
+    def _job_dir(self, job_id: str) -> str:
+        if not _JOB_ID.match(job_id):
+            raise NotFoundError(f"Job '{job_id}' not found")
+        return os.path.join(self.directory, job_id)
+
+    def _path(self, job_id: str, name: str) -> str:
+        return os.path.join(self._job_dir(job_id), name)
+
+    def _read_state(self, job_id: str) -> Dict[str, Any]:
+        try:
+            with open(self._path(job_id, "state.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise NotFoundError(f"Job '{job_id}' not found")
+
+    def _write_state(self, state: Dict[str, Any]):
+        """Replace the state file atomically so a crash never leaves it half written."""
+        state["updated_at"] = time.time()
+        path = self._path(state["id"], "state.json")
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(f"{path}.tmp", path)
+
+    def _create(self, write_input, model: Optional[str], text_field: str,
+                id_field: Optional[str]) -> Dict[str, Any]:
+        """Create a job directory, let ``write_input`` fill input.jsonl and queue the job."""
+        job_id = uuid.uuid4().hex
+        os.makedirs(self._job_dir(job_id))
+        try:
+            with open(self._path(job_id, "input.jsonl"), "wb") as f:
+                total = write_input(f)
+        except BaseException:
+            self._remove(job_id)
+            raise
+        now = time.time()
+        state = {
+            "id": job_id, "status": "queued", "model": model,
+            "text_field": text_field, "id_field": id_field,
+            "total": total, "processed": 0, "failed": 0,
+            "next_line": 0, "input_offset": 0, "output_bytes": 0,
+            "created_at": now, "started_at": None, "finished_at": None, "error": None,
+        }
+        self._write_state(state)
+        return state
+
+    def _remove(self, job_id: str):
+        directory = self._job_dir(job_id)
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+
+    def create_from_texts(self, texts: List[str], model: Optional[str] = None) -> Dict[str, Any]:
+        def write_input(f: IO[bytes]) -> int:
+            for text in texts:
+                f.write(json.dumps({"text": text}).encode("utf-8") + b"\n")
+            return len(texts)
+
+        return self._create(write_input, model, "text", None)
+
+    def create_from_file(self, source: IO[bytes], text_field: str = "text", id_field: Optional[str] = None,
+                         model: Optional[str] = None, max_bytes: Optional[int] = None) -> Dict[str, Any]:
+        """Copy an uploaded JSONL file into a new job, counting its non-empty lines."""
+        max_bytes = max_bytes or settings.job_max_upload_bytes
+
+        def write_input(f: IO[bytes]) -> int:
+            total, size = 0, 0
+            for line in source:
+                size += len(line)
+                if size > max_bytes:
+                    raise ValidationError(f"Upload exceeds {max_bytes} bytes")
+                if not line.strip():
+                    continue
+                f.write(line if line.endswith(b"\n") else line + b"\n")
+                total += 1
+            if not total:
+                raise ValidationError("Uploaded file has no lines")
+            return total
+
+        return self._create(write_input, model, text_field, id_field)
+
+    async def submit_texts(self, texts: List[str], model: Optional[str] = None) -> Dict[str, Any]:
+        """Queue a job over a list of texts."""
+        self.registry.get(model)  # Reject unknown models before writing anything
+        loop = asyncio.get_running_loop()
+        state = await loop.run_in_executor(None, self.create_from_texts, texts, model)
+        self._notify()
+        return self.describe(state)
+
+    async def submit_file(self, source: IO[bytes], text_field: str = "text", id_field: Optional[str] = None,
+                          model: Optional[str] = None) -> Dict[str, Any]:
+        """Queue a job over an uploaded JSONL file."""
+        self.registry.get(model)
+        loop = asyncio.get_running_loop()
+        state = await loop.run_in_executor(None, self.create_from_file, source, text_field, id_field, model)
+        self._notify()
+        return self.describe(state)
+
+    def describe(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """Public view of a job's state."""
+        status = state["status"]
+        if status in PENDING_STATUSES and os.path.exists(self._path(state["id"], "cancel")):
+            status = "cancelled"
+        return {
+            "id": state["id"],
+            "status": status,
+            "model": state["model"] or self.registry.default_name,
+            "total": state["total"],
+            "processed": state["processed"],
+            "failed": state["failed"],
+            "progress": state["processed"] / state["total"] if state["total"] else 1.0,
+            "created_at": state["created_at"],
+            "updated_at": state["updated_at"],
+            "finished_at": state["finished_at"],
+            "error": state["error"],
+        }
+
+    def status(self, job_id: str) -> Dict[str, Any]:
+        return self.describe(self._read_state(job_id))
+
+    def iter_results(self, job_id: str, block_size: int = 1024 * 1024) -> Iterator[bytes]:
+        """Yield the results up to the last checkpoint.
+
+        Lines past the checkpoint may still be rewritten after a restart, so they are never served.
+        """
+        remaining = self._read_state(job_id)["output_bytes"]
+        if not remaining:
+            return
+        with open(self._path(job_id, "results.jsonl"), "rb") as f:
+            while remaining > 0:
+                block = f.read(min(block_size, remaining))
+                if not block:
+                    break
+                remaining -= len(block)
+                yield block
+
+    def cancel(self, job_id: str) -> Dict[str, Any]:
+        """Ask whichever worker holds the job to stop after its current chunk."""
+        state = self._read_state(job_id)
+        if state["status"] in PENDING_STATUSES:
+            # A marker file rather than a state change: the processing worker owns state.json
+            open(self._path(job_id, "cancel"), "w").close()
+        return self.describe(state)
+
+    # Processing
+
+    def start(self):
+        """Start the background worker on the running event loop."""
+        if self._worker is None or self._worker.done():
+            os.makedirs(self.directory, exist_ok=True)
+            self._wake = asyncio.Event()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    def _notify(self):
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _run(self):
+        """Process pending jobs oldest first, sleeping until a job arrives or the next poll."""
+        loop = asyncio.get_running_loop()
+        while True:
+            # The scan reads every job's state file, so it stays off the event loop
+            claimed = await loop.run_in_executor(None, self._claim)
+            if claimed is None:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+                continue
+            state, lock = claimed
+            try:
+                await self.process(state)
+            except Exception:
+                logger.exception(f"Job {state['id']} worker crashed")
+            finally:
+                lock.close()
+
+    def _claim(self) -> Optional[Tuple[Dict[str, Any], IO]]:
+        """Lock the oldest pending job no other worker is processing, deleting expired finished jobs."""
+        try:
+            job_ids = [name for name in os.listdir(self.directory) if _JOB_ID.match(name)]
+        except FileNotFoundError:
+            return None
+        pending = []
+        expire_before = time.time() - self.retention_hours * 3600
+        for job_id in job_ids:
+            try:
+                state = self._read_state(job_id)
+            except (NotFoundError, ValueError):
+                continue  # Still being created, or removed
+            if state["status"] in PENDING_STATUSES:
+                pending.append(state)
+            elif self.retention_hours and state["finished_at"] and state["finished_at"] < expire_before:
+                self._expire(job_id)
+
+        for state in sorted(pending, key=lambda s: s["created_at"]):
+            lock = open(self._path(state["id"], "lock"), "w")
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock.close()
+                continue
+            # Re-read under the lock: another worker may have finished it meanwhile
+            state = self._read_state(state["id"])
+            if state["status"] in PENDING_STATUSES:
+                return state, lock
+            lock.close()
+        return None
+
+    def _expire(self, job_id: str):
+        """Delete a finished job past its retention, unless another worker is already doing so."""
+        try:
+            with open(self._path(job_id, "lock"), "w") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                self._remove(job_id)
+        except OSError:
+            return  # Locked, or removed by another worker meanwhile
+        self.jobs_expired += 1
+        logger.info(f"Deleted job {job_id} after its {self.retention_hours}h retention")
+
+    async def _yield_to_interactive(self, scheduler):
+        """Wait while interactive requests are queued or running, up to ``max_yield_ms``."""
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        deadline = start + self.max_yield_ms / 1000
+        while scheduler.busy and loop.time() < deadline:
+            await asyncio.sleep(0.005)
+        self.yield_seconds += loop.time() - start
+
+    def _read_chunk(self, source: IO[bytes], state: Dict[str, Any]) -> List[Tuple[int, Any, Optional[str], Optional[str]]]:
+        """Read up to ``chunk_size`` non-empty lines as (line, id, text, error) items."""
+        items = []
+        while len(items) < self.chunk_size:
+            raw = source.readline()
+            if not raw:
+                break
+            line = state["next_line"]
+            state["next_line"] += 1
+            if not raw.strip():
+                continue
+            record_id, text, error = None, None, None
+            try:
+                record = json.loads(raw)
+                record_id = record.get(state["id_field"]) if state["id_field"] else None
+                text = record.get(state["text_field"])
+                if not isinstance(text, str) or not settings.min_text_length <= len(text) <= settings.max_text_length:
+                    error = (f"'{state['text_field']}' must be a string of {settings.min_text_length} "
+                             f"to {settings.max_text_length} characters")
+            except (ValueError, AttributeError) as e:
+                error = f"Invalid JSON: {e}"
+            items.append((line, record_id, text, error))
+        return items
+
+    async def _score(self, state: Dict[str, Any], items) -> List[Dict[str, Any]]:
+        valid = [i for i, item in enumerate(items) if item[3] is None]
+        predictions: List[Any] = []
+        if valid:
+            async with self.registry.acquire(state["model"]) as entry:
+                predictions = await predict_in_buckets(
+                    entry.manager, [items[i][2] for i in valid], self.batch_size,
+                    pause=lambda: self._yield_to_interactive(entry.scheduler)
+                )
+        by_item = dict(zip(valid, predictions))
+
+        records = []
+        for i, (line, record_id, _, error) in enumerate(items):
+            record: Dict[str, Any] = {"line": line}
+            if record_id is not None:
+                record["id"] = record_id
+            prediction = by_item.get(i)
+            if error is not None:
+                record["error"] = error
+            elif isinstance(prediction, Exception):
+                record["error"] = f"Model prediction failed: {prediction}"
+            else:
+                record["label"] = prediction["label"]
+                record["score"] = prediction["score"]
+            records.append(record)
+        return records
+
+    @staticmethod
+    def _append(out: IO[bytes], records: List[Dict[str, Any]]) -> int:
+        """Append result records durably, returning the new size of the results file."""
+        out.write(b"".join(json.dumps(record).encode("utf-8") + b"\n" for record in records))
+        # The checkpoint written next must never count bytes a crash could lose
+        out.flush()
+        os.fsync(out.fileno())
+        return out.tell()
+
+    async def process(self, state: Dict[str, Any]):
+        """Score a job from its last checkpoint until it finishes, fails or is cancelled."""
+        job_id = state["id"]
+        if state["status"] == "running":
+            logger.info(f"Resuming job {job_id} at line {state['next_line']}")
+        state["status"] = "running"
+        state["started_at"] = state["started_at"] or time.time()
+        # File reads, writes and fsyncs run in the executor so they never stall requests
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._write_state, state)
+
+        results_path = self._path(job_id, "results.jsonl")
+        try:
+            with open(self._path(job_id, "input.jsonl"), "rb") as source, \
+                    open(results_path, "r+b" if os.path.exists(results_path) else "wb") as out:
+                # Drop results written after the last checkpoint so lines are never duplicated
+                out.truncate(state["output_bytes"])
+                out.seek(state["output_bytes"])
+                source.seek(state["input_offset"])
+
+                while True:
+                    if os.path.exists(self._path(job_id, "cancel")):
+                        state["status"] = "cancelled"
+                        break
+                    items = await loop.run_in_executor(None, self._read_chunk, source, state)
+                    if not items:
+                        state["status"] = "completed"
+                        break
+                    records = await self._score(state, items)
+                    output_bytes = await loop.run_in_executor(None, self._append, out, records)
+                    failed = sum(1 for record in records if "error" in record)
+                    state["processed"] += len(records)
+                    state["failed"] += failed
+                    state["input_offset"] = source.tell()
+                    state["output_bytes"] = output_bytes
+                    await loop.run_in_executor(None, self._write_state, state)
+                    self.texts_scored += len(records) - failed
+        except asyncio.CancelledError:
+            # Shutdown: the last checkpoint stays "running" and is resumed on restart
+            raise
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {e}")
+            state["status"] = "failed"
+            state["error"] = str(e)
+
+        state["finished_at"] = time.time()
+        await loop.run_in_executor(None, self._write_state, state)
+        self.jobs_finished += 1
@@ -0,0 +1,112 @@
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional, TextIO
+from .config import settings
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - exercised only without orjson installed
+    orjson = None
+
+
+def dumps(record: Dict[str, Any]) -> str:
+    """Serialize a log record to JSON, with orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(record, default=str).decode()
+    return json.dumps(record, default=str)
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats dict messages as one JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        if isinstance(record.msg, dict):
+            return dumps(record.msg)
+        return super().format(record)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """Queue handler that never blocks: records are dropped and counted when the queue is full."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Leave formatting to the listener thread so serialization stays off the event loop
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class AccessLog:
+    """Structured request log written by a background thread.
+
+    Successful requests are sampled at ``sample_rate``; error responses and
+    requests slower than ``slow_request_ms`` are always logged. The writer
+    thread is started lazily in each process, so it survives pre-forking.
+    """
+
+    def __init__(self, sample_rate: Optional[float] = None, slow_request_ms: Optional[float] = None,
+                 queue_size: Optional[int] = None, stream: Optional[TextIO] = None,
+                 name: str = "app.access"):
+        self.sample_rate = settings.log_sample_rate if sample_rate is None else sample_rate
+        self.slow_request_ms = settings.log_slow_request_ms if slow_request_ms is None else slow_request_ms
+        self.queue_size = queue_size or settings.log_queue_size
+        self.logger = logging.getLogger(name)
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        self.output = logging.StreamHandler(stream or sys.stderr)
+        self.output.setFormatter(JsonFormatter())
+        self.handler: Optional[DroppingQueueHandler] = None
+        self._listener: Optional[QueueListener] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def dropped(self) -> int:
+        """Records dropped because the writer could not keep up."""
+        return self.handler.dropped if self.handler is not None else 0
+
+    def should_log(self, status_code: int, duration_ms: float) -> bool:
+        """Decide whether a finished request is logged."""
+        if status_code >= 400 or duration_ms >= self.slow_request_ms:
+            return True
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    def _start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # A forked child inherits the parent's queue but not its writer thread
+            if self.handler is not None:
+                self.logger.removeHandler(self.handler)
+            self.handler = DroppingQueueHandler(queue.Queue(self.queue_size))
+            self.logger.addHandler(self.handler)
+            self._listener = QueueListener(self.handler.queue, self.output)
+            self._listener.start()
+            self._pid = os.getpid()
+
+    def log(self, record: Dict[str, Any]):
+        """Hand a record to the writer thread without blocking."""
+        if self._pid != os.getpid():
+            self._start()
+        self.logger.info(record)
+
+    def stop(self):
+        """Flush queued records and stop the writer thread."""
+        with self._lock:
+            if self._listener is not None and self._pid == os.getpid():
+                self._listener.stop()
+            self._listener = None
+            self._pid = None
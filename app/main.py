@@ -1,48 +1,189 @@
-from fastapi import FastAPI, Request, Response
-from fastapi.responses import JSONResponse, PlainTextResponse
+from contextlib import asynccontextmanager
+from . import IMPORT_STARTED
+from fastapi import FastAPI, File, Form, Request, Response, UploadFile
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from .config import settings
-from .schemas import SentimentRequest, SentimentResponse
+from . import autotune
+from .schemas import (
+    SentimentRequest, SentimentResponse,
+    BatchSentimentRequest, BatchSentimentResponse, BatchItemResult,
+    DocumentSentimentRequest, DocumentSentimentResponse, DocumentWindowResult,
+    JobRequest, JobStatusResponse
+)
 from .models import ModelManager
-from .exceptions import MLServiceError, ModelError, ValidationError
-from .middleware import log_requests, MetricsCollector, MetricsMiddleware
-import uuid
+from .batching import ANONYMOUS_CLIENT, BatchScheduler
+from .documents import aggregate_windows
+from .exceptions import (
+    AuthorizationError, DeadlineExceededError, MLServiceError, ModelError, NotFoundError,
+    QueueFullError, ValidationError
+)
+from .registry import ModelRegistry
+from .jobs import JobManager
+from .middleware import access_log, get_request_id, MetricsCollector, ObservabilityMiddleware
+from .profiling import (
+    PROFILE_MODES, RequestProfiler, RequestProfilingMiddleware, capture_cpu_profile, capture_torch_trace
+)
+from .system import node_memory, process_memory, worker_id
+from .timing import server_timing_header
+from pydantic import ValidationError as PydanticValidationError
+import asyncio
+import hmac
+import logging
+import re
+import time
+from functools import partial
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Clients send their remaining time budget in milliseconds
+DEADLINE_HEADER = "X-Request-Deadline-Ms"
+ADMIN_TOKEN_HEADER = "X-Admin-Token"
+# Client ids become metric labels, so keep them short and free of quoting
+CLIENT_ID_PATTERN = re.compile(r"^[A-Za-z0-9._:-]{1,64}$")
+
+
+async def apply_autotune_profile():
+    """Apply the saved tuning profile, benchmarking this host first in startup mode."""
+    if model_manager.executor_type == "process":
+        logger.warning("Autotuning needs the in-process model (INFERENCE_EXECUTOR=thread); skipping")
+        return
+    profile = autotune.load_profile(model_manager.model_name, model_manager.backend)
+    if profile is None and settings.autotune == "startup":
+        model = await model_manager.get_model()
+        loop = asyncio.get_running_loop()
+        profile = await loop.run_in_executor(
+            model_manager._get_executor(),
+            partial(autotune.tune, model, model_manager.model_name, model_manager.backend)
+        )
+        autotune.save_profile(profile)
+    if profile is not None:
+        autotune.apply_profile(profile, batch_scheduler)
+        app.state.autotune_profile = profile
+        logger.info(f"Autotune profile applied: {profile['chosen']}")
+
+
+async def load_model_in_background():
+    """Load and warm up the model so readiness only passes once it can serve traffic."""
+    try:
+        if settings.autotune != "off":
+            await apply_autotune_profile()
+        await model_manager.warmup()
+        app.state.model_loaded = True
+        logger.info(
+            f"Model ready: loaded in {model_manager.load_seconds:.2f}s, "
+            f"warmed up in {model_manager.warmup_seconds:.2f}s, "
+            f"first inference after {model_manager.time_to_first_inference:.2f}s"
+        )
+    except Exception as e:
+        app.state.model_load_error = str(e)
+        logger.error(f"Model failed to load: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start model loading in the background and release resources on shutdown."""
+    load_task = None
+    if settings.eager_model_loading:
+        load_task = asyncio.create_task(load_model_in_background())
+    if settings.jobs_enabled:
+        # Picks up jobs left unfinished by a previous run
+        job_manager.start()
+    yield
+    await job_manager.stop()
+    if load_task is not None:
+        load_task.cancel()
+    model_manager.shutdown()
+    access_log.stop()
+
 
 app = FastAPI(
     title=settings.app_name,
     version=settings.app_version,
-    debug=settings.debug
+    debug=settings.debug,
+    lifespan=lifespan
 )
 
 # Initialize model manager
 model_manager = ModelManager()
 
+# Coalesce concurrent analyze requests into batched model calls
+batch_scheduler = BatchScheduler(model_manager)
+
+# Additional models requests can choose; the default manager and scheduler are reused
+model_registry = ModelRegistry(model_manager, batch_scheduler)
+
+# Background bulk jobs, checkpointed to disk
+job_manager = JobManager(model_registry)
+
 # Initialize metrics collector and add to app state
 metrics_collector = MetricsCollector()
 app.state.metrics_collector = metrics_collector
 app.state.model_loaded = False
+app.state.model_load_error = None
+app.state.autotune_profile = None
+app.state.profiling = False
+
+# Sample the stacks of every Nth request when enabled; not installed at all otherwise
+request_profiler = None
+if settings.profile_every_n_requests > 0:
+    request_profiler = RequestProfiler(settings.profile_every_n_requests,
+                                       settings.profile_request_interval_ms / 1000)
 
 # Add middleware
-app.middleware("http")(log_requests)
-app.add_middleware(MetricsMiddleware, metrics_collector=metrics_collector)
+app.add_middleware(ObservabilityMiddleware, metrics_collector=metrics_collector, access_log=access_log)
+if request_profiler is not None:
+    app.add_middleware(RequestProfilingMiddleware, request_profiler=request_profiler)
 
 # Mount static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 
-@app.exception_handler(MLServiceError)
-async def ml_service_exception_handler(request: Request, exc: MLServiceError):
-    """Global exception handler for ML service errors."""
+def error_response(request: Request, exc: MLServiceError, status_code: int,
+                   headers: Optional[Dict[str, str]] = None) -> JSONResponse:
+    """Render an ML service error in the common error body format."""
     return JSONResponse(
-        status_code=400,
+        status_code=status_code,
         content={
             "detail": str(exc),
             "type": exc.__class__.__name__,
             "path": request.url.path
-        }
+        },
+        headers=headers
     )
 
 
+@app.exception_handler(MLServiceError)
+async def ml_service_exception_handler(request: Request, exc: MLServiceError):
+    """Global exception handler for ML service errors."""
+    return error_response(request, exc, 400)
+
+
+@app.exception_handler(AuthorizationError)
+async def authorization_exception_handler(request: Request, exc: AuthorizationError):
+    """Reject admin calls without a valid token."""
+    return error_response(request, exc, 403)
+
+
+@app.exception_handler(NotFoundError)
+async def not_found_exception_handler(request: Request, exc: NotFoundError):
+    """Report unknown jobs and other missing resources."""
+    return error_response(request, exc, 404)
+
+
+@app.exception_handler(QueueFullError)
+async def queue_full_exception_handler(request: Request, exc: QueueFullError):
+    """Shed load with 429 and a hint of when the queue should have drained."""
+    return error_response(request, exc, 429, headers={"Retry-After": str(exc.retry_after)})
+
+
+@app.exception_handler(DeadlineExceededError)
+async def deadline_exceeded_exception_handler(request: Request, exc: DeadlineExceededError):
+    """Report requests whose deadline passed before they were served."""
+    return error_response(request, exc, 504)
+
+
 @app.get("/")
 async def root():
     return {"message": "ML Model Service is running", "status": "healthy"}
@@ -50,21 +191,16 @@ async def root():
 
 @app.get("/api/v1/health")
 async def health_check(response: Response):
-    """Health check endpoint that verifies model status."""
-    try:
-        # Check if model is loaded by attempting to get it
-        model = await model_manager.get_model()
-        if model is not None:
-            app.state.model_loaded = True
-            return {
-                "status": "ok",
-                "checks": {
-                    "model_loaded": True,
-                    "service": "healthy"
-                }
+    """Health check endpoint that reports model status without loading the model."""
+    if model_manager.model is not None:
+        app.state.model_loaded = True
+        return {
+            "status": "ok",
+            "checks": {
+                "model_loaded": True,
+                "service": "healthy"
             }
-    except Exception:
-        app.state.model_loaded = False
+        }
     
     # Model is not available
     response.status_code = 503
@@ -78,6 +214,42 @@ async def health_check(response: Response):
     }
 
 
+@app.get("/api/v1/health/live")
+async def liveness_check():
+    """Liveness probe: the process is up and the event loop is responsive."""
+    return {"status": "alive"}
+
+
+@app.get("/api/v1/health/ready")
+async def readiness_check(response: Response):
+    """Readiness probe: only passes once the model is loaded and warmed up."""
+    if model_manager.ready:
+        return {
+            "status": "ready",
+            "checks": {
+                "model_loaded": True,
+                "model_warm": True
+            }
+        }
+    
+    if app.state.model_load_error:
+        reason = f"Model failed to load: {app.state.model_load_error}"
+    elif model_manager.model is None:
+        reason = "Model loading"
+    else:
+        reason = "Model warming up"
+    
+    response.status_code = 503
+    return {
+        "status": "not_ready",
+        "reason": reason,
+        "checks": {
+            "model_loaded": model_manager.model is not None,
+            "model_warm": False
+        }
+    }
+
+
 @app.get("/api/v1/metrics", response_class=PlainTextResponse)
 async def metrics_endpoint(request: Request):
     """Prometheus-compatible metrics endpoint."""
@@ -96,30 +268,291 @@ app_errors_total {collector.errors_total}
 # TYPE app_request_duration_ms gauge
 app_request_duration_ms {collector.get_average_latency()}
 
+{collector.render_latency()}
 # HELP app_model_loaded Whether the ML model is currently loaded
 # TYPE app_model_loaded gauge
 app_model_loaded {int(request.app.state.model_loaded)}
+
+# HELP app_model_ready Whether the model is loaded and warmed up
+# TYPE app_model_ready gauge
+app_model_ready {int(model_manager.ready)}
+
+# HELP app_import_seconds Time taken to import the application before it could serve
+# TYPE app_import_seconds gauge
+app_import_seconds {IMPORT_SECONDS:.6f}
+
+# HELP app_model_load_seconds Time taken to load the model
+# TYPE app_model_load_seconds gauge
+app_model_load_seconds {model_manager.load_seconds or 0.0}
+
+# HELP app_model_warmup_seconds Time taken by warmup inferences after loading
+# TYPE app_model_warmup_seconds gauge
+app_model_warmup_seconds {model_manager.warmup_seconds or 0.0}
+
+# HELP app_model_time_to_first_inference_seconds Time from startup to the first successful inference
+# TYPE app_model_time_to_first_inference_seconds gauge
+app_model_time_to_first_inference_seconds {model_manager.time_to_first_inference or 0.0}
+
+{model_manager.stage_duration.render()}
+{model_manager.batch_size.render()}
+{model_manager.batch_tokens.render()}
+# HELP app_inference_queue_depth Requests waiting for a batch
+# TYPE app_inference_queue_depth gauge
+app_inference_queue_depth {batch_scheduler.queue_depth}
+
+# HELP app_inference_queue_rejected_total Requests rejected with 429 because the queue was full
+# TYPE app_inference_queue_rejected_total counter
+app_inference_queue_rejected_total {batch_scheduler.rejected}
+
+# HELP app_inference_deadline_expired_total Requests dropped because their deadline passed before inference
+# TYPE app_inference_deadline_expired_total counter
+app_inference_deadline_expired_total {batch_scheduler.expired}
+
+# HELP app_inference_coalesced_total Requests answered by sharing an identical in-flight inference
+# TYPE app_inference_coalesced_total counter
+app_inference_coalesced_total {batch_scheduler.coalesced}
+
+{batch_scheduler.render_client_metrics()}
+{model_registry.render_metrics()}
+{autotune.render_metrics(app.state.autotune_profile)}
+# HELP app_job_texts_scored_total Texts scored by background bulk jobs in this process
+# TYPE app_job_texts_scored_total counter
+app_job_texts_scored_total {job_manager.texts_scored}
+
+# HELP app_jobs_finished_total Bulk jobs this process finished (completed, failed or cancelled)
+# TYPE app_jobs_finished_total counter
+app_jobs_finished_total {job_manager.jobs_finished}
+
+# HELP app_jobs_expired_total Finished bulk jobs this process deleted after JOB_RETENTION_HOURS
+# TYPE app_jobs_expired_total counter
+app_jobs_expired_total {job_manager.jobs_expired}
+
+# HELP app_job_yield_seconds_total Time bulk jobs spent waiting for interactive requests
+# TYPE app_job_yield_seconds_total counter
+app_job_yield_seconds_total {job_manager.yield_seconds:.6f}
+
+# HELP app_log_records_dropped_total Request log records dropped because the log writer fell behind
+# TYPE app_log_records_dropped_total counter
+app_log_records_dropped_total {access_log.dropped}
+"""
+    
+    memory = process_memory()
+    node = node_memory()
+    worker = worker_id()
+    metrics_text += f"""
+# HELP app_process_resident_memory_bytes Resident set size of this worker
+# TYPE app_process_resident_memory_bytes gauge
+app_process_resident_memory_bytes{{worker="{worker}"}} {memory["rss"]}
+
+# HELP app_process_proportional_memory_bytes Proportional set size of this worker (shared pages split between workers)
+# TYPE app_process_proportional_memory_bytes gauge
+app_process_proportional_memory_bytes{{worker="{worker}"}} {memory["pss"]}
+
+# HELP app_process_shared_memory_bytes Memory this worker shares with other processes (e.g. copy-on-write model weights)
+# TYPE app_process_shared_memory_bytes gauge
+app_process_shared_memory_bytes{{worker="{worker}"}} {memory["shared"]}
+
+# HELP app_node_memory_total_bytes Total memory of the node
+# TYPE app_node_memory_total_bytes gauge
+app_node_memory_total_bytes {node["total"]}
+
+# HELP app_node_memory_available_bytes Memory available for new allocations on the node
+# TYPE app_node_memory_available_bytes gauge
+app_node_memory_available_bytes {node["available"]}
+"""
+    
+    cache = model_manager.prediction_cache
+    if cache is not None:
+        stats = cache.get_stats()
+        metrics_text += f"""
+# HELP app_prediction_cache_hits_total Predictions served from the cache
+# TYPE app_prediction_cache_hits_total counter
+app_prediction_cache_hits_total {stats["hits"]}
+
+# HELP app_prediction_cache_misses_total Predictions not found in the cache
+# TYPE app_prediction_cache_misses_total counter
+app_prediction_cache_misses_total {stats["misses"]}
+
+# HELP app_prediction_cache_evictions_total Cache entries evicted to stay within the size limit
+# TYPE app_prediction_cache_evictions_total counter
+app_prediction_cache_evictions_total {stats["evictions"]}
+
+# HELP app_prediction_cache_expirations_total Cache entries dropped after their TTL
+# TYPE app_prediction_cache_expirations_total counter
+app_prediction_cache_expirations_total {stats["expirations"]}
+
+# HELP app_prediction_cache_size Number of predictions currently cached
+# TYPE app_prediction_cache_size gauge
+app_prediction_cache_size {stats["size"]}
+"""
+    
+    cascade = model_manager.cascade
+    if cascade is not None:
+        stats = cascade.get_stats()
+        metrics_text += f"""
+# HELP app_cascade_short_circuited_total Texts answered by the cascade's first stage
+# TYPE app_cascade_short_circuited_total counter
+app_cascade_short_circuited_total {stats["short_circuited"]}
+
+# HELP app_cascade_deferred_total Texts the first stage was not confident about, sent to the model
+# TYPE app_cascade_deferred_total counter
+app_cascade_deferred_total {stats["deferred"]}
+
+# HELP app_cascade_short_circuit_ratio Fraction of texts answered by the first stage
+# TYPE app_cascade_short_circuit_ratio gauge
+app_cascade_short_circuit_ratio {stats["ratio"]:.6f}
+
+# HELP app_cascade_threshold Confidence the first stage needs to answer
+# TYPE app_cascade_threshold gauge
+app_cascade_threshold {stats["threshold"]}
+"""
+    
+    store = model_manager.result_store
+    if store is not None:
+        # Counting the shared table is a SQLite query, so keep it off the event loop
+        stats = await asyncio.get_running_loop().run_in_executor(None, store.get_stats)
+        metrics_text += f"""
+# HELP app_result_store_hits_total Predictions served from the on-disk result store
+# TYPE app_result_store_hits_total counter
+app_result_store_hits_total {stats["hits"]}
+
+# HELP app_result_store_misses_total Predictions not found in the result store
+# TYPE app_result_store_misses_total counter
+app_result_store_misses_total {stats["misses"]}
+
+# HELP app_result_store_writes_total Predictions written to the result store
+# TYPE app_result_store_writes_total counter
+app_result_store_writes_total {stats["writes"]}
+
+# HELP app_result_store_compacted_total Results deleted to keep the store within its size limit
+# TYPE app_result_store_compacted_total counter
+app_result_store_compacted_total {stats["compacted"]}
+
+# HELP app_result_store_errors_total Result store operations that failed and were skipped
+# TYPE app_result_store_errors_total counter
+app_result_store_errors_total {stats["errors"]}
+
+# HELP app_result_store_size Results held in the store (shared by all workers)
+# TYPE app_result_store_size gauge
+app_result_store_size {stats["size"]}
 """
     
     return metrics_text
 
 
+def require_admin(request: Request):
+    """Check the admin token; admin endpoints are disabled while ADMIN_TOKEN is unset."""
+    if not settings.admin_token:
+        raise AuthorizationError("Admin endpoints are disabled; set ADMIN_TOKEN to enable them")
+    token = request.headers.get(ADMIN_TOKEN_HEADER, "")
+    if not hmac.compare_digest(token.encode(), settings.admin_token.encode()):
+        raise AuthorizationError(f"Missing or invalid {ADMIN_TOKEN_HEADER} header")
+
+
+def require_jobs():
+    """Refuse new bulk jobs in a process that does not run the job worker."""
+    if not settings.jobs_enabled:
+        raise ValidationError("Bulk jobs are disabled; set JOBS_ENABLED=true to enable them")
+
+
+def parse_deadline(request: Request) -> Optional[float]:
+    """Remaining time budget in seconds from the X-Request-Deadline-Ms header, if sent."""
+    value = request.headers.get(DEADLINE_HEADER)
+    if value is None:
+        return None
+    try:
+        return float(value) / 1000
+    except ValueError:
+        raise ValidationError(f"{DEADLINE_HEADER} must be a number of milliseconds, got '{value}'")
+
+
+def parse_client(request: Request) -> str:
+    """The client a request is scheduled for, from the CLIENT_HEADER header."""
+    value = request.headers.get(settings.client_header)
+    if value is None:
+        return ANONYMOUS_CLIENT
+    if not CLIENT_ID_PATTERN.match(value):
+        raise ValidationError(
+            f"{settings.client_header} must be 1-64 letters, digits or '.', '_', ':', '-'"
+        )
+    return value
+
+
+@app.post("/api/v1/admin/profile")
+async def capture_profile(http_request: Request, mode: str = "cpu", seconds: float = 10.0,
+                          interval_ms: float = 5.0) -> Response:
+    """Profile the live service for a number of seconds.
+
+    ``cpu`` samples every thread's Python stack and returns folded stacks for
+    flamegraph tools; ``torch`` records torch operators and returns a Chrome trace.
+    """
+    require_admin(http_request)
+    if mode not in PROFILE_MODES:
+        raise ValidationError(f"Unknown profile mode '{mode}'; choose from {list(PROFILE_MODES)}")
+    if not 0 < seconds <= settings.profile_max_seconds:
+        raise ValidationError(f"seconds must be in (0, {settings.profile_max_seconds}]")
+    if interval_ms < 1:
+        raise ValidationError("interval_ms must be at least 1")
+    if http_request.app.state.profiling:
+        raise ValidationError("A profile is already being captured")
+    
+    http_request.app.state.profiling = True
+    try:
+        if mode == "cpu":
+            content = await capture_cpu_profile(seconds, interval_ms / 1000)
+            return PlainTextResponse(
+                content, headers={"Content-Disposition": 'attachment; filename="profile.folded"'}
+            )
+        content = await capture_torch_trace(seconds)
+        return Response(
+            content, media_type="application/json",
+            headers={"Content-Disposition": 'attachment; filename="trace.json"'}
+        )
+    finally:
+        http_request.app.state.profiling = False
+
+
+@app.get("/api/v1/admin/profile/requests")
+async def request_profile(http_request: Request, reset: bool = False) -> Response:
+    """Folded stacks sampled while every Nth request was served (PROFILE_EVERY_N_REQUESTS)."""
+    require_admin(http_request)
+    if request_profiler is None:
+        raise ValidationError("Request profiling is disabled; set PROFILE_EVERY_N_REQUESTS to enable it")
+    
+    content = request_profiler.profiler.collapsed()
+    summary = request_profiler.summary()
+    if reset:
+        request_profiler.profiler.reset()
+    return PlainTextResponse(content, headers={
+        "Content-Disposition": 'attachment; filename="requests.folded"',
+        "X-Profiled-Requests": str(summary["profiled"]),
+        "X-Profile-Samples": str(summary["samples"]),
+    })
+
+
 @app.post("/api/v1/analyze", response_model=SentimentResponse)
-async def analyze_sentiment(request: SentimentRequest) -> SentimentResponse:
+async def analyze_sentiment(request: SentimentRequest, response: Response,
+                            http_request: Request) -> SentimentResponse:
     """Analyze sentiment of input text."""
-    request_id = str(uuid.uuid4())
+    request_id = get_request_id(http_request)
+    timings = {} if settings.server_timing else None
+    timeout = parse_deadline(http_request)
+    client = parse_client(http_request)
     
     try:
-        # Get the model
-        model = await model_manager.get_model()
+        async with model_registry.acquire(request.model) as entry:
+            # Perform sentiment analysis as part of the next micro-batch
+            result = await entry.scheduler.submit(request.text, timings=timings, timeout=timeout,
+                                                  client=client)
         
-        # Perform sentiment analysis
-        result = model(request.text)[0]
+        if timings:
+            response.headers["Server-Timing"] = server_timing_header(timings)
         
         return SentimentResponse(
             label=result["label"],
             score=result["score"],
             text=request.text,
+            model=entry.manager.model_name,
             request_id=request_id
         )
     
@@ -128,4 +561,131 @@ async def analyze_sentiment(request: SentimentRequest) -> SentimentResponse:
         if isinstance(e, MLServiceError):
             raise  # Re-raise our own exceptions
         else:
-            raise ModelError(f"Model prediction failed: {str(e)}")
\ No newline at end of file
+            raise ModelError(f"Model prediction failed: {str(e)}")
+
+
+@app.post("/api/v1/analyze/document", response_model=DocumentSentimentResponse)
+async def analyze_document(request: DocumentSentimentRequest, http_request: Request) -> DocumentSentimentResponse:
+    """Analyze a long document as overlapping token windows and aggregate their sentiment."""
+    request_id = get_request_id(http_request)
+    timeout = parse_deadline(http_request)
+    client = parse_client(http_request)
+    
+    try:
+        async with model_registry.acquire(request.model) as entry:
+            windows = await entry.manager.document_windows(request.text)
+            # Windows share micro-batches with each other and with concurrent requests; the
+            # document is admitted as a whole and a failed window cancels the rest
+            results = await entry.scheduler.submit_many(
+                [text for text, _ in windows], timeout=timeout, client=client
+            )
+        tokens = [count for _, count in windows]
+        label, score = aggregate_windows(results, tokens, request.strategy)
+        
+        return DocumentSentimentResponse(
+            label=label,
+            score=score,
+            strategy=request.strategy,
+            windows=[
+                DocumentWindowResult(label=result["label"], score=result["score"], tokens=count)
+                for result, count in zip(results, tokens)
+            ],
+            model=entry.manager.model_name,
+            request_id=request_id
+        )
+    
+    except Exception as e:
+        # Wrap any unexpected errors as ModelError
+        if isinstance(e, MLServiceError):
+            raise  # Re-raise our own exceptions
+        else:
+            raise ModelError(f"Model prediction failed: {str(e)}")
+
+
+@app.post("/api/v1/analyze/batch", response_model=BatchSentimentResponse)
+async def analyze_batch(request: BatchSentimentRequest, http_request: Request) -> BatchSentimentResponse:
+    """Analyze sentiment of many texts, reporting errors per item."""
+    request_id = get_request_id(http_request)
+    results = [None] * len(request.texts)
+    valid_indices = []
+    
+    # Apply the single-text validation rules to each item
+    for index, text in enumerate(request.texts):
+        try:
+            SentimentRequest(text=text)
+            valid_indices.append(index)
+        except PydanticValidationError as e:
+            results[index] = BatchItemResult(index=index, error=e.errors()[0]["msg"])
+    
+    timeout = parse_deadline(http_request)
+    client = parse_client(http_request)
+    
+    try:
+        async with model_registry.acquire(request.model) as entry:
+            # Sub-batches share the client's fair queue and in-flight cap with its other requests
+            predictions = await entry.scheduler.submit_batch(
+                [request.texts[i] for i in valid_indices], timeout=timeout, client=client
+            ) if valid_indices else []
+    except Exception as e:
+        if isinstance(e, MLServiceError):
+            raise
+        else:
+            raise ModelError(f"Model prediction failed: {str(e)}")
+    
+    for index, prediction in zip(valid_indices, predictions):
+        if isinstance(prediction, Exception):
+            results[index] = BatchItemResult(
+                index=index, error=f"Model prediction failed: {str(prediction)}"
+            )
+        else:
+            results[index] = BatchItemResult(
+                index=index, label=prediction["label"], score=prediction["score"]
+            )
+    
+    return BatchSentimentResponse(results=results, model=entry.manager.model_name, request_id=request_id)
+
+
+@app.post("/api/v1/jobs", response_model=JobStatusResponse, status_code=202)
+async def submit_job(request: JobRequest) -> JobStatusResponse:
+    """Queue a list of texts for background scoring."""
+    require_jobs()
+    return JobStatusResponse(**await job_manager.submit_texts(request.texts, request.model))
+
+
+@app.post("/api/v1/jobs/upload", response_model=JobStatusResponse, status_code=202)
+async def upload_job(file: UploadFile = File(..., description="JSONL file, one object per line"),
+                     text_field: str = Form("text"), id_field: Optional[str] = Form(None),
+                     model: Optional[str] = Form(None)) -> JobStatusResponse:
+    """Queue an uploaded JSONL file for background scoring."""
+    require_jobs()
+    return JobStatusResponse(**await job_manager.submit_file(file.file, text_field, id_field, model))
+
+
+@app.get("/api/v1/jobs/{job_id}", response_model=JobStatusResponse)
+async def job_status(job_id: str) -> JobStatusResponse:
+    """Report a job's progress."""
+    return JobStatusResponse(**job_manager.status(job_id))
+
+
+@app.get("/api/v1/jobs/{job_id}/results")
+async def job_results(job_id: str) -> StreamingResponse:
+    """Download the results checkpointed so far as JSONL, one line per input line."""
+    status = job_manager.status(job_id)
+    return StreamingResponse(
+        job_manager.iter_results(job_id),
+        media_type="application/x-ndjson",
+        headers={
+            "Content-Disposition": f'attachment; filename="{job_id}.jsonl"',
+            "X-Job-Status": status["status"],
+        }
+    )
+
+
+@app.delete("/api/v1/jobs/{job_id}", response_model=JobStatusResponse)
+async def cancel_job(job_id: str) -> JobStatusResponse:
+    """Cancel a queued or running job; results scored so far are kept."""
+    return JobStatusResponse(**job_manager.cancel(job_id))
+
+
+# Everything above runs before a worker can serve; heavy ML libraries are only imported when a model loads
+IMPORT_SECONDS = time.perf_counter() - IMPORT_STARTED
@@ -0,0 +1,121 @@
+import threading
+from bisect import bisect_left
+from typing import Dict, Optional, Sequence, Tuple
+
+# Request latency buckets in seconds, from a few milliseconds up to a timed-out request
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0)
+
+SUMMARY_QUANTILES = (0.5, 0.95, 0.99)
+
+
+def _format_labels(label_names: Sequence[str], label_values: Sequence[str], **extra: str) -> str:
+    pairs = list(zip(label_names, label_values)) + list(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+def _format_bound(bound: float) -> str:
+    return "+Inf" if bound == float("inf") else repr(float(bound))
+
+
+class _Series:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, size: int):
+        self.counts = [0] * size
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram:
+    """Thread-safe fixed-bucket histogram rendered in Prometheus exposition format.
+
+    Recording only increments one bucket counter, so it costs the same no matter
+    how many samples have been observed.
+    """
+
+    def __init__(self, name: str, description: str, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS,
+                 label_names: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.bounds = tuple(sorted(buckets)) + (float("inf"),)
+        self.label_names = tuple(label_names)
+        self._series: Dict[Tuple[str, ...], _Series] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        """Record one sample for the given label values."""
+        index = bisect_left(self.bounds, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = _Series(len(self.bounds))
+            series.counts[index] += 1
+            series.sum += value
+            series.count += 1
+
+    def totals(self) -> Tuple[float, int]:
+        """Sum and count of all samples across every label set."""
+        with self._lock:
+            return (
+                sum(series.sum for series in self._series.values()),
+                sum(series.count for series in self._series.values())
+            )
+
+    def quantile(self, q: float, *label_values: str) -> Optional[float]:
+        """Estimate a quantile by interpolating linearly inside the bucket that contains it."""
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None or series.count == 0:
+                return None
+            counts = list(series.counts)
+            total = series.count
+
+        rank = q * total
+        cumulative = 0
+        for index, count in enumerate(counts):
+            if count and cumulative + count >= rank:
+                lower = self.bounds[index - 1] if index > 0 else 0.0
+                upper = self.bounds[index]
+                if upper == float("inf"):
+                    # Nothing better to report than the largest finite bound
+                    return lower
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.bounds[-2]
+
+    def render(self) -> str:
+        """Render as a Prometheus histogram with cumulative buckets."""
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [(labels, list(series.counts), series.sum, series.count)
+                        for labels, series in sorted(self._series.items())]
+
+        for labels, counts, total_sum, total_count in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.bounds, counts):
+                cumulative += count
+                bucket_labels = _format_labels(self.label_names, labels, le=_format_bound(bound))
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            label_text = _format_labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{label_text} {total_sum}")
+            lines.append(f"{self.name}_count{label_text} {total_count}")
+        return "\n".join(lines) + "\n"
+
+    def render_summary(self, name: str, description: str,
+                       quantiles: Sequence[float] = SUMMARY_QUANTILES) -> str:
+        """Render bucket-estimated quantiles as a Prometheus summary."""
+        lines = [f"# HELP {name} {description}", f"# TYPE {name} summary"]
+        with self._lock:
+            snapshot = [(labels, series.sum, series.count) for labels, series in sorted(self._series.items())]
+
+        for labels, total_sum, total_count in snapshot:
+            for q in quantiles:
+                value = self.quantile(q, *labels)
+                quantile_labels = _format_labels(self.label_names, labels, quantile=str(q))
+                lines.append(f"{name}{quantile_labels} {value}")
+            label_text = _format_labels(self.label_names, labels)
+            lines.append(f"{name}_sum{label_text} {total_sum}")
+            lines.append(f"{name}_count{label_text} {total_count}")
+        return "\n".join(lines) + "\n"
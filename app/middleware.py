@@ -1,10 +1,11 @@
 import time
-import json
 import uuid
 import logging
-from typing import Callable
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
+from typing import Optional
+from starlette.requests import Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from .logs import AccessLog
+from .metrics import Histogram
 
 # Configure structured logging
 logging.basicConfig(
@@ -14,47 +15,8 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-
-async def log_requests(request: Request, call_next: Callable) -> Response:
-    """Middleware function for structured request logging."""
-    # Generate unique request ID
-    request_id = str(uuid.uuid4())
-    request.state.request_id = request_id
-    
-    # Log incoming request
-    start_time = time.time()
-    request_log = {
-        "event": "request_started",
-        "request_id": request_id,
-        "method": request.method,
-        "path": request.url.path,
-        "query_params": str(request.query_params),
-        "client_ip": request.client.host if request.client else None,
-        "user_agent": request.headers.get("user-agent"),
-        "timestamp": start_time
-    }
-    logger.info(json.dumps(request_log))
-    
-    # Process request
-    response = await call_next(request)
-    
-    # Log response
-    end_time = time.time()
-    duration = end_time - start_time
-    
-    response_log = {
-        "event": "request_completed",
-        "request_id": request_id,
-        "status_code": response.status_code,
-        "duration_ms": round(duration * 1000, 2),
-        "timestamp": end_time
-    }
-    logger.info(json.dumps(response_log))
-    
-    # Add request ID to response headers for traceability
-    response.headers["X-Request-ID"] = request_id
-    
-    return response
+# Request records are serialized and written off the event loop
+access_log = AccessLog()
 
 
 class MetricsCollector:
@@ -63,7 +25,11 @@ class MetricsCollector:
     def __init__(self):
         self.requests_total = 0
         self.errors_total = 0
-        self.latencies = []
+        self.request_duration = Histogram(
+            "app_request_duration_seconds",
+            "HTTP request latency in seconds",
+            label_names=("route", "method", "status")
+        )
         self._lock = None  # Will be set to asyncio.Lock when async context is available
     
     def increment_requests(self):
@@ -74,18 +40,19 @@ class MetricsCollector:
         """Increment total error count."""
         self.errors_total += 1
     
-    def record_latency(self, duration_ms: float):
-        """Record request latency in milliseconds."""
-        self.latencies.append(duration_ms)
-        # Keep only last 1000 latencies to prevent memory growth
-        if len(self.latencies) > 1000:
-            self.latencies = self.latencies[-1000:]
+    def record_latency(self, duration_ms: float, route: str = "", method: str = "",
+                       status_code: int = 200):
+        """Record request latency in milliseconds, labelled by route, method and status class."""
+        self.request_duration.observe(
+            duration_ms / 1000, route, method, f"{status_code // 100}xx"
+        )
     
     def get_average_latency(self) -> float:
         """Get average latency in milliseconds."""
-        if not self.latencies:
+        total_seconds, count = self.request_duration.totals()
+        if not count:
             return 0.0
-        return sum(self.latencies) / len(self.latencies)
+        return total_seconds / count * 1000
     
     def get_metrics_summary(self) -> dict:
         """Get current metrics summary."""
@@ -93,37 +60,88 @@ class MetricsCollector:
             "requests_total": self.requests_total,
             "errors_total": self.errors_total,
             "average_latency_ms": self.get_average_latency(),
-            "latency_samples": len(self.latencies)
+            "latency_samples": self.request_duration.totals()[1]
         }
+    
+    def render_latency(self) -> str:
+        """Render the latency histogram and its p50/p95/p99 summary."""
+        return self.request_duration.render() + "\n" + self.request_duration.render_summary(
+            "app_request_duration_quantiles_seconds",
+            "Request latency quantiles in seconds, estimated from the histogram buckets"
+        )
 
 
-class MetricsMiddleware(BaseHTTPMiddleware):
-    """Middleware to collect application metrics."""
+class ObservabilityMiddleware:
+    """Pure ASGI middleware that handles request ids, timing, access logging and metrics in one pass.
     
-    def __init__(self, app, metrics_collector: MetricsCollector):
-        super().__init__(app)
+    The request id is stored in the ASGI scope state (``request.state.request_id``)
+    so handlers reuse it, and is returned in the ``X-Request-ID`` header.
+    """
+    
+    def __init__(self, app: ASGIApp, metrics_collector: MetricsCollector, access_log: AccessLog):
+        self.app = app
         self.metrics_collector = metrics_collector
+        self.access_log = access_log
     
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        """Process request and collect metrics."""
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        request_id = str(uuid.uuid4())
+        scope.setdefault("state", {})["request_id"] = request_id
+        request_id_header = (b"x-request-id", request_id.encode())
         start_time = time.time()
+        start = time.perf_counter()
+        status_code = 500
+        failed = False
+        
+        async def send_with_request_id(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = [*message.get("headers", ()), request_id_header]
+            await send(message)
         
         try:
-            response = await call_next(request)
-            
-            # Check if this is an error response
-            if response.status_code >= 500:
-                self.metrics_collector.increment_errors()
-            
-            return response
-            
-        except Exception as e:
-            # Count exceptions as errors
-            self.metrics_collector.increment_errors()
+            await self.app(scope, receive, send_with_request_id)
+        except Exception:
+            failed = True
             raise
-        
         finally:
-            # Always record request count and latency
-            self.metrics_collector.increment_requests()
-            duration_ms = (time.time() - start_time) * 1000
-            self.metrics_collector.record_latency(duration_ms)
\ No newline at end of file
+            duration_ms = (time.perf_counter() - start) * 1000
+            collector = self.metrics_collector
+            collector.increment_requests()
+            if failed or status_code >= 500:
+                collector.increment_errors()
+            # Label by route template rather than raw path to keep cardinality bounded
+            route = getattr(scope.get("route"), "path", "unmatched")
+            collector.record_latency(duration_ms, route=route, method=scope["method"],
+                                     status_code=status_code)
+            
+            if self.access_log.should_log(status_code, duration_ms):
+                client = scope.get("client")
+                self.access_log.log({
+                    "event": "request_completed",
+                    "request_id": request_id,
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "query_params": scope.get("query_string", b"").decode("latin-1"),
+                    "client_ip": client[0] if client else None,
+                    "user_agent": _header(scope, b"user-agent"),
+                    "status_code": status_code,
+                    "duration_ms": round(duration_ms, 2),
+                    "timestamp": start_time
+                })
+
+
+def get_request_id(request: Request) -> str:
+    """The id ObservabilityMiddleware assigned to this request, or a fresh one outside it."""
+    return getattr(request.state, "request_id", None) or str(uuid.uuid4())
+
+
+def _header(scope: Scope, name: bytes) -> Optional[str]:
+    for key, value in scope.get("headers", ()):
+        if key == name:
+            return value.decode("latin-1")
+    return None
@@ -1,31 +1,339 @@
 import asyncio
-from transformers import pipeline
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Dict, List, Optional, Tuple
+from .backends import load_pipeline, load_tokenizer, revision_for
+from .cache import PredictionCache, cache_key
+from .cascade import CascadeClassifier, load_cascade
 from .config import settings
+from .documents import split_windows
+from .exceptions import ModelError
+from .metrics import Histogram
+from .store import ResultStore, model_identity
+from .timing import StageTimer, activate
+
+# Per-stage inference durations in seconds, down to sub-millisecond tokenization
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+# Pipeline owned by the current process when running as a process-pool worker
+_worker_pipeline = None
+
+
+def build_pipeline(model_name: str, backend: Optional[str] = None):
+    """Build the sentiment analysis pipeline for the given model and inference backend."""
+    return load_pipeline(model_name, backend)
+
+
+def _init_worker(model_name: str, backend: Optional[str] = None, threads: Optional[int] = None):
+    """Process-pool initializer that loads a private copy of the model."""
+    global _worker_pipeline
+    if threads is not None:
+        import torch
+        # Each worker would otherwise start one intra-op thread per core
+        torch.set_num_threads(threads)
+    _worker_pipeline = build_pipeline(model_name, backend)
+
+
+def _worker_predict(texts: List[str], kwargs: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Run the worker's pipeline on a batch of texts."""
+    return _worker_pipeline(texts, **kwargs)
+
+
+class ProcessPoolPipeline:
+    """Pipeline-compatible callable that forwards batches to a pool of model processes.
+
+    The parent keeps the model's tokenizer so length bucketing and document
+    windows count real tokens without a round trip to a worker.
+    """
+
+    def __init__(self, model_name: str, workers: int, backend: Optional[str] = None,
+                 threads: Optional[int] = None):
+        self.model_name = model_name
+        self.workers = workers
+        self.tokenizer = load_tokenizer(model_name)
+        # Split the cores between the workers unless a per-worker count is configured
+        threads = threads or settings.torch_threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+        self.pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(model_name, backend, threads)
+        )
+        # Surface load failures now rather than on the first request
+        self.pool.submit(_worker_predict, ["warmup"], {}).result()
+
+    def __call__(self, texts: List[str], **kwargs) -> List[Dict[str, Any]]:
+        return self.pool.submit(_worker_predict, texts, kwargs).result()
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
 
 
 class ModelManager:
     """Manages the sentiment analysis model with lazy loading and thread safety."""
-    
-    def __init__(self):
+
+    def __init__(self, model_name: Optional[str] = None):
         self.model = None
-        self.model_name = settings.model_name
+        self.model_name = model_name or settings.model_name
         self.cache_dir = settings.model_cache_dir
+        self.model_revision = revision_for(self.model_name)
+        self.backend = settings.inference_backend
+        self.executor_type = settings.inference_executor
+        self.workers = settings.inference_workers
         self.lock = asyncio.Lock()
-    
+        self._executor: Optional[Executor] = None
+        self.ready = False
+        self._warming = False
+        self.load_seconds: Optional[float] = None
+        self.warmup_seconds: Optional[float] = None
+        self.time_to_first_inference: Optional[float] = None
+        self._created_at = time.perf_counter()
+        self.stage_duration = Histogram(
+            "app_inference_stage_seconds",
+            "Time spent in each inference stage in seconds",
+            buckets=STAGE_BUCKETS,
+            label_names=("stage",)
+        )
+        self.batch_size = Histogram(
+            "app_inference_batch_size",
+            "Number of texts per model call",
+            buckets=BATCH_SIZE_BUCKETS
+        )
+        self.batch_tokens = Histogram(
+            "app_inference_batch_tokens",
+            "Number of tokens per model call",
+            buckets=TOKEN_BUCKETS
+        )
+        self.prediction_cache: Optional[PredictionCache] = None
+        if settings.prediction_cache_enabled:
+            self.prediction_cache = PredictionCache(
+                settings.prediction_cache_max_size,
+                settings.prediction_cache_ttl_seconds
+            )
+        self.result_store: Optional[ResultStore] = None
+        if settings.result_store_path:
+            self.result_store = ResultStore(
+                settings.result_store_path,
+                models=[model_identity(name, revision_for(name))
+                        for name in (self.model_name, *settings.available_models)],
+                max_entries=settings.result_store_max_entries
+            )
+        # Only the manager that opened the store closes it; the registry shares it with other models
+        self.owns_result_store = self.result_store is not None
+        self.cascade: Optional[CascadeClassifier] = None
+
+    def _get_executor(self) -> Executor:
+        """Lazily create the thread pool that keeps loading and inference off the event loop."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers,
+                thread_name_prefix="inference"
+            )
+        return self._executor
+
     def _load_model(self):
         """Private method to load the sentiment analysis model."""
-        self.model = pipeline(
-            "sentiment-analysis",
-            model=self.model_name
-        )
-    
+        if self.executor_type == "process":
+            # Each worker process holds its own copy; threads only dispatch to them
+            self.model = ProcessPoolPipeline(self.model_name, self.workers, self.backend)
+        else:
+            self.model = build_pipeline(self.model_name, self.backend)
+        # Cascades are distilled from the default model and only valid in front of it
+        if settings.cascade_path and self.model_name == settings.model_name:
+            self.cascade = load_cascade(
+                settings.cascade_path,
+                model_identity(self.model_name, self.model_revision),
+                settings.cascade_threshold
+            )
+
     async def get_model(self):
-        """Public method to get the model with lazy loading and thread safety."""
+        """Public method to get the model with lazy loading and thread safety.
+
+        A model loaded on demand, rather than by ``warmup``, is ready as soon as it loads.
+        """
         if self.model is not None:
             return self.model
-        
+
+        model = await self._load()
+        if not self._warming:
+            self.ready = True
+        return model
+
+    async def _load(self):
         async with self.lock:
             # Double-check pattern to prevent race condition
             if self.model is None:
-                self._load_model()
-            return self.model
\ No newline at end of file
+                loop = asyncio.get_running_loop()
+                start = time.perf_counter()
+                await loop.run_in_executor(self._get_executor(), self._load_model)
+                self.load_seconds = time.perf_counter() - start
+            return self.model
+
+    async def warmup(self, sequence_lengths: Optional[List[int]] = None):
+        """Load the model and run throwaway inferences across sequence lengths."""
+        sequence_lengths = sequence_lengths or settings.warmup_sequence_lengths
+        # Requests arriving meanwhile must not mark a cold model ready
+        self._warming = True
+        try:
+            await self._load()
+
+            start = time.perf_counter()
+            for length in sequence_lengths:
+                # Roughly one token per word, leaving room for [CLS] and [SEP]
+                text = " ".join(["good"] * max(length - 2, 1))
+                # Bypass the prediction cache so every length really runs
+                await self._run_model([text])
+            self.warmup_seconds = time.perf_counter() - start
+            self.ready = True
+        finally:
+            self._warming = False
+
+    async def predict(self, texts: List[str], timer: Optional[StageTimer] = None,
+                      lookup: bool = True) -> List[Dict[str, Any]]:
+        """Predict a batch of texts, sending only texts ``lookup`` cannot answer to the model in one call.
+
+        ``lookup=False`` sends every text to the model, for callers that already
+        looked them up. Only model predictions are written to the cache and
+        result store. When a timer is given it receives the stage durations of
+        the model call.
+        """
+        if lookup:
+            results = await self.lookup(texts)
+        else:
+            results = [None] * len(texts)
+        missing = [i for i, result in enumerate(results) if result is None]
+        if not missing:
+            return results
+
+        predictions = await self._run_model([texts[i] for i in missing], timer)
+        for i, prediction in zip(missing, predictions):
+            results[i] = prediction
+        if self.prediction_cache is None and self.result_store is None:
+            return results
+
+        keys = {i: cache_key(texts[i], self.model_name, self.model_revision) for i in missing}
+        if self.prediction_cache is not None:
+            for i in missing:
+                self.prediction_cache.set(keys[i], results[i])
+        if self.result_store is not None:
+            await asyncio.get_running_loop().run_in_executor(
+                None, self.result_store.put_many, model_identity(self.model_name, self.model_revision),
+                {keys[i]: results[i] for i in missing}
+            )
+        return results
+
+    async def lookup(self, texts: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """Predictions available without the model, None for the rest.
+
+        The cascade answers the texts it is confident about; the others are
+        looked up in the in-memory cache, then in bulk in the result store.
+        """
+        if self.cascade is not None:
+            # Microseconds per text, cheaper than a round trip to the executor
+            results = self.cascade.classify(texts)
+        else:
+            results = [None] * len(texts)
+        if self.prediction_cache is None and self.result_store is None:
+            return results
+
+        pending = [i for i, result in enumerate(results) if result is None]
+        keys = {i: cache_key(texts[i], self.model_name, self.model_revision) for i in pending}
+        if self.prediction_cache is not None:
+            for i in pending:
+                results[i] = self.prediction_cache.get(keys[i])
+        missing = [i for i in pending if results[i] is None]
+
+        if missing and self.result_store is not None:
+            # SQLite calls block, so keep them off the event loop (and off the inference pool)
+            stored = await asyncio.get_running_loop().run_in_executor(
+                None, self.result_store.get_many, [keys[i] for i in missing]
+            )
+            for i in missing:
+                if keys[i] in stored:
+                    results[i] = stored[keys[i]]
+                    if self.prediction_cache is not None:
+                        self.prediction_cache.set(keys[i], results[i])
+        return results
+
+    @staticmethod
+    def _call_model(model, texts: List[str], timer: StageTimer) -> List[Dict[str, Any]]:
+        """Call the model with the timer active on the executor thread."""
+        with activate(timer):
+            start = time.perf_counter()
+            # Truncate rather than fail on texts longer than the model's maximum length
+            results = model(texts, batch_size=len(texts), truncation=True)
+        if not timer.stages:
+            # Uninstrumented models (e.g. the process pool) are timed as a whole
+            timer.add("forward", time.perf_counter() - start)
+        return results
+
+    def _record_timings(self, timer: StageTimer, batch_size: int):
+        for name, seconds in timer.stages.items():
+            self.stage_duration.observe(seconds, name)
+        self.batch_size.observe(batch_size)
+        if timer.tokens:
+            self.batch_tokens.observe(timer.tokens)
+
+    async def _run_model(self, texts: List[str], timer: Optional[StageTimer] = None) -> List[Dict[str, Any]]:
+        """Run the model on a batch of texts in a single pipeline call."""
+        model = await self.get_model()
+        timer = timer or StageTimer()
+        loop = asyncio.get_running_loop()
+        results = await loop.run_in_executor(
+            self._get_executor(),
+            partial(self._call_model, model, texts, timer)
+        )
+        self._record_timings(timer, len(texts))
+        if len(results) != len(texts):
+            raise ModelError(
+                f"Model returned {len(results)} results for {len(texts)} inputs"
+            )
+        if self.time_to_first_inference is None:
+            # Cold start cost: from manager creation to the first usable prediction
+            self.time_to_first_inference = time.perf_counter() - self._created_at
+        return results
+
+    async def token_lengths(self, texts: List[str]) -> List[int]:
+        """Return the tokenized length of each text, falling back to characters without a tokenizer."""
+        model = await self.get_model()
+        tokenizer = getattr(model, "tokenizer", None)
+        if tokenizer is None:
+            return [len(text) for text in texts]
+
+        loop = asyncio.get_running_loop()
+        encoded = await loop.run_in_executor(
+            self._get_executor(),
+            partial(tokenizer, texts, truncation=True)
+        )
+        return [len(ids) for ids in encoded["input_ids"]]
+
+    async def document_windows(self, text: str) -> List[Tuple[str, int]]:
+        """Split a long document into overlapping windows that fit the model's maximum length."""
+        model = await self.get_model()
+        tokenizer = getattr(model, "tokenizer", None)
+        window_tokens = settings.document_window_tokens
+        if tokenizer is not None:
+            window_tokens = min(window_tokens, tokenizer.model_max_length)
+        # Keep windows advancing by at least half their length on small models
+        stride = min(settings.document_window_stride, window_tokens // 2)
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._get_executor(),
+            partial(split_windows, tokenizer, text, window_tokens, stride)
+        )
+
+    def shutdown(self):
+        """Release the executor, any model worker processes and, if it owns it, the result store connection."""
+        if self.result_store is not None and self.owns_result_store:
+            self.result_store.close()
+        if isinstance(self.model, ProcessPoolPipeline):
+            self.model.shutdown()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
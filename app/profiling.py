@@ -0,0 +1,203 @@
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import threading
+from collections import Counter
+from typing import Dict, Optional
+from .exceptions import ValidationError
+
+logger = logging.getLogger(__name__)
+
+PROFILE_MODES = ("cpu", "torch")
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Wall-clock sampling profiler over every Python thread.
+
+    A background thread snapshots all thread stacks with ``sys._current_frames``
+    every ``interval`` seconds and counts identical stacks, so the cost is paid
+    only while it runs and is independent of how much code executes in between.
+    ``collapsed`` renders the counts in the folded format read by flamegraph.pl,
+    speedscope and most flamegraph viewers.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        # A fresh event per thread, so a sampler stopped without waiting can never be revived
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(self._stop,), name="sampling-profiler",
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self, wait: bool = True):
+        """Stop sampling; with ``wait=False`` the sampler thread finishes its last sample on its own."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        if wait:
+            self._thread.join()
+        self._thread = None
+
+    def _run(self, stop: threading.Event):
+        own = threading.get_ident()
+        while not stop.wait(self.interval):
+            self.sample(skip=own)
+
+    def sample(self, skip: Optional[int] = None):
+        """Record the current stack of every thread except ``skip``."""
+        names: Dict[int, str] = {thread.ident: thread.name for thread in threading.enumerate()}
+        taken = []
+        for ident, frame in sys._current_frames().items():
+            if ident == skip:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            stack.append(names.get(ident, f"thread-{ident}"))
+            taken.append(";".join(reversed(stack)))
+        with self._lock:
+            self.stacks.update(taken)
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        """Folded stacks, one ``frame;frame;... count`` line each, heaviest first."""
+        with self._lock:
+            return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def reset(self):
+        with self._lock:
+            self.stacks.clear()
+            self.samples = 0
+
+
+async def capture_cpu_profile(seconds: float, interval: float) -> str:
+    """Sample every thread for ``seconds`` while traffic keeps flowing."""
+    profiler = SamplingProfiler(interval)
+    profiler.start()
+    try:
+        await asyncio.sleep(seconds)
+    except BaseException:
+        profiler.stop(wait=False)
+        raise
+    # Joining the sampler waits out its current sample; keep that off the event loop
+    await asyncio.get_running_loop().run_in_executor(None, profiler.stop)
+    return profiler.collapsed()
+
+
+def _torch_profile():
+    import torch
+    from torch.profiler import ProfilerActivity, profile
+
+    try:
+        # Inference runs on executor threads, not the one that starts the profiler
+        config = torch._C._profiler._ExperimentalConfig(profile_all_threads=True)
+        return profile(activities=[ProfilerActivity.CPU], experimental_config=config)
+    except (AttributeError, TypeError):
+        logger.warning("This torch version cannot profile all threads; the trace may miss inference")
+        return profile(activities=[ProfilerActivity.CPU])
+
+
+async def capture_torch_trace(seconds: float) -> str:
+    """Record torch operator activity for ``seconds`` and return it as a Chrome trace (JSON)."""
+    try:
+        profiler = _torch_profile()
+    except ImportError:
+        raise ValidationError("Torch tracing needs a PyTorch installation")
+
+    profiler.__enter__()
+    try:
+        await asyncio.sleep(seconds)
+    except BaseException:
+        profiler.__exit__(None, None, None)
+        raise
+    # Stopping processes every recorded event and serializing a long trace takes a
+    # while; keep both off the event loop
+    return await asyncio.get_running_loop().run_in_executor(None, _stop_and_export, profiler)
+
+
+def _stop_and_export(profiler) -> str:
+    profiler.__exit__(None, None, None)
+    fd, path = tempfile.mkstemp(suffix=".json")
+    os.close(fd)
+    try:
+        profiler.export_chrome_trace(path)
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+    finally:
+        os.remove(path)
+
+
+class RequestProfiler:
+    """Samples stacks while every Nth request is being served, accumulating one profile.
+
+    Overlapping sampled requests share a single sampler thread. Only installed
+    when PROFILE_EVERY_N_REQUESTS is set, so it costs nothing otherwise.
+    """
+
+    def __init__(self, every_n: int, interval: float = 0.001):
+        self.every_n = every_n
+        self.profiler = SamplingProfiler(interval)
+        self.requests = 0
+        self.profiled = 0
+        self._active = 0
+        self._lock = threading.Lock()
+
+    def should_profile(self) -> bool:
+        self.requests += 1
+        return self.requests % self.every_n == 0
+
+    def begin(self):
+        with self._lock:
+            self._active += 1
+            self.profiled += 1
+            if self._active == 1:
+                self.profiler.start()
+
+    def end(self):
+        with self._lock:
+            self._active -= 1
+            if self._active == 0:
+                # Joining the sampler would block the event loop for up to a sample
+                self.profiler.stop(wait=False)
+
+    def summary(self) -> Dict[str, int]:
+        return {"requests": self.requests, "profiled": self.profiled, "samples": self.profiler.samples}
+
+
+class RequestProfilingMiddleware:
+    """Pure ASGI middleware profiling every Nth HTTP request with a RequestProfiler."""
+
+    def __init__(self, app, request_profiler: RequestProfiler):
+        self.app = app
+        self.request_profiler = request_profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.request_profiler.should_profile():
+            await self.app(scope, receive, send)
+            return
+        self.request_profiler.begin()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.request_profiler.end()
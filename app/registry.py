@@ -0,0 +1,198 @@
+import os
+from collections import Counter, OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Iterable, List, Optional
+from .backends import resolve_model_path, revision_for
+from .batching import BatchScheduler
+from .config import settings
+from .exceptions import ModelError, ValidationError
+from .models import ModelManager, ProcessPoolPipeline
+
+
+def weights_file_bytes(model_name: str) -> int:
+    """Size of the model's safetensors weights on disk, or 0 when they cannot be found."""
+    try:
+        model_path = resolve_model_path(model_name, revision_for(model_name))
+        return sum(
+            os.path.getsize(os.path.join(model_path, name))
+            for name in os.listdir(model_path) if name.endswith(".safetensors")
+        )
+    except (ModelError, OSError):
+        return 0
+
+
+def estimate_model_bytes(model) -> int:
+    """Approximate memory held by a loaded pipeline.
+
+    In-process torch models count every tensor in their state dict, which
+    includes the packed weights of int8 layers; ONNX models count their file.
+    A process pool holds one copy per worker, estimated from the safetensors
+    files since its weights live in other processes.
+    """
+    if isinstance(model, ProcessPoolPipeline):
+        return weights_file_bytes(model.model_name) * model.workers
+    torch_model = getattr(model, "model", None)
+    if torch_model is not None and hasattr(torch_model, "state_dict"):
+        try:
+            total = 0
+            for value in torch_model.state_dict().values():
+                # Quantized layers store their packed (weight, bias) as a tuple
+                for tensor in value if isinstance(value, tuple) else (value,):
+                    if hasattr(tensor, "element_size"):
+                        total += tensor.numel() * tensor.element_size()
+            return total
+        except (AttributeError, TypeError):
+            # Not a torch module after all; report the size as unknown
+            return 0
+    onnx_path = getattr(model, "onnx_path", None)
+    if onnx_path and os.path.exists(onnx_path):
+        return os.path.getsize(onnx_path)
+    return 0
+
+
+class ModelEntry:
+    """A registered model: its manager, its batching queue and residency bookkeeping."""
+
+    def __init__(self, manager: ModelManager, scheduler: BatchScheduler, pinned: bool = False):
+        self.manager = manager
+        self.scheduler = scheduler
+        # The default model is never evicted
+        self.pinned = pinned
+        self.active = 0
+        self.size_bytes: Optional[int] = None
+
+
+class ModelRegistry:
+    """Serves several sentiment models, loading them on demand within a memory budget.
+
+    The default model's manager and scheduler are registered as-is and pinned.
+    Other allowed models get their own ModelManager and BatchScheduler on first
+    use; concurrent requests for a model share its manager, whose lock makes
+    them wait on a single load. Once resident models exceed the budget, the
+    least recently used idle ones are evicted.
+    """
+
+    def __init__(self, default_manager: ModelManager, default_scheduler: BatchScheduler,
+                 models: Optional[Iterable[str]] = None, memory_budget_bytes: Optional[int] = None):
+        self.default = default_manager
+        self.default_name = default_manager.model_name
+        self.allowed = {self.default_name, *(settings.available_models if models is None else models)}
+        if memory_budget_bytes is None and settings.model_memory_budget_mb is not None:
+            memory_budget_bytes = int(settings.model_memory_budget_mb * 1024 * 1024)
+        self.memory_budget_bytes = memory_budget_bytes
+        self.loads: Counter = Counter()
+        self.evictions: Counter = Counter()
+        self._entries: "OrderedDict[str, ModelEntry]" = OrderedDict()
+        self._entries[self.default_name] = ModelEntry(default_manager, default_scheduler, pinned=True)
+
+    def _create_entry(self, name: str) -> ModelEntry:
+        manager = ModelManager(model_name=name)
+        # Inference metrics, the prediction cache and the result store (keyed by model name) are shared
+        manager.stage_duration = self.default.stage_duration
+        manager.batch_size = self.default.batch_size
+        manager.batch_tokens = self.default.batch_tokens
+        manager.prediction_cache = self.default.prediction_cache
+        manager.result_store = self.default.result_store
+        manager.owns_result_store = False
+        # Batch at the default model's (possibly autotuned) size
+        default_scheduler = self._entries[self.default_name].scheduler
+        return ModelEntry(manager, BatchScheduler(manager, max_batch_size=default_scheduler.max_batch_size))
+
+    def get(self, name: Optional[str] = None) -> ModelEntry:
+        """Look up a model's entry, registering it (unloaded) on first use."""
+        name = name or self.default_name
+        if name not in self.allowed:
+            raise ValidationError(
+                f"Unknown model '{name}'; available models: {sorted(self.allowed)}"
+            )
+        entry = self._entries.get(name)
+        if entry is None:
+            entry = self._entries[name] = self._create_entry(name)
+        self._entries.move_to_end(name)
+        return entry
+
+    @asynccontextmanager
+    async def acquire(self, name: Optional[str] = None) -> AsyncIterator[ModelEntry]:
+        """Load a model if needed and keep it from being evicted while in use."""
+        entry = self.get(name)
+        entry.active += 1
+        try:
+            await entry.manager.get_model()
+            if self._record_load(entry):
+                self._enforce_budget()
+            yield entry
+        finally:
+            entry.active -= 1
+
+    def _record_load(self, entry: ModelEntry) -> bool:
+        """Measure a newly loaded model once; returns whether it was new."""
+        if entry.size_bytes is not None or entry.manager.model is None:
+            return False
+        entry.size_bytes = estimate_model_bytes(entry.manager.model)
+        self.loads[entry.manager.model_name] += 1
+        return True
+
+    def resident_bytes(self) -> int:
+        """Memory held by every loaded model."""
+        for entry in self._entries.values():
+            self._record_load(entry)
+        return sum(entry.size_bytes or 0 for entry in self._entries.values())
+
+    def _enforce_budget(self):
+        """Evict least recently used idle models until resident models fit the budget."""
+        if self.memory_budget_bytes is None:
+            return
+        total = self.resident_bytes()
+        for name, entry in list(self._entries.items()):
+            if total <= self.memory_budget_bytes:
+                break
+            if entry.pinned or entry.active or entry.size_bytes is None:
+                continue
+            total -= entry.size_bytes
+            self._evict(name)
+
+    def _evict(self, name: str):
+        entry = self._entries.pop(name)
+        entry.scheduler.close()
+        entry.manager.shutdown()
+        entry.manager.model = None
+        self.evictions[name] += 1
+
+    def resident(self) -> List[str]:
+        """Names of the models currently loaded, least recently used first."""
+        return [name for name, entry in self._entries.items() if entry.manager.model is not None]
+
+    def render_metrics(self) -> str:
+        """Per-model load, eviction and residency metrics in Prometheus format."""
+        resident_bytes = self.resident_bytes()
+        sizes: Dict[str, int] = {name: entry.size_bytes or 0 for name, entry in self._entries.items()}
+        names = sorted(self.allowed)
+
+        def lines(metric: str, values: Dict[str, float]) -> str:
+            return "\n".join(f'{metric}{{model="{name}"}} {values.get(name, 0)}' for name in names)
+
+        resident = {name: 1 for name in self.resident()}
+        return f"""# HELP app_model_loads_total Times each model was loaded
+# TYPE app_model_loads_total counter
+{lines("app_model_loads_total", self.loads)}
+
+# HELP app_model_evictions_total Times each model was evicted to stay within the memory budget
+# TYPE app_model_evictions_total counter
+{lines("app_model_evictions_total", self.evictions)}
+
+# HELP app_model_resident Whether each model is currently loaded
+# TYPE app_model_resident gauge
+{lines("app_model_resident", resident)}
+
+# HELP app_model_memory_bytes Estimated memory held by each loaded model
+# TYPE app_model_memory_bytes gauge
+{lines("app_model_memory_bytes", sizes)}
+
+# HELP app_model_registry_memory_bytes Estimated memory held by all loaded models
+# TYPE app_model_registry_memory_bytes gauge
+app_model_registry_memory_bytes {resident_bytes}
+
+# HELP app_model_registry_budget_bytes Memory budget for loaded models (0 = unlimited)
+# TYPE app_model_registry_budget_bytes gauge
+app_model_registry_budget_bytes {self.memory_budget_bytes or 0}
+"""
@@ -1,13 +1,76 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Literal, Optional
 
 
 class SentimentRequest(BaseModel):
     text: str = Field(..., min_length=1, max_length=1000, description="Text to analyze for sentiment")
+    model: Optional[str] = Field(None, description="Model to use, one of the available models (default model if omitted)")
 
 
 class SentimentResponse(BaseModel):
     label: str = Field(..., description="Sentiment label (POSITIVE or NEGATIVE)")
     score: float = Field(..., description="Confidence score between 0 and 1")
     text: str = Field(..., description="Original input text")
-    request_id: Optional[str] = Field(None, description="Unique request identifier")
\ No newline at end of file
+    model: Optional[str] = Field(None, description="Model that produced the prediction")
+    request_id: Optional[str] = Field(None, description="Unique request identifier")
+
+
+class BatchSentimentRequest(BaseModel):
+    texts: List[str] = Field(..., min_length=1, max_length=5000, description="Texts to analyze for sentiment")
+    model: Optional[str] = Field(None, description="Model to use, one of the available models (default model if omitted)")
+
+
+class BatchItemResult(BaseModel):
+    index: int = Field(..., description="Position of the text in the request")
+    label: Optional[str] = Field(None, description="Sentiment label, absent if the item failed")
+    score: Optional[float] = Field(None, description="Confidence score, absent if the item failed")
+    error: Optional[str] = Field(None, description="Validation or prediction error for this item")
+
+
+class BatchSentimentResponse(BaseModel):
+    results: List[BatchItemResult] = Field(..., description="Per-item results in request order")
+    model: Optional[str] = Field(None, description="Model that produced the predictions")
+    request_id: Optional[str] = Field(None, description="Unique request identifier")
+
+
+
+class DocumentSentimentRequest(BaseModel):
+    text: str = Field(..., min_length=1, max_length=200000, description="Document to analyze for sentiment")
+    strategy: Literal["mean", "max", "majority"] = Field(
+        "mean", description="How window predictions are combined into the document label"
+    )
+    model: Optional[str] = Field(None, description="Model to use, one of the available models (default model if omitted)")
+
+
+class DocumentWindowResult(BaseModel):
+    label: str = Field(..., description="Sentiment label of the window")
+    score: float = Field(..., description="Confidence score of the window")
+    tokens: int = Field(..., description="Number of tokens in the window")
+
+
+class DocumentSentimentResponse(BaseModel):
+    label: str = Field(..., description="Document-level sentiment label")
+    score: float = Field(..., description="Document-level confidence score")
+    strategy: str = Field(..., description="Aggregation strategy used")
+    windows: List[DocumentWindowResult] = Field(..., description="Per-window predictions in document order")
+    model: Optional[str] = Field(None, description="Model that produced the prediction")
+    request_id: Optional[str] = Field(None, description="Unique request identifier")
+
+
+class JobRequest(BaseModel):
+    texts: List[str] = Field(..., min_length=1, max_length=1000000, description="Texts to score in the background")
+    model: Optional[str] = Field(None, description="Model to use, one of the available models (default model if omitted)")
+
+
+class JobStatusResponse(BaseModel):
+    id: str = Field(..., description="Job identifier")
+    status: Literal["queued", "running", "completed", "failed", "cancelled"] = Field(..., description="Job status")
+    model: str = Field(..., description="Model scoring the job")
+    total: int = Field(..., description="Number of input lines")
+    processed: int = Field(..., description="Lines scored so far, including failed ones")
+    failed: int = Field(..., description="Lines that could not be scored")
+    progress: float = Field(..., description="Fraction of lines processed")
+    created_at: float = Field(..., description="Submission time (Unix seconds)")
+    updated_at: float = Field(..., description="Time of the last checkpoint (Unix seconds)")
+    finished_at: Optional[float] = Field(None, description="Completion time (Unix seconds)")
+    error: Optional[str] = Field(None, description="Why the job failed")
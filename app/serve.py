@@ -0,0 +1,177 @@
+"""
+Pre-fork server: loads the model once in the parent process, then forks
+uvicorn workers that share its weights copy-on-write.
+
+Run with ``python -m app.serve``; the worker count and per-worker torch
+thread counts come from Settings (WORKERS, TORCH_THREADS_PER_WORKER,
+TORCH_INTEROP_THREADS_PER_WORKER).
+"""
+
+import gc
+import json
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Dict, Optional
+from .config import settings
+from .exceptions import ModelError
+from .system import node_memory, process_memory
+
+logger = logging.getLogger(__name__)
+
+
+def _configure_torch_threads():
+    """Apply the per-worker torch thread settings."""
+    if settings.torch_threads_per_worker is None and settings.torch_interop_threads_per_worker is None:
+        return
+    import torch
+    if settings.torch_threads_per_worker is not None:
+        torch.set_num_threads(settings.torch_threads_per_worker)
+    if settings.torch_interop_threads_per_worker is not None:
+        torch.set_num_interop_threads(settings.torch_interop_threads_per_worker)
+
+
+def _create_socket() -> socket.socket:
+    """Bind the listening socket in the parent so all workers accept from it."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((settings.host, settings.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(worker: int, sock: socket.socket):
+    """Body of a forked worker: configure threads and serve the shared app."""
+    import uvicorn
+    from .main import app
+
+    os.environ["APP_WORKER_ID"] = str(worker)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    _configure_torch_threads()
+
+    config = uvicorn.Config(app, log_level="info" if settings.debug else "warning")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def _fork_worker(worker: int, sock: socket.socket) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            _run_worker(worker, sock)
+        except BaseException:
+            logger.exception(f"Worker {worker} crashed")
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+
+def _log_memory(workers: Dict[int, int]):
+    """Log per-worker memory and the node totals for pod sizing."""
+    per_worker = {str(worker): process_memory(pid) for pid, worker in workers.items()}
+    report = {
+        "event": "memory_report",
+        "parent": process_memory(),
+        "workers": per_worker,
+        "workers_total_pss": sum(m["pss"] for m in per_worker.values()),
+        "workers_total_rss": sum(m["rss"] for m in per_worker.values()),
+        "node": node_memory(),
+    }
+    logger.info(json.dumps(report))
+
+
+def prefork_unsupported_reason() -> Optional[str]:
+    """Why the configuration cannot share one model across forked workers, if it cannot."""
+    if settings.inference_executor == "process":
+        return "pre-fork serving shares one in-process model and INFERENCE_EXECUTOR=process is set"
+    if settings.inference_backend == "onnx":
+        return "ONNX Runtime sessions are not fork-safe"
+    if settings.autotune == "startup":
+        # Benchmarking would start torch's thread pool in the parent before forking
+        return "AUTOTUNE=startup would start torch's thread pool before forking"
+    return None
+
+
+def _serve_uvicorn():
+    """Plain uvicorn serving, each worker loading its own model in its lifespan."""
+    import uvicorn
+
+    uvicorn.run(
+        "app.main:app",
+        host=settings.host,
+        port=settings.port,
+        workers=settings.workers,
+        log_level="info" if settings.debug else "warning"
+    )
+
+
+def serve():
+    """Load the model, fork the configured number of workers and supervise them."""
+    reason = prefork_unsupported_reason()
+    if reason:
+        logger.warning(f"Falling back to plain uvicorn serving: {reason}; workers do not share weights")
+        _serve_uvicorn()
+        return
+
+    from .main import model_manager
+
+    # Load synchronously: no executor threads may exist before fork
+    start = time.perf_counter()
+    model_manager._load_model()
+    model_manager.load_seconds = time.perf_counter() - start
+    logger.info(f"Model loaded in parent in {model_manager.load_seconds:.2f}s")
+
+    # Move everything allocated so far out of the GC's reach so collections in the
+    # workers don't write to (and un-share) the pages holding the model
+    gc.collect()
+    gc.freeze()
+
+    sock = _create_socket()
+    workers = {_fork_worker(worker, sock): worker for worker in range(settings.workers)}
+    logger.info(f"Started {len(workers)} workers on {settings.host}:{settings.port}")
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    next_report = time.monotonic() + settings.memory_report_interval_seconds
+    while workers:
+        pid, status = os.waitpid(-1, os.WNOHANG)
+        if pid in workers:
+            worker = workers.pop(pid)
+            if not stopping:
+                logger.warning(f"Worker {worker} (pid {pid}) exited with status {status}; restarting")
+                workers[_fork_worker(worker, sock)] = worker
+            continue
+
+        if time.monotonic() >= next_report:
+            _log_memory(workers)
+            next_report = time.monotonic() + settings.memory_report_interval_seconds
+        time.sleep(0.5)
+
+    sock.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s", stream=sys.stdout)
+    try:
+        serve()
+    except ModelError as e:
+        logger.error(str(e))
+        sys.exit(1)
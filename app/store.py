@@ -0,0 +1,203 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# SQLite caps the number of bound parameters per statement
+_MAX_PARAMS = 500
+# Buffered read times written out even if nothing else is being written
+_MAX_TOUCHED = 10_000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    value TEXT NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed);
+"""
+
+
+def model_identity(model_name: str, revision: Optional[str] = None) -> str:
+    """The model a stored result belongs to; results of any other model are invalid."""
+    return f"{model_name}@{revision or ''}"
+
+
+class ResultStore:
+    """On-disk prediction store shared by every worker process on a node.
+
+    Results live in a SQLite database in WAL mode, so readers in several
+    processes never block each other or the writer. Keys are cache keys (text
+    hash plus model identity). Opening the store deletes results of models
+    other than ``models``, so changing MODEL_NAME or MODEL_REVISION invalidates
+    them. Once more than ``max_entries`` results are stored, the least recently
+    read ones are compacted away. Read times are buffered in memory and written
+    in the next write transaction, so lookups never take the database's single
+    write lock. Database errors are logged and treated as misses so the store
+    can never fail a prediction.
+    """
+
+    def __init__(self, path: str, models: Iterable[str], max_entries: int = 1_000_000,
+                 compact_every: Optional[int] = None):
+        self.path = path
+        self.models = sorted(set(models))
+        self.max_entries = max_entries
+        # Compaction scans the table, so only run it after enough new writes
+        self.compact_every = compact_every or max(1, max_entries // 10)
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.compacted = 0
+        self.errors = 0
+        self._writes_since_compaction = 0
+        # Keys read since the last write, with when they were read
+        self._touched: Dict[str, float] = {}
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the database once per process (connections must not cross a fork)."""
+        if self._conn is not None and self._pid == os.getpid():
+            return self._conn
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None, check_same_thread=False)
+        # auto_vacuum only takes effect before the first table is created
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        placeholders = ",".join("?" * len(self.models))
+        conn.execute(f"DELETE FROM results WHERE model NOT IN ({placeholders})", self.models)
+        self._conn = conn
+        self._pid = os.getpid()
+        return conn
+
+    def get_many(self, keys: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Look up many keys in as few queries as possible; returns only the hits."""
+        found: Dict[str, Dict[str, Any]] = {}
+        if not keys:
+            return found
+        try:
+            with self._lock:
+                conn = self._connect()
+                for start in range(0, len(keys), _MAX_PARAMS):
+                    chunk = keys[start:start + _MAX_PARAMS]
+                    placeholders = ",".join("?" * len(chunk))
+                    rows = conn.execute(
+                        f"SELECT key, value FROM results WHERE key IN ({placeholders})", chunk
+                    ).fetchall()
+                    found.update((key, json.loads(value)) for key, value in rows)
+                if found:
+                    now = time.time()
+                    self._touched.update((key, now) for key in found)
+                    if len(self._touched) >= _MAX_TOUCHED:
+                        self._flush_touched(conn)
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning(f"Result store lookup failed: {e}")
+            found = {}
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, model: str, results: Dict[str, Dict[str, Any]]):
+        """Store predictions for one model in a single transaction."""
+        if not results:
+            return
+        now = time.time()
+        rows = [(key, model, json.dumps(value), now) for key, value in results.items()]
+        try:
+            with self._lock:
+                conn = self._connect()
+                self._write(conn, rows)
+                self.writes += len(rows)
+                self._writes_since_compaction += len(rows)
+                if self._writes_since_compaction >= self.compact_every:
+                    self._compact(conn)
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning(f"Result store write failed: {e}")
+
+    def _write(self, conn: sqlite3.Connection, rows: List[tuple]):
+        """Insert rows and flush the buffered read times in one transaction."""
+        touched = [(accessed, key) for key, accessed in self._touched.items()]
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if touched:
+                conn.executemany("UPDATE results SET accessed = ? WHERE key = ?", touched)
+            if rows:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO results (key, model, value, accessed) VALUES (?, ?, ?, ?)", rows
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self._touched.clear()
+
+    def _flush_touched(self, conn: sqlite3.Connection):
+        """Write the buffered read times; a busy database only delays them."""
+        try:
+            self._write(conn, [])
+        except sqlite3.Error as e:
+            logger.warning(f"Result store could not record read times: {e}")
+
+    def compact(self):
+        """Delete the least recently read results beyond ``max_entries``."""
+        try:
+            with self._lock:
+                conn = self._connect()
+                self._write(conn, [])
+                self._compact(conn)
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning(f"Result store compaction failed: {e}")
+
+    def _compact(self, conn: sqlite3.Connection):
+        self._writes_since_compaction = 0
+        excess = conn.execute("SELECT COUNT(*) FROM results").fetchone()[0] - self.max_entries
+        if excess <= 0:
+            return
+        conn.execute(
+            "DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY accessed LIMIT ?)", (excess,)
+        )
+        # Hand the freed pages back to the filesystem
+        conn.execute("PRAGMA incremental_vacuum")
+        self.compacted += excess
+
+    def __len__(self) -> int:
+        try:
+            with self._lock:
+                return self._connect().execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        except sqlite3.Error:
+            return 0
+
+    def close(self):
+        """Write the buffered read times and close this process's connection."""
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                if self._touched:
+                    self._flush_touched(self._conn)
+                self._conn.close()
+            self._conn = None
+            self._pid = None
+
+    def get_stats(self) -> dict:
+        """Get this process's store counters and the shared entry count."""
+        return {
+            "size": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "compacted": self.compacted,
+            "errors": self.errors
+        }
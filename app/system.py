@@ -0,0 +1,49 @@
+import os
+from typing import Dict, Optional
+
+
+def _read_kb_fields(path: str) -> Dict[str, int]:
+    """Parse a /proc file of 'Key:   123 kB' lines into a dict of byte counts."""
+    fields = {}
+    try:
+        with open(path) as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                parts = value.split()
+                if parts and parts[0].isdigit():
+                    multiplier = 1024 if len(parts) > 1 and parts[1] == "kB" else 1
+                    fields[key.strip()] = int(parts[0]) * multiplier
+    except OSError:
+        pass
+    return fields
+
+
+def process_memory(pid: Optional[int] = None) -> Dict[str, int]:
+    """Memory usage of a process in bytes.
+
+    ``pss`` splits shared pages evenly between the processes mapping them, so
+    summing it across pre-forked workers gives their real combined footprint.
+    """
+    proc = f"/proc/{pid or 'self'}"
+    rollup = _read_kb_fields(f"{proc}/smaps_rollup")
+    status = _read_kb_fields(f"{proc}/status")
+    return {
+        "rss": rollup.get("Rss", status.get("VmRSS", 0)),
+        "pss": rollup.get("Pss", 0),
+        "shared": rollup.get("Shared_Clean", 0) + rollup.get("Shared_Dirty", 0),
+        "private": rollup.get("Private_Clean", 0) + rollup.get("Private_Dirty", 0),
+    }
+
+
+def node_memory() -> Dict[str, int]:
+    """Total and available memory of the node in bytes."""
+    meminfo = _read_kb_fields("/proc/meminfo")
+    return {
+        "total": meminfo.get("MemTotal", 0),
+        "available": meminfo.get("MemAvailable", 0),
+    }
+
+
+def worker_id() -> str:
+    """Identifier of this serving worker, set by the pre-fork server."""
+    return os.environ.get("APP_WORKER_ID", "0")
@@ -0,0 +1,84 @@
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, Optional
+
+# Inference stages in the order they happen for a request
+STAGES = ("queue_wait", "tokenization", "forward", "postprocess")
+
+_local = threading.local()
+
+
+class StageTimer:
+    """Accumulates per-stage durations (in seconds) and token counts for one model call."""
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self.tokens = 0
+
+    def add(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+
+def current_timer() -> Optional[StageTimer]:
+    """The timer active on this thread, if any."""
+    return getattr(_local, "timer", None)
+
+
+@contextmanager
+def activate(timer: Optional[StageTimer]):
+    """Make a timer current on this thread for the duration of a model call."""
+    previous = current_timer()
+    _local.timer = timer
+    try:
+        yield timer
+    finally:
+        _local.timer = previous
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block as part of a stage; a no-op when no timer is active."""
+    timer = current_timer()
+    if timer is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.add(name, time.perf_counter() - start)
+
+
+def _timed(name: str, func, count_tokens: bool = False):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with stage(name):
+            result = func(*args, **kwargs)
+        timer = current_timer()
+        if count_tokens and timer is not None:
+            input_ids = result.get("input_ids") if hasattr(result, "get") else None
+            if input_ids is not None:
+                timer.tokens += int(input_ids.shape[-1])
+        return result
+    return wrapper
+
+
+def instrument_pipeline(pipeline):
+    """Time a transformers pipeline's preprocess, forward and postprocess steps.
+
+    The wrappers are installed on the instance and only record while a timer is
+    active, so untimed calls pay a single thread-local lookup per step.
+    """
+    pipeline.preprocess = _timed("tokenization", pipeline.preprocess, count_tokens=True)
+    pipeline.forward = _timed("forward", pipeline.forward)
+    pipeline.postprocess = _timed("postprocess", pipeline.postprocess)
+    return pipeline
+
+
+def server_timing_header(stages: Dict[str, float]) -> str:
+    """Format stage durations as a Server-Timing header value in milliseconds."""
+    return ", ".join(
+        f"{name};dur={stages[name] * 1000:.2f}" for name in STAGES if name in stages
+    )
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Benchmark torch intra-op threads and batch sizes on this host.
+Loads the configured model, times every combination on the grid, picks the
+highest-throughput setting whose p99 batch latency fits the budget and saves
+the profile for the service to apply at startup (AUTOTUNE=load).
+"""
+
+import argparse
+import logging
+import sys
+from pathlib import Path
+
+# Add the parent directory to the path so we can import from app
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.autotune import default_thread_grid, save_profile, tune
+from app.backends import BACKENDS
+from app.config import settings
+from app.models import build_pipeline
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Autotune torch threads and batch size for this host.")
+    parser.add_argument("--model", default=None, help="Model name or path (default: MODEL_NAME)")
+    parser.add_argument("--backend", default=None, choices=list(BACKENDS),
+                        help="Inference backend (default: INFERENCE_BACKEND)")
+    parser.add_argument("--threads", type=int, nargs="+", default=None,
+                        help=f"Intra-op thread counts to try (default: {default_thread_grid()})")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=None,
+                        help=f"Batch sizes to try (default: {settings.autotune_batch_sizes})")
+    parser.add_argument("--sequence-length", type=int, default=None,
+                        help=f"Tokens per text (default: {settings.autotune_sequence_length})")
+    parser.add_argument("--latency-budget-ms", type=float, default=None,
+                        help=f"p99 latency budget per batch (default: {settings.autotune_latency_budget_ms})")
+    parser.add_argument("--repeats", type=int, default=5, help="Timed calls per setting")
+    parser.add_argument("--output", default=settings.autotune_profile_path, help="Where to save the profile")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    model_name = args.model or settings.model_name
+    backend = args.backend or settings.inference_backend
+    model = build_pipeline(model_name, backend)
+
+    profile = tune(model, model_name, backend, threads=args.threads, batch_sizes=args.batch_sizes,
+                   sequence_length=args.sequence_length, repeats=args.repeats,
+                   latency_budget_ms=args.latency_budget_ms)
+
+    print(f"{'threads':>8} {'batch':>6} {'mean ms':>10} {'p99 ms':>10} {'texts/s':>10}")
+    for m in profile["measurements"]:
+        print(f"{m['intra_op_threads'] or '-':>8} {m['batch_size']:>6} {m['mean_ms']:>10.2f} "
+              f"{m['p99_ms']:>10.2f} {m['throughput']:>10.1f}")
+
+    chosen = profile["chosen"]
+    note = "" if chosen["within_budget"] else " (nothing fit the budget; lowest latency chosen)"
+    print(f"Chosen: {chosen['intra_op_threads'] or 'default'} threads, batch size {chosen['batch_size']}{note}")
+    save_profile(profile, args.output)
+    print(f"Profile written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Measure per-request middleware overhead.
+Drives a trivial ASGI endpoint directly (no sockets) through no middleware,
+the previous two-layer stack (a function middleware plus a BaseHTTPMiddleware,
+each minting its own id and timestamps) and ObservabilityMiddleware, and
+prints the mean time per request and the overhead over the bare endpoint.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+import uuid
+from pathlib import Path
+
+# Add the parent directory to the path so we can import from app
+sys.path.append(str(Path(__file__).parent.parent))
+
+from starlette.applications import Starlette
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+
+from app.logs import AccessLog
+from app.middleware import MetricsCollector, ObservabilityMiddleware
+
+
+async def endpoint(request):
+    return PlainTextResponse("ok")
+
+
+def build_app() -> Starlette:
+    return Starlette(routes=[Route("/bench", endpoint)])
+
+
+def build_two_layer(collector: MetricsCollector) -> Starlette:
+    """Reconstruction of the stack ObservabilityMiddleware replaced."""
+    logger = logging.getLogger("bench.two_layer")
+    logger.propagate = False
+    logger.addHandler(logging.FileHandler(os.devnull))
+    logger.setLevel(logging.INFO)
+
+    async def log_requests(request, call_next):
+        request_id = str(uuid.uuid4())
+        start = time.time()
+        logger.info(json.dumps({"event": "request_started", "request_id": request_id,
+                                "method": request.method, "path": request.url.path}))
+        response = await call_next(request)
+        logger.info(json.dumps({"event": "request_completed", "request_id": request_id,
+                                "status_code": response.status_code,
+                                "duration_ms": (time.time() - start) * 1000}))
+        response.headers["X-Request-ID"] = request_id
+        return response
+
+    class Metrics(BaseHTTPMiddleware):
+        async def dispatch(self, request, call_next):
+            start = time.perf_counter()
+            response = await call_next(request)
+            collector.increment_requests()
+            route = getattr(request.scope.get("route"), "path", "unmatched")
+            collector.record_latency((time.perf_counter() - start) * 1000, route=route,
+                                     method=request.method, status_code=response.status_code)
+            return response
+
+    app = build_app()
+    app.add_middleware(BaseHTTPMiddleware, dispatch=log_requests)
+    app.add_middleware(Metrics)
+    return app
+
+
+def build_single_pass(collector: MetricsCollector) -> Starlette:
+    app = build_app()
+    access_log = AccessLog(stream=open(os.devnull, "w"), name="bench.single_pass")
+    app.add_middleware(ObservabilityMiddleware, metrics_collector=collector, access_log=access_log)
+    return app
+
+
+async def measure(app, requests: int) -> float:
+    """Mean seconds per request when calling the ASGI app directly."""
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    def scope():
+        return {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+                "scheme": "http", "path": "/bench", "raw_path": b"/bench", "query_string": b"",
+                "root_path": "", "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 1),
+                "server": ("bench", 80)}
+
+    # Warm up routing and middleware stack construction
+    for _ in range(min(requests, 200)):
+        await app(scope(), receive, send)
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        await app(scope(), receive, send)
+    return (time.perf_counter() - start) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure per-request middleware overhead.")
+    parser.add_argument("--requests", type=int, default=20000, help="Requests per configuration")
+    args = parser.parse_args()
+
+    configurations = {
+        "no middleware": build_app(),
+        "two-layer stack": build_two_layer(MetricsCollector()),
+        "ObservabilityMiddleware": build_single_pass(MetricsCollector()),
+    }
+    results = {name: asyncio.run(measure(app, args.requests)) for name, app in configurations.items()}
+
+    baseline = results["no middleware"]
+    for name, seconds in results.items():
+        print(f"{name:>24}: {seconds * 1e6:8.1f} us/request  (+{(seconds - baseline) * 1e6:.1f} us overhead)")
+    saved = results["two-layer stack"] - results["ObservabilityMiddleware"]
+    print(f"{'saved':>24}: {saved * 1e6:8.1f} us/request")
+
+
+if __name__ == "__main__":
+    main()
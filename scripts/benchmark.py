@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Load-test and latency-regression benchmark.
+
+``run`` replays a JSONL workload (one object per line, like
+benchmarks/workload.jsonl) against /api/v1/analyze at several concurrency
+levels and reports throughput and p50/p99 latency. Requests go either to the
+app in-process through httpx's ASGI transport or over real HTTP, to a server
+started in a background thread or an external ``--url``. The model is either
+a stub with a fixed per-call latency or the real configured model.
+
+``compare`` checks a candidate result file against a baseline and exits
+non-zero if throughput or latency regressed beyond the threshold.
+
+Examples:
+    python scripts/benchmark.py run --model stub --stub-latency-ms 20 --output base.json
+    python scripts/benchmark.py run --transport http --model real --output real.json
+    python scripts/benchmark.py compare base.json candidate.json --threshold 0.1
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# Add the parent directory to the path so we can import from app
+sys.path.append(str(Path(__file__).parent.parent))
+
+import httpx
+
+from app.config import settings
+
+DEFAULT_WORKLOAD = Path(__file__).parent.parent / "benchmarks" / "workload.jsonl"
+ANALYZE_PATH = "/api/v1/analyze"
+
+
+class StubPipeline:
+    """Stands in for the model: sleeps a fixed time per call and returns a constant label."""
+
+    def __init__(self, latency_ms: float):
+        self.latency = latency_ms / 1000
+
+    def __call__(self, texts: List[str], batch_size: int = 1, **kwargs) -> List[Dict[str, Any]]:
+        time.sleep(self.latency)
+        return [{"label": "POSITIVE", "score": 0.99} for _ in texts]
+
+
+def load_workload(path: str, text_field: str) -> List[str]:
+    """Read the texts of a JSONL workload, clipped to the API's length limit."""
+    texts = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                texts.append(str(json.loads(line)[text_field])[:settings.max_text_length])
+    if not texts:
+        raise SystemExit(f"No texts found in {path}")
+    return texts
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))]
+
+
+async def prepare_app(model: str, stub_latency_ms: float):
+    """Install the stub model or load and warm up the real one, and quiet per-request logs."""
+    from app.main import access_log, app, model_manager
+
+    # Keep serializing access log records, but don't let terminal output skew the timings
+    access_log.output.setStream(open(os.devnull, "w"))
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    if model == "stub":
+        model_manager.model = StubPipeline(stub_latency_ms)
+        model_manager.ready = True
+    else:
+        await model_manager.warmup()
+    app.state.model_loaded = True
+
+
+def start_server() -> str:
+    """Serve the app from a background thread on a free local port and return its URL."""
+    import uvicorn
+    from app.main import app
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(("127.0.0.1", 0))
+    server = uvicorn.Server(uvicorn.Config(app, log_level="warning", lifespan="off"))
+    threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+
+async def run_level(client: httpx.AsyncClient, texts: List[str], concurrency: int,
+                    requests: int) -> Dict[str, Any]:
+    """Send ``requests`` analyze calls from ``concurrency`` concurrent clients."""
+    workload = itertools.islice(itertools.cycle(texts), requests)
+    latencies: List[float] = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        for text in workload:
+            start = time.perf_counter()
+            try:
+                response = await client.post(ANALYZE_PATH, json={"text": text})
+                ok = response.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 3) if latencies else None,
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3) if latencies else None,
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3) if latencies else None,
+    }
+
+
+async def run_benchmark(args) -> Dict[str, Any]:
+    texts = load_workload(args.workload, args.text_field)
+
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout)
+    else:
+        await prepare_app(args.model, args.stub_latency_ms)
+        if args.transport == "http":
+            client = httpx.AsyncClient(base_url=start_server(), timeout=args.timeout)
+        else:
+            from app.main import app
+            client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app),
+                                       base_url="http://benchmark", timeout=args.timeout)
+
+    results = []
+    async with client:
+        # Warm connections, the batching worker and the model
+        await run_level(client, texts, min(args.concurrency), min(len(texts), 20))
+        for concurrency in args.concurrency:
+            level = await run_level(client, texts, concurrency, args.requests)
+            results.append(level)
+            print(
+                f"concurrency {concurrency:>4}: {level['throughput_rps']:>9.1f} req/s  "
+                f"p50 {level['p50_ms']} ms  p99 {level['p99_ms']} ms  errors {level['errors']}"
+            )
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "commit": git_commit(),
+            "transport": "external" if args.url else args.transport,
+            "url": args.url,
+            "model": "external" if args.url else args.model,
+            "model_name": settings.model_name,
+            "stub_latency_ms": args.stub_latency_ms if args.model == "stub" and not args.url else None,
+            "workload": str(args.workload),
+            "batch_max_size": settings.batch_max_size,
+            "batch_max_wait_ms": settings.batch_max_wait_ms,
+        },
+        "results": results,
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(baseline: Dict[str, Any], candidate: Dict[str, Any], threshold: float) -> List[str]:
+    """Describe every concurrency level where the candidate regressed beyond the threshold."""
+    regressions = []
+    base_levels = {level["concurrency"]: level for level in baseline["results"]}
+
+    for level in candidate["results"]:
+        base = base_levels.get(level["concurrency"])
+        if base is None:
+            continue
+        if base["throughput_rps"] and level["throughput_rps"] < base["throughput_rps"] * (1 - threshold):
+            regressions.append(
+                f"concurrency {level['concurrency']}: throughput {base['throughput_rps']} -> "
+                f"{level['throughput_rps']} req/s"
+            )
+        for key in ("p50_ms", "p99_ms"):
+            if base[key] and level[key] and level[key] > base[key] * (1 + threshold):
+                regressions.append(
+                    f"concurrency {level['concurrency']}: {key} {base[key]} -> {level[key]} ms"
+                )
+        if level["errors"] > base["errors"]:
+            regressions.append(
+                f"concurrency {level['concurrency']}: errors {base['errors']} -> {level['errors']}"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test and latency-regression benchmark.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Replay a workload and record throughput and latency")
+    run.add_argument("--workload", default=str(DEFAULT_WORKLOAD), help="JSONL workload file")
+    run.add_argument("--text-field", default="text", help="Field holding the text in the workload")
+    run.add_argument("--transport", choices=["asgi", "http"], default="asgi",
+                     help="Call the app in-process or over HTTP from a background server")
+    run.add_argument("--url", default=None, help="Benchmark an already running server instead")
+    run.add_argument("--model", choices=["stub", "real"], default="stub",
+                     help="Stub model with fixed latency, or the configured model")
+    run.add_argument("--stub-latency-ms", type=float, default=20.0, help="Stub model latency per call")
+    run.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 128],
+                     help="Concurrency levels to measure")
+    run.add_argument("--requests", type=int, default=1000, help="Requests per concurrency level")
+    run.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds")
+    run.add_argument("--output", default=None, help="Write results to this JSON file")
+
+    compare = commands.add_parser("compare", help="Flag regressions between two result files")
+    compare.add_argument("baseline", help="Baseline results JSON")
+    compare.add_argument("candidate", help="Candidate results JSON")
+    compare.add_argument("--threshold", type=float, default=0.1,
+                         help="Allowed relative slowdown (0.1 = 10%%)")
+
+    args = parser.parse_args()
+
+    if args.command == "run":
+        report = asyncio.run(run_benchmark(args))
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+            print(f"Results written to {args.output}")
+        return
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.candidate, encoding="utf-8") as f:
+        candidate = json.load(f)
+    regressions = compare_results(baseline, candidate, args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if regressions:
+        sys.exit(1)
+    print(f"No regressions beyond {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
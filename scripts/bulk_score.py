@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Offline bulk scorer for JSONL corpora.
+Streams the input through a pool of model worker processes and writes one
+JSON result per input line, checkpointing progress so runs can be resumed.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+from collections import deque
+from pathlib import Path
+
+# Add the parent directory to the path so we can import from app
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.config import settings
+
+# Pipeline owned by each worker process
+_pipeline = None
+
+
+def _init_worker(model_name: str, threads: int):
+    """Load the model in the worker the same way ModelManager does."""
+    global _pipeline
+    import torch
+    from app.models import build_pipeline
+    # Each worker would otherwise start one intra-op thread per core and oversubscribe the CPUs
+    torch.set_num_threads(threads)
+    _pipeline = build_pipeline(model_name)
+
+
+def _score_chunk(chunk, batch_size: int):
+    """Score a chunk of (line, id, text, error) items in length-sorted sub-batches."""
+    from app.batching import bucket_by_length
+
+    results = [None] * len(chunk)
+    valid = [i for i, item in enumerate(chunk) if item[3] is None]
+    texts = [chunk[i][2] for i in valid]
+
+    if texts:
+        tokenizer = getattr(_pipeline, "tokenizer", None)
+        if tokenizer is not None:
+            lengths = [len(ids) for ids in tokenizer(texts, truncation=True)["input_ids"]]
+        else:
+            lengths = [len(text) for text in texts]
+
+        for bucket in bucket_by_length(lengths, batch_size):
+            bucket_texts = [texts[j] for j in bucket]
+            try:
+                predictions = _pipeline(bucket_texts, batch_size=len(bucket_texts), truncation=True)
+            except Exception as e:
+                predictions = [{"error": f"Model prediction failed: {e}"}] * len(bucket)
+            for j, prediction in zip(bucket, predictions):
+                results[valid[j]] = prediction
+
+    records = []
+    for (line, record_id, _, error), prediction in zip(chunk, results):
+        record = {"line": line}
+        if record_id is not None:
+            record["id"] = record_id
+        if error is not None:
+            record["error"] = error
+        elif "error" in prediction:
+            record["error"] = prediction["error"]
+        else:
+            record["label"] = prediction["label"]
+            record["score"] = prediction["score"]
+        records.append(record)
+    return records
+
+
+def iter_chunks(path: str, start_line: int, chunk_size: int, text_field: str, id_field: str = None):
+    """Lazily yield chunks of (line, id, text, error) from a JSONL file, skipping already scored lines."""
+    chunk = []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f):
+            if line_number < start_line:
+                continue
+            if not line.strip():
+                continue
+
+            record_id, text, error = None, None, None
+            try:
+                record = json.loads(line)
+                record_id = record.get(id_field) if id_field else None
+                text = record.get(text_field)
+                if not isinstance(text, str) or not text:
+                    error = f"Missing or empty '{text_field}' field"
+            except (json.JSONDecodeError, AttributeError) as e:
+                error = f"Invalid JSON: {e}"
+
+            chunk.append((line_number, record_id, text, error))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+def load_checkpoint(path: str) -> dict:
+    """Read the checkpoint, defaulting to the start of the file."""
+    if not os.path.exists(path):
+        return {"next_line": 0, "output_bytes": 0}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_checkpoint(path: str, next_line: int, output_bytes: int):
+    """Atomically record how far the input has been scored and written."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"next_line": next_line, "output_bytes": output_bytes}, f)
+    os.replace(tmp_path, path)
+
+
+def bulk_score(input_path: str, output_path: str, text_field: str = "text", id_field: str = None,
+               workers: int = None, batch_size: int = None, chunk_size: int = None,
+               checkpoint_path: str = None, model_name: str = None, threads: int = None):
+    """Score every line of a JSONL file and write results to another JSONL file."""
+    workers = workers or os.cpu_count() or 1
+    # Split the cores between the workers' torch thread pools
+    threads = threads or max(1, (os.cpu_count() or 1) // workers)
+    batch_size = batch_size or settings.batch_bucket_size
+    chunk_size = chunk_size or batch_size * 8
+    checkpoint_path = checkpoint_path or f"{output_path}.ckpt"
+    model_name = model_name or settings.model_name
+    # Bound the number of chunks held in memory regardless of input size
+    max_in_flight = workers * 2
+
+    checkpoint = load_checkpoint(checkpoint_path)
+    if checkpoint["next_line"]:
+        print(f"Resuming from line {checkpoint['next_line']}", file=sys.stderr)
+
+    # Drop any output written after the last checkpoint so lines are never duplicated
+    mode = "r+b" if os.path.exists(output_path) else "wb"
+    scored = 0
+    with open(output_path, mode) as out:
+        out.truncate(checkpoint["output_bytes"])
+        out.seek(checkpoint["output_bytes"])
+
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(workers, initializer=_init_worker, initargs=(model_name, threads)) as pool:
+            pending = deque()
+
+            def drain_one():
+                nonlocal scored
+                last_line, result = pending.popleft()
+                records = result.get()
+                for record in records:
+                    out.write(json.dumps(record).encode("utf-8") + b"\n")
+                out.flush()
+                scored += len(records)
+                save_checkpoint(checkpoint_path, last_line + 1, out.tell())
+
+            for chunk in iter_chunks(input_path, checkpoint["next_line"], chunk_size, text_field, id_field):
+                pending.append((chunk[-1][0], pool.apply_async(_score_chunk, (chunk, batch_size))))
+                if len(pending) >= max_in_flight:
+                    drain_one()
+                    print(f"Scored {scored} lines", file=sys.stderr)
+
+            while pending:
+                drain_one()
+
+    print(f"Done: scored {scored} lines into {output_path}", file=sys.stderr)
+    return scored
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score a JSONL file with the sentiment model.")
+    parser.add_argument("input", help="Input JSONL file")
+    parser.add_argument("output", help="Output JSONL file (appended to when resuming)")
+    parser.add_argument("--text-field", default="text", help="Field holding the text to score")
+    parser.add_argument("--id-field", default=None, help="Field copied to each result as 'id'")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="Torch threads per worker (default: CPU count / workers)")
+    parser.add_argument("--batch-size", type=int, default=None, help="Texts per forward pass")
+    parser.add_argument("--chunk-size", type=int, default=None, help="Lines sent to a worker at once")
+    parser.add_argument("--checkpoint", default=None, help="Checkpoint file (default: <output>.ckpt)")
+    parser.add_argument("--model", default=None, help="Model name or path (default: MODEL_NAME)")
+    args = parser.parse_args()
+
+    bulk_score(
+        args.input,
+        args.output,
+        text_field=args.text_field,
+        id_field=args.id_field,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        chunk_size=args.chunk_size,
+        checkpoint_path=args.checkpoint,
+        model_name=args.model,
+        threads=args.threads
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Check that inference backends agree with each other.
+Runs the same texts through every requested backend and compares labels and
+scores against the first (reference) backend, exiting non-zero if any backend
+disagrees beyond the tolerance.
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# Add the parent directory to the path so we can import from app
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.backends import BACKENDS, load_pipeline
+from app.config import settings
+
+SAMPLE_TEXTS = [
+    "I love this product!",
+    "This is terrible and I hate it",
+    "It arrived on time.",
+    "Not bad at all, would buy again",
+    "The battery died after two days and support never answered my emails.",
+    "Absolutely fantastic experience from start to finish, highly recommended to everyone.",
+]
+
+
+def load_texts(path: str, text_field: str, limit: int):
+    """Read up to `limit` texts from a JSONL file."""
+    texts = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                texts.append(json.loads(line)[text_field])
+            if len(texts) >= limit:
+                break
+    return texts
+
+
+def compare_backends(backends, texts, tolerance: float, model_name: str, batch_size: int = 8) -> bool:
+    """Compare every backend against the first one and print a summary."""
+    predictions = {}
+    for backend in backends:
+        model = load_pipeline(model_name, backend)
+        predictions[backend] = model(texts, batch_size=batch_size, truncation=True)
+
+    reference, *others = backends
+    agree = True
+    for backend in others:
+        label_mismatches = sum(
+            a["label"] != b["label"] for a, b in zip(predictions[reference], predictions[backend])
+        )
+        max_score_diff = max(
+            abs(a["score"] - b["score"]) for a, b in zip(predictions[reference], predictions[backend])
+        )
+        ok = label_mismatches == 0 and max_score_diff <= tolerance
+        agree = agree and ok
+        print(
+            f"{backend} vs {reference}: {label_mismatches}/{len(texts)} label mismatches, "
+            f"max score difference {max_score_diff:.5f} [{'OK' if ok else 'FAIL'}]"
+        )
+    return agree
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that inference backends agree.")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=list(BACKENDS),
+                        help="Backends to compare; the first is the reference")
+    parser.add_argument("--tolerance", type=float, default=0.02, help="Maximum allowed score difference")
+    parser.add_argument("--input", default=None, help="Optional JSONL file of texts to compare on")
+    parser.add_argument("--text-field", default="text", help="Field holding the text in --input")
+    parser.add_argument("--limit", type=int, default=500, help="Maximum texts read from --input")
+    parser.add_argument("--model", default=None, help="Model name or path (default: MODEL_NAME)")
+    args = parser.parse_args()
+
+    texts = load_texts(args.input, args.text_field, args.limit) if args.input else SAMPLE_TEXTS
+    if not compare_backends(args.backends, texts, args.tolerance, args.model or settings.model_name):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
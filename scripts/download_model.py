@@ -2,8 +2,11 @@
 """
 Script to pre-download the sentiment analysis model and tokenizer.
 This avoids downloading during application startup.
+MODEL_NAME and every model in AVAILABLE_MODELS are downloaded.
+Pass --onnx to also export each of them for the ONNX Runtime backend.
 """
 
+import argparse
 import os
 import sys
 from pathlib import Path
@@ -11,37 +14,48 @@ from pathlib import Path
 # Add the parent directory to the path so we can import from app
 sys.path.append(str(Path(__file__).parent.parent))
 
-from transformers import pipeline
+from app.backends import load_pipeline, resolve_model_path, revision_for
 from app.config import settings
 
 
-def download_model():
-    """Download and cache the sentiment analysis model."""
-    print(f"Downloading model: {settings.model_name}")
+def configured_models():
+    """The default model followed by the other models requests may choose, without duplicates."""
+    return list(dict.fromkeys([settings.model_name, *settings.available_models]))
+
+
+def download_model(export_onnx_model: bool = False):
+    """Download and cache every configured sentiment analysis model."""
     print(f"Cache directory: {settings.model_cache_dir}")
     
     # Create cache directory if it doesn't exist
     os.makedirs(settings.model_cache_dir, exist_ok=True)
     
     try:
-        # Load the pipeline, which will download and cache the model
-        sentiment_pipeline = pipeline(
-            "sentiment-analysis",
-            model=settings.model_name,
-            tokenizer=settings.model_name,
-            cache_dir=settings.model_cache_dir
-        )
-        
-        print("Model downloaded successfully!")
-        
-        # Test the model with a simple example
-        test_result = sentiment_pipeline("This is a test.")
-        print(f"Test result: {test_result}")
+        for model_name in configured_models():
+            print(f"Downloading model: {model_name}")
+            
+            # Download config, tokenizer and safetensors weights into the cache
+            model_path = resolve_model_path(model_name, revision_for(model_name), offline=False)
+            print(f"Model downloaded successfully to: {model_path}")
+            
+            # Load it back exactly as the service does in offline mode
+            sentiment_pipeline = load_pipeline(model_name, "pytorch")
+            
+            # Test the model with a simple example
+            test_result = sentiment_pipeline("This is a test.")
+            print(f"Test result: {test_result}")
+            
+            if export_onnx_model:
+                from app.backends import export_onnx
+                onnx_path = export_onnx(model_name)
+                print(f"ONNX model exported to: {onnx_path}")
         
     except Exception as e:
         print(f"Error downloading model: {e}")
         sys.exit(1)
 
-
 if __name__ == "__main__":
-    download_model()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Pre-download the sentiment analysis model.")
+    parser.add_argument("--onnx", action="store_true", help="Also export each model to ONNX")
+    args = parser.parse_args()
+    download_model(export_onnx_model=args.onnx)
\ No newline at end of file
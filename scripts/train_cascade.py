@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Train the cascade's first-stage classifier and measure its agreement.
+Labels a JSONL corpus with the full model (or reads labels it already has),
+fits the cheap classifier on most of it and reports, on the held-out rest,
+how many texts each confidence threshold short-circuits and how often the
+cascade still agrees with the full model. With --evaluate an existing cascade
+is only measured.
+"""
+
+import argparse
+import json
+import random
+import sys
+from pathlib import Path
+
+# Add the parent directory to the path so we can import from app
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.backends import BACKENDS, revision_for
+from app.batching import bucket_by_length
+from app.cascade import CascadeClassifier, choose_threshold, evaluate
+from app.config import settings
+from app.store import model_identity
+
+THRESHOLDS = [0.6, 0.7, 0.8, 0.85, 0.9, 0.95, 0.97, 0.99]
+
+
+def load_records(path: str, text_field: str, label_field, limit: int):
+    """Read up to `limit` texts, and labels if `label_field` is given, from a JSONL file."""
+    texts, labels = [], []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            texts.append(record[text_field])
+            if label_field:
+                labels.append(record[label_field])
+            if len(texts) >= limit:
+                break
+    return texts, labels
+
+
+def label_with_model(texts, model_name: str, backend: str, batch_size: int):
+    """Label texts with the full model in length-sorted batches."""
+    from app.models import build_pipeline
+
+    model = build_pipeline(model_name, backend)
+    labels = [None] * len(texts)
+    for bucket in bucket_by_length([len(text) for text in texts], batch_size):
+        batch = [texts[i] for i in bucket]
+        for i, prediction in zip(bucket, model(batch, batch_size=len(batch), truncation=True)):
+            labels[i] = prediction["label"]
+    return labels
+
+
+def print_report(rows, min_agreement: float):
+    print(f"{'threshold':>9} {'short-circuit':>14} {'answered agree':>15} {'end-to-end agree':>17}")
+    for row in rows:
+        print(f"{row['threshold']:>9.2f} {row['short_circuit']:>14.1%} "
+              f"{row['answered_agreement']:>15.2%} {row['agreement']:>17.2%}")
+    best = choose_threshold(rows, min_agreement)
+    if best is None:
+        print(f"No threshold keeps end-to-end agreement at {min_agreement:.2%}")
+    else:
+        print(f"Suggested: CASCADE_THRESHOLD={best['threshold']} "
+              f"({best['short_circuit']:.1%} short-circuited, {best['agreement']:.2%} agreement)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train and evaluate the cascade's first stage.")
+    parser.add_argument("input", help="JSONL corpus of representative texts")
+    parser.add_argument("--text-field", default="text", help="Field holding the text")
+    parser.add_argument("--label-field", default=None,
+                        help="Field holding labels already produced by the full model (default: run it)")
+    parser.add_argument("--limit", type=int, default=200_000, help="Maximum texts read")
+    parser.add_argument("--model", default=None, help="Model name or path (default: MODEL_NAME)")
+    parser.add_argument("--backend", default=None, choices=list(BACKENDS),
+                        help="Inference backend for labelling (default: INFERENCE_BACKEND)")
+    parser.add_argument("--batch-size", type=int, default=32, help="Texts per labelling call")
+    parser.add_argument("--holdout", type=float, default=0.2, help="Fraction of texts kept for evaluation")
+    parser.add_argument("--dim", type=int, default=2 ** 18, help="Number of hashed features")
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--min-agreement", type=float, default=0.99,
+                        help="End-to-end agreement the suggested threshold must keep")
+    parser.add_argument("--evaluate", metavar="CASCADE", default=None,
+                        help="Only evaluate this cascade file on the whole input")
+    parser.add_argument("--output", default=settings.cascade_path or "./model_cache/cascade.json",
+                        help="Where to save the trained cascade")
+    args = parser.parse_args()
+
+    model_name = args.model or settings.model_name
+    texts, labels = load_records(args.input, args.text_field, args.label_field, args.limit)
+    if not labels:
+        print(f"Labelling {len(texts)} texts with {model_name}...")
+        labels = label_with_model(texts, model_name, args.backend or settings.inference_backend,
+                                  args.batch_size)
+
+    if args.evaluate:
+        cascade = CascadeClassifier.load(args.evaluate)
+        print_report(evaluate(cascade, texts, labels, THRESHOLDS), args.min_agreement)
+        return
+
+    order = list(range(len(texts)))
+    random.Random(0).shuffle(order)
+    split = int(len(order) * (1 - args.holdout))
+    train, test = order[:split], order[split:]
+
+    cascade = CascadeClassifier.train(
+        [texts[i] for i in train], [labels[i] for i in train],
+        model=model_identity(model_name, revision_for(model_name)), dim=args.dim, epochs=args.epochs
+    )
+    print(f"Trained on {len(train)} texts, evaluating on {len(test)}")
+    print_report(evaluate(cascade, [texts[i] for i in test], [labels[i] for i in test], THRESHOLDS),
+                 args.min_agreement)
+    cascade.save(args.output)
+    print(f"Cascade written to {args.output} ({len(cascade.weights)} weights)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,16 @@
 import pytest
 from fastapi.testclient import TestClient
-from unittest.mock import Mock, patch
+from unittest.mock import Mock, AsyncMock, patch
 from app.main import app
 from app.exceptions import ModelError
+from app.config import settings
+
+
+@pytest.fixture(autouse=True)
+def jobs_dir(tmp_path):
+    """Keep job files, including those of the worker the lifespan starts, out of the working tree."""
+    with patch('app.main.job_manager.directory', str(tmp_path)):
+        yield tmp_path
 
 
 @pytest.fixture
@@ -66,6 +74,31 @@ class TestAnalyzeEndpoint:
         assert data["score"] == 0.8765
         assert data["text"] == "This is terrible and I hate it"
 
+    @patch('app.main.model_manager.get_model')
+    def test_analyze_request_id_matches_header(self, mock_get_model, client, mock_model):
+        """Test that one request id is used for the response body and X-Request-ID."""
+        mock_get_model.return_value = mock_model
+        
+        response = client.post("/api/v1/analyze", json={"text": "I love this product!"})
+        
+        assert response.headers["X-Request-ID"] == response.json()["request_id"]
+
+    @patch('app.main.model_manager.get_model')
+    def test_analyze_reports_model(self, mock_get_model, client, mock_model):
+        """Test that the response names the model that served it."""
+        mock_get_model.return_value = mock_model
+        
+        response = client.post("/api/v1/analyze", json={"text": "I love this product!"})
+        
+        assert response.json()["model"] == settings.model_name
+
+    def test_analyze_unknown_model_rejected(self, client):
+        """Test that models outside AVAILABLE_MODELS are rejected."""
+        response = client.post("/api/v1/analyze", json={"text": "Hello", "model": "not-configured"})
+        
+        assert response.status_code == 400
+        assert "Unknown model" in response.json()["detail"]
+
     def test_analyze_empty_text_validation(self, client):
         """Test that empty text is rejected."""
         response = client.post(
@@ -145,14 +178,202 @@ class TestAnalyzeEndpoint:
         assert "Model prediction failed" in data["detail"]
         assert "Prediction failed" in data["detail"]
 
+    @patch('app.main.settings.server_timing', True)
+    @patch('app.main.model_manager.get_model')
+    def test_analyze_server_timing_header(self, mock_get_model, client, mock_model):
+        """Test that stage timings are reported in Server-Timing when enabled."""
+        mock_get_model.return_value = mock_model
+        
+        response = client.post("/api/v1/analyze", json={"text": "I love this product!"})
+        
+        assert response.status_code == 200
+        assert "queue_wait;dur=" in response.headers["Server-Timing"]
+        assert "forward;dur=" in response.headers["Server-Timing"]
 
-class TestHealthEndpoint:
     @patch('app.main.model_manager.get_model')
-    def test_health_check_model_loaded(self, mock_get_model, client):
-        """Test health check when model is loaded."""
-        mock_model = Mock()
+    def test_analyze_no_server_timing_by_default(self, mock_get_model, client, mock_model):
+        """Test that the Server-Timing header is off unless enabled."""
         mock_get_model.return_value = mock_model
         
+        response = client.post("/api/v1/analyze", json={"text": "I love this product!"})
+        
+        assert "Server-Timing" not in response.headers
+
+
+class TestAdmissionControl:
+    @patch('app.main.model_manager.get_model', new_callable=AsyncMock)
+    @patch('app.main.batch_scheduler.submit', new_callable=AsyncMock)
+    def test_queue_full_returns_429(self, mock_submit, mock_get_model, client):
+        """Test that a full inference queue is reported as 429 with Retry-After."""
+        from app.exceptions import QueueFullError
+        mock_submit.side_effect = QueueFullError("Inference queue is full", retry_after=3)
+        
+        response = client.post("/api/v1/analyze", json={"text": "I love this product!"})
+        
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "3"
+        assert response.json()["type"] == "QueueFullError"
+
+    @patch('app.main.model_manager.get_model', new_callable=AsyncMock)
+    @patch('app.main.batch_scheduler.submit', new_callable=AsyncMock)
+    def test_deadline_header_passed_and_expiry_returns_504(self, mock_submit, mock_get_model, client):
+        """Test that the deadline header becomes a timeout and expiry maps to 504."""
+        from app.exceptions import DeadlineExceededError
+        mock_submit.side_effect = DeadlineExceededError("Request deadline expired while queued")
+        
+        response = client.post(
+            "/api/v1/analyze",
+            json={"text": "I love this product!"},
+            headers={"X-Request-Deadline-Ms": "250"}
+        )
+        
+        assert response.status_code == 504
+        assert mock_submit.await_args.kwargs["timeout"] == 0.25
+
+    def test_invalid_deadline_header(self, client):
+        """Test that a non-numeric deadline is a validation error."""
+        response = client.post(
+            "/api/v1/analyze",
+            json={"text": "I love this product!"},
+            headers={"X-Request-Deadline-Ms": "soon"}
+        )
+        
+        assert response.status_code == 400
+        assert "X-Request-Deadline-Ms" in response.json()["detail"]
+
+
+class TestClientScheduling:
+    @patch('app.main.model_manager.get_model')
+    def test_requests_scheduled_per_client(self, mock_get_model, client, mock_model):
+        """Test that the client header selects the client queue reported in metrics."""
+        mock_get_model.return_value = mock_model
+        response = client.post("/api/v1/analyze", json={"text": "I love this product!"},
+                                headers={"X-Client-Id": "web-frontend"})
+        
+        assert response.status_code == 200
+        content = client.get("/api/v1/metrics").text
+        assert 'app_client_request_seconds_count{client="web-frontend"}' in content
+        assert "# TYPE app_client_inflight gauge" in content
+
+    def test_invalid_client_id_rejected(self, client):
+        """Test that client ids unfit for metric labels are rejected."""
+        response = client.post("/api/v1/analyze", json={"text": "I love this product!"},
+                               headers={"X-Client-Id": 'bad"id'})
+        
+        assert response.status_code == 400
+        assert "X-Client-Id" in response.json()["detail"]
+
+
+class TestDocumentEndpoint:
+    @patch('app.main.model_manager.document_windows', new_callable=AsyncMock)
+    @patch('app.main.model_manager.get_model')
+    def test_document_windows_batched_and_aggregated(self, mock_get_model, mock_windows, client):
+        """Test that every window is predicted in one model call and aggregated."""
+        mock_windows.return_value = [("good part", 400), ("bad part", 100)]
+        mock_model = Mock(return_value=[
+            {"label": "POSITIVE", "score": 0.9},
+            {"label": "NEGATIVE", "score": 0.8}
+        ])
+        mock_get_model.return_value = mock_model
+        
+        response = client.post("/api/v1/analyze/document", json={"text": "good part bad part"})
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert data["label"] == "POSITIVE"
+        assert data["strategy"] == "mean"
+        assert [w["tokens"] for w in data["windows"]] == [400, 100]
+        mock_model.assert_called_once_with(["good part", "bad part"], batch_size=2, truncation=True)
+
+    def test_document_unknown_strategy_rejected(self, client):
+        """Test that the aggregation strategy is validated."""
+        response = client.post("/api/v1/analyze/document", json={"text": "text", "strategy": "median"})
+        assert response.status_code == 422
+
+
+class TestBatchAnalyzeEndpoint:
+    @staticmethod
+    def make_batch_model():
+        """Create a mock model that labels texts by a keyword and has no tokenizer."""
+        mock = Mock()
+        mock.tokenizer = None
+        mock.side_effect = lambda texts, **kwargs: [
+            {"label": "NEGATIVE" if "bad" in t else "POSITIVE", "score": 0.9} for t in texts
+        ]
+        return mock
+
+    @patch('app.main.model_manager.get_model')
+    def test_batch_results_in_request_order(self, mock_get_model, client):
+        """Test that results come back in the original order despite length sorting."""
+        mock_get_model.return_value = self.make_batch_model()
+        texts = ["a much longer good sentence here", "bad", "good", "really bad"]
+        
+        response = client.post("/api/v1/analyze/batch", json={"texts": texts})
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert [r["index"] for r in data["results"]] == [0, 1, 2, 3]
+        assert [r["label"] for r in data["results"]] == [
+            "POSITIVE", "NEGATIVE", "POSITIVE", "NEGATIVE"
+        ]
+        assert data["request_id"] is not None
+
+    @patch('app.main.model_manager.get_model')
+    def test_batch_per_item_validation_errors(self, mock_get_model, client):
+        """Test that invalid items get an error without failing the batch."""
+        mock_model = self.make_batch_model()
+        mock_get_model.return_value = mock_model
+        
+        response = client.post(
+            "/api/v1/analyze/batch",
+            json={"texts": ["good", "", "a" * 1001]}
+        )
+        
+        assert response.status_code == 200
+        results = response.json()["results"]
+        assert results[0]["label"] == "POSITIVE"
+        assert results[0]["error"] is None
+        assert "at least 1 character" in results[1]["error"]
+        assert "at most 1000 characters" in results[2]["error"]
+        # Invalid items never reach the model
+        mock_model.assert_called_once_with(["good"], batch_size=1, truncation=True)
+
+    @patch('app.main.model_manager.get_model')
+    def test_batch_prediction_error_is_per_item(self, mock_get_model, client):
+        """Test that a failed sub-batch reports errors on its items."""
+        mock_model = self.make_batch_model()
+        mock_model.side_effect = Exception("Prediction failed")
+        mock_get_model.return_value = mock_model
+        
+        response = client.post("/api/v1/analyze/batch", json={"texts": ["good", "bad"]})
+        
+        assert response.status_code == 200
+        results = response.json()["results"]
+        assert all("Prediction failed" in r["error"] for r in results)
+        assert all(r["label"] is None for r in results)
+
+    def test_batch_empty_list_rejected(self, client):
+        """Test that an empty batch is rejected."""
+        response = client.post("/api/v1/analyze/batch", json={"texts": []})
+        assert response.status_code == 422
+
+    @patch('app.main.model_manager.get_model')
+    def test_batch_model_error_handling(self, mock_get_model, client):
+        """Test that a model load failure fails the whole batch."""
+        mock_get_model.side_effect = Exception("Model failed to load")
+        
+        response = client.post("/api/v1/analyze/batch", json={"texts": ["good"]})
+        
+        assert response.status_code == 400
+        data = response.json()
+        assert "Model prediction failed" in data["detail"]
+        assert data["type"] == "ModelError"
+
+
+class TestHealthEndpoint:
+    @patch('app.main.model_manager.model', Mock())
+    def test_health_check_model_loaded(self, client):
+        """Test health check when model is loaded."""
         response = client.get("/api/v1/health")
         
         assert response.status_code == 200
@@ -161,11 +382,10 @@ class TestHealthEndpoint:
         assert data["checks"]["model_loaded"] is True
         assert data["checks"]["service"] == "healthy"
 
+    @patch('app.main.model_manager.model', None)
     @patch('app.main.model_manager.get_model')
     def test_health_check_model_not_loaded(self, mock_get_model, client):
-        """Test health check when model fails to load."""
-        mock_get_model.side_effect = Exception("Model loading failed")
-        
+        """Test health check when the model is not loaded, without starting a load."""
         response = client.get("/api/v1/health")
         
         assert response.status_code == 503
@@ -174,6 +394,155 @@ class TestHealthEndpoint:
         assert data["reason"] == "Model not loaded"
         assert data["checks"]["model_loaded"] is False
         assert data["checks"]["service"] == "degraded"
+        mock_get_model.assert_not_called()
+
+
+class TestProbes:
+    def test_liveness_always_ok(self, client):
+        """Test that liveness does not depend on the model."""
+        response = client.get("/api/v1/health/live")
+        assert response.status_code == 200
+        assert response.json()["status"] == "alive"
+
+    @patch('app.main.model_manager.ready', False)
+    @patch('app.main.model_manager.model', None)
+    def test_readiness_while_loading(self, client):
+        """Test that readiness fails until the model is loaded and warm."""
+        response = client.get("/api/v1/health/ready")
+        
+        assert response.status_code == 503
+        data = response.json()
+        assert data["status"] == "not_ready"
+        assert data["reason"] == "Model loading"
+        assert data["checks"]["model_warm"] is False
+
+    @patch('app.main.model_manager.ready', True)
+    def test_readiness_when_warm(self, client):
+        """Test that readiness passes once warmup has finished."""
+        response = client.get("/api/v1/health/ready")
+        
+        assert response.status_code == 200
+        assert response.json()["status"] == "ready"
+
+    @patch('app.main.model_manager.warmup', new_callable=AsyncMock)
+    def test_lifespan_starts_background_loading(self, mock_warmup):
+        """Test that startup kicks off model loading and warmup."""
+        with TestClient(app) as client:
+            response = client.get("/api/v1/health/live")
+            assert response.status_code == 200
+        
+        mock_warmup.assert_awaited_once()
+
+    @patch('app.main.model_manager.warmup', new_callable=AsyncMock)
+    def test_readiness_reports_load_failure(self, mock_warmup):
+        """Test that a failed background load is reported by readiness."""
+        mock_warmup.side_effect = Exception("weights missing")
+        
+        with TestClient(app) as client:
+            response = client.get("/api/v1/health/ready")
+        app.state.model_load_error = None
+        
+        assert response.status_code == 503
+        assert "weights missing" in response.json()["reason"]
+
+
+class TestProfilingEndpoints:
+    def test_admin_disabled_without_token_setting(self, client):
+        """Test that admin endpoints refuse every call while ADMIN_TOKEN is unset."""
+        response = client.post("/api/v1/admin/profile?seconds=0.01", headers={"X-Admin-Token": ""})
+        
+        assert response.status_code == 403
+        assert response.json()["type"] == "AuthorizationError"
+
+    @patch('app.main.settings.admin_token', 'secret')
+    def test_invalid_admin_token_rejected(self, client):
+        """Test that a wrong admin token is rejected."""
+        response = client.post("/api/v1/admin/profile?seconds=0.01", headers={"X-Admin-Token": "guess"})
+        
+        assert response.status_code == 403
+
+    @patch('app.main.settings.admin_token', 'secret')
+    def test_cpu_profile_returns_folded_stacks(self, client):
+        """Test that a CPU profile is returned as a folded-stack attachment."""
+        response = client.post(
+            "/api/v1/admin/profile?mode=cpu&seconds=0.05&interval_ms=1", headers={"X-Admin-Token": "secret"}
+        )
+        
+        assert response.status_code == 200
+        assert "profile.folded" in response.headers["Content-Disposition"]
+        assert response.text.strip().splitlines()[0].rsplit(" ", 1)[1].isdigit()
+
+    @patch('app.main.settings.admin_token', 'secret')
+    def test_profile_parameters_validated(self, client):
+        """Test that unknown modes and out-of-range durations are rejected."""
+        headers = {"X-Admin-Token": "secret"}
+        assert client.post("/api/v1/admin/profile?mode=gpu", headers=headers).status_code == 400
+        assert client.post("/api/v1/admin/profile?seconds=0", headers=headers).status_code == 400
+        assert client.post("/api/v1/admin/profile?seconds=3600", headers=headers).status_code == 400
+
+    @patch('app.main.settings.admin_token', 'secret')
+    def test_request_profile_requires_sampling(self, client):
+        """Test that the per-request profile reports when sampling is not configured."""
+        response = client.get("/api/v1/admin/profile/requests", headers={"X-Admin-Token": "secret"})
+        
+        assert response.status_code == 400
+        assert "PROFILE_EVERY_N_REQUESTS" in response.json()["detail"]
+
+
+class TestJobEndpoints:
+    def test_submit_and_poll_job(self, client):
+        """Test that a submitted job is accepted and can be polled."""
+        response = client.post("/api/v1/jobs", json={"texts": ["good", "bad"]})
+        
+        assert response.status_code == 202
+        job = response.json()
+        assert job["status"] == "queued"
+        assert job["total"] == 2
+        
+        response = client.get(f"/api/v1/jobs/{job['id']}")
+        assert response.status_code == 200
+        assert response.json()["processed"] == 0
+
+    def test_upload_job(self, client):
+        """Test that a JSONL upload becomes a job with one item per line."""
+        upload = b'{"review": "good"}\n{"review": "bad"}\n'
+        response = client.post(
+            "/api/v1/jobs/upload", files={"file": ("reviews.jsonl", upload)}, data={"text_field": "review"}
+        )
+        
+        assert response.status_code == 202
+        assert response.json()["total"] == 2
+
+    def test_results_and_cancel(self, client):
+        """Test that results stream what is finished so far and a job can be cancelled."""
+        job = client.post("/api/v1/jobs", json={"texts": ["good"]}).json()
+        
+        response = client.get(f"/api/v1/jobs/{job['id']}/results")
+        assert response.status_code == 200
+        assert response.headers["X-Job-Status"] == "queued"
+        assert response.text == ""
+        
+        response = client.delete(f"/api/v1/jobs/{job['id']}")
+        assert response.json()["status"] == "cancelled"
+
+    @patch('app.main.settings.jobs_enabled', False)
+    def test_submit_rejected_when_jobs_disabled(self, client, jobs_dir):
+        """Test that a process without the job worker does not accept work it would never run."""
+        response = client.post("/api/v1/jobs", json={"texts": ["good"]})
+        
+        assert response.status_code == 400
+        assert "JOBS_ENABLED" in response.json()["detail"]
+        response = client.post("/api/v1/jobs/upload", files={"file": ("reviews.jsonl", b'{"text": "good"}\n')})
+        assert response.status_code == 400
+        assert list(jobs_dir.iterdir()) == []
+
+    def test_unknown_job(self, client):
+        """Test that unknown job ids return 404."""
+        response = client.get(f"/api/v1/jobs/{'0' * 32}")
+        
+        assert response.status_code == 404
+        assert response.json()["type"] == "NotFoundError"
+        assert client.delete("/api/v1/jobs/not-a-job").status_code == 404
 
 
 class TestMetricsEndpoint:
@@ -189,6 +558,11 @@ class TestMetricsEndpoint:
         assert "app_errors_total" in content
         assert "app_request_duration_ms" in content
         assert "app_model_loaded" in content
+        assert "app_model_load_seconds" in content
+        assert "app_model_warmup_seconds" in content
+        assert "# TYPE app_import_seconds gauge" in content
+        assert 'app_process_resident_memory_bytes{worker="0"}' in content
+        assert "app_node_memory_total_bytes" in content
         
         # Check Prometheus format structure
         assert "# HELP app_requests_total" in content
@@ -217,4 +591,76 @@ class TestMetricsEndpoint:
         updated_count = int(match.group(1)) if match else 0
         
         # Should have increased by at least 3 (2 new requests + the metrics request)
-        assert updated_count >= initial_count + 3
\ No newline at end of file
+        assert updated_count >= initial_count + 3
+
+    @patch('app.main.model_manager.get_model')
+    def test_metrics_latency_histogram_per_route(self, mock_get_model, client, mock_model):
+        """Test that request latency is exported as a histogram labelled by route."""
+        mock_get_model.return_value = mock_model
+        client.post("/api/v1/analyze", json={"text": "I love this product!"})
+        
+        content = client.get("/api/v1/metrics").text
+        
+        assert "# TYPE app_request_duration_seconds histogram" in content
+        assert 'app_request_duration_seconds_bucket{route="/api/v1/analyze",method="POST",status="2xx",le="+Inf"}' in content
+        assert "# TYPE app_request_duration_quantiles_seconds summary" in content
+        assert 'route="/api/v1/analyze",method="POST",status="2xx",quantile="0.99"' in content
+
+    @patch('app.main.model_manager.get_model')
+    def test_metrics_inference_stage_histograms(self, mock_get_model, client, mock_model):
+        """Test that stage durations and batch sizes are exported as histograms."""
+        mock_get_model.return_value = mock_model
+        client.post("/api/v1/analyze", json={"text": "I love this product!"})
+        
+        content = client.get("/api/v1/metrics").text
+        
+        assert "# TYPE app_inference_stage_seconds histogram" in content
+        assert 'app_inference_stage_seconds_count{stage="queue_wait"}' in content
+        assert 'app_inference_stage_seconds_count{stage="forward"}' in content
+        assert "# TYPE app_inference_batch_size histogram" in content
+        assert "# TYPE app_inference_batch_tokens histogram" in content
+
+    def test_metrics_include_dropped_log_records(self, client):
+        """Test that dropped request log records are exported."""
+        content = client.get("/api/v1/metrics").text
+        assert "# TYPE app_log_records_dropped_total counter" in content
+        assert "app_log_records_dropped_total 0" in content
+
+    def test_metrics_include_queue_admission(self, client):
+        """Test that queue depth, rejections and expirations are exported."""
+        content = client.get("/api/v1/metrics").text
+        assert "# TYPE app_inference_queue_depth gauge" in content
+        assert "# TYPE app_inference_queue_rejected_total counter" in content
+        assert "# TYPE app_inference_deadline_expired_total counter" in content
+        assert "# TYPE app_inference_coalesced_total counter" in content
+
+    def test_metrics_include_cascade(self, client):
+        """Test that the cascade's short-circuit counters are exported when it is loaded."""
+        from app.cascade import CascadeClassifier
+        cascade = CascadeClassifier("model@", ["NEGATIVE", "POSITIVE"], {}, 0.0, 16, threshold=0.9)
+        cascade.short_circuited, cascade.deferred = 3, 1
+        with patch('app.main.model_manager.cascade', cascade):
+            content = client.get("/api/v1/metrics").text
+        
+        assert "app_cascade_short_circuited_total 3" in content
+        assert "app_cascade_deferred_total 1" in content
+        assert "app_cascade_short_circuit_ratio 0.750000" in content
+        assert "app_cascade_threshold 0.9" in content
+
+    def test_metrics_include_jobs(self, client):
+        """Test that bulk job throughput and yielding are exported."""
+        content = client.get("/api/v1/metrics").text
+        assert "# TYPE app_job_texts_scored_total counter" in content
+        assert "# TYPE app_jobs_finished_total counter" in content
+        assert "# TYPE app_job_yield_seconds_total counter" in content
+
+    def test_metrics_include_prediction_cache(self, client):
+        """Test that cache counters are exported when the cache is enabled."""
+        from app.cache import PredictionCache
+        with patch('app.main.model_manager.prediction_cache', PredictionCache(10, 60)):
+            response = client.get("/api/v1/metrics")
+        
+        content = response.text
+        assert "app_prediction_cache_hits_total 0" in content
+        assert "app_prediction_cache_misses_total 0" in content
+        assert "app_prediction_cache_evictions_total 0" in content
\ No newline at end of file
@@ -0,0 +1,130 @@
+import pytest
+import time
+from unittest.mock import Mock
+from app import autotune
+
+
+@pytest.fixture(autouse=True)
+def torch():
+    """Import torch only when these tests run, and undo the thread count changes made by tuning."""
+    import torch
+    threads = torch.get_num_threads()
+    yield torch
+    torch.set_num_threads(threads)
+
+
+def fake_model(texts, batch_size=1, **kwargs):
+    """A model whose calls take 1ms plus 1ms per text."""
+    time.sleep(0.001 * (1 + len(texts)))
+    return [{"label": "POSITIVE", "score": 0.9} for _ in texts]
+
+
+def measurement(threads, batch_size, p99_ms, throughput):
+    return {"intra_op_threads": threads, "batch_size": batch_size, "mean_ms": p99_ms,
+            "p99_ms": p99_ms, "throughput": throughput}
+
+
+class TestChooseSetting:
+    def test_highest_throughput_within_budget(self):
+        """Test that the fastest setting whose p99 fits the budget wins."""
+        measurements = [
+            measurement(1, 1, 5, 200), measurement(2, 8, 40, 900), measurement(4, 32, 150, 1500)
+        ]
+        chosen = autotune.choose_setting(measurements, latency_budget_ms=100)
+        assert (chosen["intra_op_threads"], chosen["batch_size"]) == (2, 8)
+        assert chosen["within_budget"] is True
+
+    def test_lowest_latency_when_nothing_fits(self):
+        """Test that the lowest-latency setting is used when the budget is unreachable."""
+        measurements = [measurement(1, 8, 50, 300), measurement(2, 8, 30, 400)]
+        chosen = autotune.choose_setting(measurements, latency_budget_ms=10)
+        assert chosen["intra_op_threads"] == 2
+        assert chosen["within_budget"] is False
+
+    def test_ties_prefer_fewer_threads(self):
+        """Test that extra threads are only used when they add throughput."""
+        measurements = [measurement(4, 8, 20, 500), measurement(1, 8, 20, 500)]
+        assert autotune.choose_setting(measurements, 100)["intra_op_threads"] == 1
+
+
+class TestTune:
+    def test_tune_measures_grid_and_applies_choice(self, torch):
+        """Test that every grid point is timed and the chosen thread count is left in effect."""
+        model = Mock(side_effect=fake_model)
+
+        profile = autotune.tune(model, "model", "pytorch", threads=[1, 2], batch_sizes=[1, 4],
+                                repeats=2, latency_budget_ms=1000)
+
+        assert len(profile["measurements"]) == 4
+        assert profile["model"] == "model"
+        # Larger batches amortize the per-call overhead
+        assert profile["chosen"]["batch_size"] == 4
+        assert torch.get_num_threads() == profile["chosen"]["intra_op_threads"]
+        assert {len(call.args[0]) for call in model.call_args_list} == {1, 4}
+
+    def test_onnx_tunes_batch_size_only(self):
+        """Test that ONNX Runtime's own threading is left alone."""
+        profile = autotune.tune(Mock(side_effect=fake_model), "model", "onnx", threads=[1, 2],
+                                batch_sizes=[1, 2], repeats=1, latency_budget_ms=1000)
+        assert {m["intra_op_threads"] for m in profile["measurements"]} == {None}
+
+
+class TestProfiles:
+    def make_profile(self):
+        return {
+            **autotune.host_key("model", "pytorch"),
+            "measurements": [measurement(1, 1, 5, 200), measurement(1, 16, 80, 800)],
+            "chosen": None,
+        }
+
+    def test_saved_profile_rechosen_for_budget(self, tmp_path):
+        """Test that a saved profile is re-evaluated against the current latency budget."""
+        path = str(tmp_path / "profiles" / "autotune.json")
+        autotune.save_profile(self.make_profile(), path)
+
+        assert autotune.load_profile("model", "pytorch", path, latency_budget_ms=100)["chosen"]["batch_size"] == 16
+        assert autotune.load_profile("model", "pytorch", path, latency_budget_ms=10)["chosen"]["batch_size"] == 1
+
+    def test_profile_for_other_model_ignored(self, tmp_path):
+        """Test that a profile measured for a different model or backend is not applied."""
+        path = str(tmp_path / "autotune.json")
+        autotune.save_profile(self.make_profile(), path)
+
+        assert autotune.load_profile("other-model", "pytorch", path) is None
+        assert autotune.load_profile("model", "onnx", path) is None
+
+    def test_profile_for_other_worker_count_ignored(self, tmp_path, monkeypatch):
+        """Test that a profile tuned for one serving process is not applied to several."""
+        path = str(tmp_path / "autotune.json")
+        autotune.save_profile(self.make_profile(), path)
+
+        monkeypatch.setattr(autotune.settings, "workers", 4)
+        assert autotune.load_profile("model", "pytorch", path) is None
+
+    def test_thread_grid_splits_cpus_between_workers(self, monkeypatch):
+        """Test that each worker is only tuned up to its share of the CPUs."""
+        monkeypatch.setattr(autotune.os, "cpu_count", lambda: 8)
+        monkeypatch.setattr(autotune.settings, "workers", 2)
+        assert autotune.default_thread_grid() == [1, 2, 4]
+
+    def test_missing_or_corrupt_profile(self, tmp_path):
+        """Test that a missing or unreadable profile means no profile."""
+        path = tmp_path / "autotune.json"
+        assert autotune.load_profile("model", "pytorch", str(path)) is None
+        path.write_text("{not json")
+        assert autotune.load_profile("model", "pytorch", str(path)) is None
+
+    def test_apply_and_render(self, torch):
+        """Test that applying sets threads and batch size, and metrics report the choice."""
+        profile = self.make_profile()
+        profile["chosen"] = autotune.choose_setting(profile["measurements"], 100)
+        scheduler = Mock(max_batch_size=4)
+
+        autotune.apply_profile(profile, scheduler)
+        content = autotune.render_metrics(profile)
+
+        assert scheduler.max_batch_size == 16
+        assert torch.get_num_threads() == 1
+        assert 'app_autotune_profile{intra_op_threads="1",batch_size="16",within_budget="true"} 1' in content
+        assert "app_autotune_expected_throughput 800" in content
+        assert "app_torch_intra_op_threads 1" in content
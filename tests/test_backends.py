@@ -0,0 +1,145 @@
+import pytest
+import numpy as np
+from unittest.mock import Mock, patch
+from app.backends import OnnxSentimentPipeline, default_onnx_path, load_pipeline, resolve_model_path
+from app.exceptions import ModelError
+
+
+def make_hub_cache(cache_dir, repo_id="org/model", weights=True):
+    """Lay out a Hugging Face hub cache entry for a model on disk."""
+    repo_dir = cache_dir / f"models--{repo_id.replace('/', '--')}"
+    snapshot = repo_dir / "snapshots" / "abc123"
+    snapshot.mkdir(parents=True)
+    (repo_dir / "refs").mkdir()
+    (repo_dir / "refs" / "main").write_text("abc123")
+    (snapshot / "config.json").write_text("{}")
+    if weights:
+        (snapshot / "model.safetensors").write_bytes(b"")
+    return snapshot
+
+
+class TestResolveModelPath:
+    def test_offline_resolves_from_cache_dir(self, tmp_path):
+        """Test that offline mode finds the snapshot inside model_cache_dir."""
+        snapshot = make_hub_cache(tmp_path)
+        with patch('app.backends.settings.model_cache_dir', str(tmp_path)):
+            assert resolve_model_path("org/model", offline=True) == str(snapshot)
+
+    def test_offline_missing_artifacts_fail_fast(self, tmp_path):
+        """Test that a missing model raises a clear ModelError offline."""
+        with patch('app.backends.settings.model_cache_dir', str(tmp_path)):
+            with pytest.raises(ModelError, match="offline mode is enabled"):
+                resolve_model_path("org/missing", offline=True)
+
+    def test_missing_safetensors_weights(self, tmp_path):
+        """Test that a cached model without safetensors weights is rejected."""
+        make_hub_cache(tmp_path, weights=False)
+        with patch('app.backends.settings.model_cache_dir', str(tmp_path)):
+            with pytest.raises(ModelError, match="No safetensors weights"):
+                resolve_model_path("org/model", offline=True)
+
+    def test_local_directory_is_used_directly(self, tmp_path):
+        """Test that a local model directory bypasses the hub cache."""
+        (tmp_path / "model.safetensors").write_bytes(b"")
+        assert resolve_model_path(str(tmp_path)) == str(tmp_path)
+
+
+class TestLoadPipeline:
+    @patch('app.backends.resolve_model_path', return_value="/cache/some-model")
+    @patch('app.backends.pipeline')
+    def test_pytorch_backend(self, mock_pipeline, mock_resolve):
+        """Test that the default backend builds an eager pipeline from the local cache."""
+        load_pipeline("some-model", "pytorch")
+        mock_resolve.assert_called_once_with("some-model", None)
+        mock_pipeline.assert_called_once_with(
+            "sentiment-analysis",
+            model="/cache/some-model",
+            model_kwargs={"use_safetensors": True}
+        )
+
+    @patch('app.backends.resolve_model_path', return_value="/cache/some-model")
+    @patch('app.backends.pipeline')
+    def test_revision_pins_the_default_model_only(self, mock_pipeline, mock_resolve):
+        """Test that MODEL_REVISION is not applied to the other available models."""
+        with patch('app.backends.settings.model_name', "org/default"), \
+                patch('app.backends.settings.model_revision', "v2"):
+            load_pipeline("org/default", "pytorch")
+            load_pipeline("org/other", "pytorch")
+        assert mock_resolve.call_args_list[0].args == ("org/default", "v2")
+        assert mock_resolve.call_args_list[1].args == ("org/other", None)
+
+    def test_unknown_backend(self):
+        """Test that an unknown backend raises a ModelError."""
+        with pytest.raises(ModelError, match="Unknown inference backend 'tpu'"):
+            load_pipeline("some-model", "tpu")
+
+    def test_onnx_backend_missing_export(self, tmp_path):
+        """Test that the ONNX backend fails clearly when the export is missing."""
+        pytest.importorskip("onnxruntime")
+        with pytest.raises(ModelError, match="run scripts/download_model.py --onnx"):
+            OnnxSentimentPipeline("some-model", str(tmp_path / "missing.onnx"))
+
+
+    @patch('app.backends.resolve_model_path', return_value="/cache/other-model")
+    @patch('app.backends.OnnxSentimentPipeline')
+    def test_onnx_backend_uses_the_model_export(self, mock_onnx, mock_resolve):
+        """Test that the ONNX backend loads the export of the requested model."""
+        load_pipeline("org/other-model", "onnx")
+        mock_onnx.assert_called_once_with("/cache/other-model", default_onnx_path("org/other-model"))
+
+
+class TestDefaultOnnxPath:
+    def test_exports_are_keyed_by_model_and_revision(self, tmp_path):
+        """Test that each model and revision has its own export location."""
+        with patch('app.backends.settings.model_cache_dir', str(tmp_path)), \
+                patch('app.backends.settings.onnx_model_path', None):
+            first = default_onnx_path("org/first")
+            assert first == str(tmp_path / "onnx" / "org--first" / "model.onnx")
+            assert default_onnx_path("org/second") != first
+            assert default_onnx_path("org/first", "v2") == str(tmp_path / "onnx" / "org--first@v2" / "model.onnx")
+
+    def test_override_applies_to_default_model_only(self, tmp_path):
+        """Test that ONNX_MODEL_PATH does not redirect the other available models."""
+        with patch('app.backends.settings.model_cache_dir', str(tmp_path)), \
+                patch('app.backends.settings.model_name', "org/default"), \
+                patch('app.backends.settings.onnx_model_path', "/exports/default.onnx"):
+            assert default_onnx_path("org/default") == "/exports/default.onnx"
+            assert default_onnx_path("org/other") == str(tmp_path / "onnx" / "org--other" / "model.onnx")
+
+
+class TestOnnxSentimentPipeline:
+    def make_pipeline(self, logits):
+        """Create an ONNX pipeline with a stub tokenizer and session."""
+        onnx_pipeline = OnnxSentimentPipeline.__new__(OnnxSentimentPipeline)
+        onnx_pipeline.tokenizer = Mock(side_effect=lambda texts, **kwargs: {
+            "input_ids": np.ones((len(texts), 4), dtype=np.int32),
+            "attention_mask": np.ones((len(texts), 4), dtype=np.int32),
+            "token_type_ids": np.zeros((len(texts), 4), dtype=np.int32),
+        })
+        onnx_pipeline.id2label = {0: "NEGATIVE", 1: "POSITIVE"}
+        onnx_pipeline.input_names = {"input_ids", "attention_mask"}
+        onnx_pipeline.session = Mock()
+        onnx_pipeline.session.run.side_effect = [[np.array(batch)] for batch in logits]
+        return onnx_pipeline
+
+    def test_label_score_contract(self):
+        """Test that logits are turned into pipeline-style label/score dicts."""
+        onnx_pipeline = self.make_pipeline([[[0.0, 2.0], [3.0, 0.0]]])
+
+        results = onnx_pipeline(["good", "bad"], batch_size=2)
+
+        assert [r["label"] for r in results] == ["POSITIVE", "NEGATIVE"]
+        assert results[0]["score"] == pytest.approx(1 / (1 + np.exp(-2.0)))
+        feed = onnx_pipeline.session.run.call_args.args[1]
+        assert set(feed) == {"input_ids", "attention_mask"}
+        assert feed["input_ids"].dtype == np.int64
+
+    def test_batches_are_padded_separately(self):
+        """Test that texts are tokenized in batch_size chunks."""
+        onnx_pipeline = self.make_pipeline([[[0.0, 1.0], [0.0, 1.0]], [[1.0, 0.0]]])
+
+        results = onnx_pipeline(["a", "b", "c"], batch_size=2)
+
+        assert len(results) == 3
+        assert onnx_pipeline.tokenizer.call_count == 2
+        assert onnx_pipeline.tokenizer.call_args_list[1].args[0] == ["c"]
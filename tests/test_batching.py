@@ -0,0 +1,521 @@
+import pytest
+import asyncio
+import time
+from unittest.mock import ANY, Mock, AsyncMock
+from app import batching
+from app.batching import BatchScheduler, bucket_by_length, predict_in_buckets
+from app.cache import PredictionCache
+from app.exceptions import DeadlineExceededError, QueueFullError
+from app.models import ModelManager
+
+
+def make_manager(side_effect=None):
+    """Create a model manager mock with nothing cached whose predict echoes one result per text."""
+    manager = Mock()
+    manager.lookup = AsyncMock(side_effect=lambda texts: [None] * len(texts))
+    manager.predict = AsyncMock(
+        side_effect=side_effect or (
+            lambda texts, timer=None, lookup=True: [{"label": "POSITIVE", "score": len(t)} for t in texts]
+        )
+    )
+    return manager
+
+
+class TestBatchScheduler:
+    def test_init_uses_settings_defaults(self):
+        """Test that batch limits fall back to settings."""
+        scheduler = BatchScheduler(make_manager())
+        assert scheduler.max_batch_size == 16
+        assert scheduler.max_wait_ms == 5.0
+
+    @pytest.mark.asyncio
+    async def test_single_request(self):
+        """Test that a lone request is flushed after the wait window."""
+        manager = make_manager()
+        scheduler = BatchScheduler(manager, max_batch_size=8, max_wait_ms=1)
+
+        result = await scheduler.submit("hello")
+
+        assert result == {"label": "POSITIVE", "score": 5}
+        manager.predict.assert_awaited_once_with(["hello"], timer=ANY, lookup=False)
+
+    @pytest.mark.asyncio
+    async def test_concurrent_requests_share_batch(self):
+        """Test that concurrent requests are coalesced into one model call."""
+        manager = make_manager()
+        scheduler = BatchScheduler(manager, max_batch_size=8, max_wait_ms=50)
+
+        texts = ["a", "bb", "ccc", "dddd"]
+        results = await asyncio.gather(*(scheduler.submit(t) for t in texts))
+
+        # Each caller gets its own result back, in order
+        assert [r["score"] for r in results] == [1, 2, 3, 4]
+        manager.predict.assert_awaited_once_with(texts, timer=ANY, lookup=False)
+
+    @pytest.mark.asyncio
+    async def test_max_batch_size_splits_batches(self):
+        """Test that batches never exceed the configured size."""
+        manager = make_manager()
+        scheduler = BatchScheduler(manager, max_batch_size=2, max_wait_ms=50)
+
+        await asyncio.gather(*(scheduler.submit(t) for t in ["a", "b", "c", "d", "e"]))
+
+        batch_sizes = [len(call.args[0]) for call in manager.predict.await_args_list]
+        assert max(batch_sizes) <= 2
+        assert sum(batch_sizes) == 5
+
+    @pytest.mark.asyncio
+    async def test_errors_propagate_to_every_caller(self):
+        """Test that a failed model call fails all requests in the batch."""
+        manager = make_manager(side_effect=Exception("Prediction failed"))
+        scheduler = BatchScheduler(manager, max_batch_size=8, max_wait_ms=20)
+
+        results = await asyncio.gather(
+            scheduler.submit("a"), scheduler.submit("b"), return_exceptions=True
+        )
+
+        assert all(isinstance(r, Exception) for r in results)
+        assert all("Prediction failed" in str(r) for r in results)
+
+        # The worker keeps serving after a failure
+        manager.predict.side_effect = lambda texts, timer=None, lookup=True: [{"label": "NEGATIVE", "score": 0.5}]
+        assert (await scheduler.submit("c"))["label"] == "NEGATIVE"
+
+    @pytest.mark.asyncio
+    async def test_submit_reports_stage_timings(self):
+        """Test that submit fills in queue wait and the batch's stage durations."""
+        async def timed_predict(texts, timer=None, lookup=True):
+            timer.add("forward", 0.25)
+            return [{"label": "POSITIVE", "score": 1.0} for _ in texts]
+
+        manager = make_manager(side_effect=timed_predict)
+        scheduler = BatchScheduler(manager, max_batch_size=8, max_wait_ms=1)
+
+        timings = {}
+        await scheduler.submit("hello", timings=timings)
+
+        assert timings["forward"] == 0.25
+        assert timings["queue_wait"] >= 0
+        manager.stage_duration.observe.assert_called_once_with(timings["queue_wait"], "queue_wait")
+
+
+class TestEarlyAnswers:
+    @pytest.mark.asyncio
+    async def test_cache_hit_does_not_wait_for_running_batch(self):
+        """Test that a cached text returns at once while a slow batch of misses is running."""
+        def slow_model(texts, **kwargs):
+            time.sleep(0.3)
+            return [{"label": "POSITIVE", "score": 0.9} for _ in texts]
+
+        manager = ModelManager(model_name="model-a")
+        manager.model = Mock(side_effect=slow_model)
+        manager.prediction_cache = PredictionCache(10, 60)
+        scheduler = BatchScheduler(manager, max_batch_size=8, max_wait_ms=0)
+        await scheduler.submit("seen before")
+
+        miss = asyncio.create_task(scheduler.submit("new text"))
+        await asyncio.sleep(0.05)
+        start = time.perf_counter()
+        hit = await scheduler.submit("seen before")
+
+        assert time.perf_counter() - start < 0.1
+        assert hit["label"] == "POSITIVE"
+        assert not miss.done()
+        await miss
+        assert manager.model.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_batch_looks_up_each_bucket_once(self, tmp_path):
+        """Test that a batch reads the result store once per sub-batch, not once per text."""
+        from app.store import ResultStore, model_identity
+
+        manager = ModelManager(model_name="model-a")
+        manager.model = Mock(side_effect=lambda texts, **kwargs: [{"label": "POSITIVE", "score": 0.9} for _ in texts])
+        manager.model.tokenizer = None
+        manager.result_store = ResultStore(str(tmp_path / "results.db"), [model_identity("model-a")])
+        manager.result_store.get_many = Mock(wraps=manager.result_store.get_many)
+        scheduler = BatchScheduler(manager, max_batch_size=4, max_wait_ms=0)
+
+        results = await scheduler.submit_batch([f"text {i}" for i in range(8)], bucket_size=4)
+
+        assert all(r["label"] == "POSITIVE" for r in results)
+        assert [len(call.args[0]) for call in manager.result_store.get_many.call_args_list] == [4, 4]
+        manager.shutdown()
+
+
+class TestAdmissionControl:
+    @pytest.mark.asyncio
+    async def test_full_queue_rejects_fast(self):
+        """Test that submissions beyond the queue bound fail with QueueFullError."""
+        release = asyncio.Event()
+
+        async def slow_predict(texts, timer=None, lookup=True):
+            await release.wait()
+            return [{"label": "POSITIVE", "score": 1.0} for _ in texts]
+
+        manager = make_manager(side_effect=slow_predict)
+        scheduler = BatchScheduler(manager, max_batch_size=1, max_wait_ms=0,
+                                   max_concurrent_batches=1, max_queue_size=2)
+
+        # One request runs, two wait in the queue, the fourth is rejected
+        tasks = [asyncio.create_task(scheduler.submit("a"))]
+        await asyncio.sleep(0.01)
+        tasks += [asyncio.create_task(scheduler.submit(t)) for t in ["b", "c"]]
+        await asyncio.sleep(0.01)
+        try:
+            with pytest.raises(QueueFullError) as exc_info:
+                await scheduler.submit("d")
+
+            assert exc_info.value.retry_after >= 1
+            assert scheduler.rejected == 1
+            assert scheduler.queue_depth == 2
+        finally:
+            release.set()
+        assert len(await asyncio.gather(*tasks)) == 3
+
+    @pytest.mark.asyncio
+    async def test_expired_requests_skip_inference(self):
+        """Test that requests whose deadline passes in the queue never reach the model."""
+        release = asyncio.Event()
+
+        async def slow_predict(texts, timer=None, lookup=True):
+            await release.wait()
+            return [{"label": "POSITIVE", "score": 1.0} for _ in texts]
+
+        manager = make_manager(side_effect=slow_predict)
+        scheduler = BatchScheduler(manager, max_batch_size=1, max_wait_ms=0, max_concurrent_batches=1)
+
+        running = asyncio.create_task(scheduler.submit("running"))
+        await asyncio.sleep(0.01)
+        with pytest.raises(DeadlineExceededError):
+            await scheduler.submit("queued", timeout=0.02)
+
+        release.set()
+        await running
+        await asyncio.sleep(0.01)
+
+        texts = [call.args[0] for call in manager.predict.await_args_list]
+        assert texts == [["running"]]
+        assert scheduler.expired == 1
+
+    @pytest.mark.asyncio
+    async def test_spent_budget_rejected_before_queueing(self):
+        """Test that a request arriving with no time left is not queued."""
+        manager = make_manager()
+        scheduler = BatchScheduler(manager, max_wait_ms=0)
+
+        with pytest.raises(DeadlineExceededError):
+            await scheduler.submit("late", timeout=0)
+
+        assert scheduler.queue_depth == 0
+        manager.predict.assert_not_awaited()
+
+
+class TestSingleFlight:
+    @pytest.mark.asyncio
+    async def test_identical_requests_share_one_inference(self):
+        """Test that concurrent identical texts are predicted once and each caller gets a copy."""
+        manager = make_manager()
+        scheduler = BatchScheduler(manager, max_batch_size=8, max_wait_ms=20)
+
+        results = await asyncio.gather(*(scheduler.submit(t) for t in ["same", "same", "other", "same"]))
+
+        manager.predict.assert_awaited_once_with(["same", "other"], timer=ANY, lookup=False)
+        assert [r["score"] for r in results] == [4, 4, 5, 4]
+        assert results[0] is not results[1]
+        assert scheduler.coalesced == 2
+
+    @pytest.mark.asyncio
+    async def test_joins_request_already_running(self):
+        """Test that a request arriving mid-inference waits for the running prediction."""
+        release = asyncio.Event()
+
+        async def slow_predict(texts, timer=None, lookup=True):
+            await release.wait()
+            return [{"label": "POSITIVE", "score": 1.0} for _ in texts]
+
+        manager = make_manager(side_effect=slow_predict)
+        scheduler = BatchScheduler(manager, max_batch_size=8, max_wait_ms=0)
+
+        first = asyncio.create_task(scheduler.submit("viral"))
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(scheduler.submit("viral"))
+        await asyncio.sleep(0.01)
+        release.set()
+
+        assert (await first) == (await second)
+        assert manager.predict.await_count == 1
+        assert scheduler.queue_depth == 0
+
+    @pytest.mark.asyncio
+    async def test_expired_caller_does_not_cancel_others(self):
+        """Test that one caller's deadline passing leaves the shared prediction running."""
+        release = asyncio.Event()
+
+        async def slow_predict(texts, timer=None, lookup=True):
+            await release.wait()
+            return [{"label": "POSITIVE", "score": 1.0} for _ in texts]
+
+        manager = make_manager(side_effect=slow_predict)
+        scheduler = BatchScheduler(manager, max_batch_size=8, max_wait_ms=0)
+
+        patient = asyncio.create_task(scheduler.submit("viral"))
+        await asyncio.sleep(0.01)
+        try:
+            with pytest.raises(DeadlineExceededError):
+                await scheduler.submit("viral", timeout=0.02)
+        finally:
+            release.set()
+
+        assert (await patient)["label"] == "POSITIVE"
+        assert scheduler.expired == 1
+
+    @pytest.mark.asyncio
+    async def test_resolved_requests_are_not_reused(self):
+        """Test that only in-flight requests are shared, not finished ones."""
+        manager = make_manager()
+        scheduler = BatchScheduler(manager, max_batch_size=8, max_wait_ms=1)
+
+        await scheduler.submit("again")
+        await scheduler.submit("again")
+
+        assert manager.predict.await_count == 2
+        assert scheduler.coalesced == 0
+
+    @pytest.mark.asyncio
+    async def test_coalescing_can_be_disabled(self):
+        """Test that identical texts are batched separately when coalescing is off."""
+        manager = make_manager()
+        scheduler = BatchScheduler(manager, max_batch_size=8, max_wait_ms=20, coalesce=False)
+
+        await asyncio.gather(scheduler.submit("same"), scheduler.submit("same"))
+
+        manager.predict.assert_awaited_once_with(["same", "same"], timer=ANY, lookup=False)
+        assert scheduler.coalesced == 0
+
+
+class TestFairScheduling:
+    @pytest.mark.asyncio
+    async def test_weighted_share_under_backlog(self):
+        """Test that a heavier client's requests overtake another client's backlog."""
+        manager = make_manager()
+        scheduler = BatchScheduler(manager, max_batch_size=4, max_wait_ms=0, max_concurrent_batches=1,
+                                   client_weights={"web": 3})
+
+        bulk = [asyncio.create_task(scheduler.submit(f"bulk {i}", client="bulk")) for i in range(40)]
+        web = [asyncio.create_task(scheduler.submit(f"web {i}", client="web")) for i in range(9)]
+        await asyncio.gather(*bulk, *web)
+
+        order = [text for call in manager.predict.await_args_list for text in call.args[0]]
+        last_web = max(order.index(f"web {i}") for i in range(9))
+        # Three web requests per bulk request while both are backlogged
+        assert last_web < 16
+        assert sum(text.startswith("bulk") for text in order[:last_web]) <= 5
+
+    @pytest.mark.parametrize("overrides", [
+        {"client_weights": {"bulk": 0}},
+        {"client_weights": {"bulk": -1}},
+        {"client_default_weight": 0},
+        {"client_max_inflight": {"bulk": -1}},
+        {"client_default_max_inflight": -1},
+    ])
+    def test_settings_reject_invalid_client_limits(self, overrides):
+        """Test that weights must be positive and inflight caps non-negative."""
+        from pydantic import ValidationError
+        from app.config import Settings
+        with pytest.raises(ValidationError):
+            Settings(**overrides)
+
+    @pytest.mark.asyncio
+    async def test_inflight_cap(self):
+        """Test that a capped client never has more texts in one batch than its cap."""
+        manager = make_manager()
+        scheduler = BatchScheduler(manager, max_batch_size=8, max_wait_ms=5, client_max_inflight={"bulk": 2})
+
+        await asyncio.gather(*(scheduler.submit(f"bulk {i}", client="bulk") for i in range(6)),
+                             scheduler.submit("web", client="web"))
+
+        batches = [call.args[0] for call in manager.predict.await_args_list]
+        assert all(sum(text.startswith("bulk") for text in batch) <= 2 for batch in batches)
+        assert "web" in batches[0]
+
+    @pytest.mark.asyncio
+    async def test_client_queue_limit(self):
+        """Test that one client filling its queue does not lock others out."""
+        release = asyncio.Event()
+
+        async def slow_predict(texts, timer=None, lookup=True):
+            await release.wait()
+            return [{"label": "POSITIVE", "score": 1.0} for _ in texts]
+
+        manager = make_manager(side_effect=slow_predict)
+        scheduler = BatchScheduler(manager, max_batch_size=1, max_wait_ms=0, max_concurrent_batches=1,
+                                   client_max_queue_size=2)
+
+        held = [asyncio.create_task(scheduler.submit("bulk 0", client="bulk"))]
+        await asyncio.sleep(0.01)  # the first request is being predicted, the next two wait
+        held += [asyncio.create_task(scheduler.submit(f"bulk {i}", client="bulk")) for i in (1, 2)]
+        await asyncio.sleep(0)
+        try:
+            with pytest.raises(QueueFullError):
+                await scheduler.submit("bulk 3", client="bulk")
+            other = asyncio.create_task(scheduler.submit("web", client="web"))
+            await asyncio.sleep(0)
+        finally:
+            release.set()
+
+        await asyncio.gather(*held, other)
+        assert scheduler.client_rejected == {"bulk": 1}
+
+    @pytest.mark.asyncio
+    async def test_client_metrics(self, monkeypatch):
+        """Test that per-client series are exported and clients past the label limit share "other"."""
+        monkeypatch.setattr(batching, "MAX_CLIENT_LABELS", 2)
+        scheduler = BatchScheduler(make_manager(), max_wait_ms=0)
+
+        for client in ("a", "b", "c", "d"):
+            await scheduler.submit("text", client=client)
+
+        content = scheduler.render_client_metrics()
+        assert "# TYPE app_client_queue_depth gauge" in content
+        assert 'app_client_request_seconds_count{client="a"} 1' in content
+        assert 'app_client_request_seconds_count{client="other"} 2' in content
+        assert "c" not in scheduler._clients
+        # Client ids past the limit are not remembered either
+        assert list(scheduler._labels) == ["a", "b"]
+
+    @pytest.mark.asyncio
+    async def test_batch_goes_through_client_queue(self):
+        """Test that batch sub-batches keep input order and respect the client's in-flight cap."""
+        manager = make_manager()
+        manager.token_lengths = AsyncMock(side_effect=lambda texts: [len(t) for t in texts])
+        scheduler = BatchScheduler(manager, max_batch_size=8, max_wait_ms=5, client_max_inflight={"bulk": 2})
+        texts = ["bulk aaaa", "bulk a", "bulk aaa", "bulk aa", "bulk aaaaa"]
+
+        results, web = await asyncio.gather(scheduler.submit_batch(texts, client="bulk", bucket_size=4),
+                                            scheduler.submit("web", client="web"))
+
+        assert [r["score"] for r in results] == [len(t) for t in texts]
+        batches = [call.args[0] for call in manager.predict.await_args_list]
+        assert all(sum(text.startswith("bulk") for text in batch) <= 2 for batch in batches)
+        assert "web" in batches[0]
+
+    @pytest.mark.asyncio
+    async def test_batch_buckets_fill_one_model_batch(self):
+        """Test that sub-batches are never larger than a model batch, so each runs as one call."""
+        manager = make_manager()
+        manager.token_lengths = AsyncMock(side_effect=lambda texts: [len(t) for t in texts])
+        scheduler = BatchScheduler(manager, max_batch_size=2, max_wait_ms=5, max_concurrent_batches=1)
+
+        await scheduler.submit_batch(["aaaa", "a", "aaa", "aa"])
+
+        batches = [call.args[0] for call in manager.predict.await_args_list]
+        assert batches == [["a", "aa"], ["aaa", "aaaa"]]
+
+    @pytest.mark.asyncio
+    async def test_batch_buckets_run_concurrently(self):
+        """Test that sub-batches of one request use every batch slot at once."""
+        running, peak = 0, 0
+
+        async def predict(texts, timer=None, lookup=True):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return [{"label": "POSITIVE", "score": 1.0} for _ in texts]
+
+        manager = make_manager(side_effect=predict)
+        manager.token_lengths = AsyncMock(side_effect=lambda texts: [len(t) for t in texts])
+        scheduler = BatchScheduler(manager, max_batch_size=2, max_wait_ms=0, max_concurrent_batches=2)
+
+        results = await scheduler.submit_batch([f"text {i}" for i in range(8)])
+
+        assert len(results) == 8
+        assert peak == 2
+
+    @pytest.mark.asyncio
+    async def test_full_queue_rejects_whole_group(self):
+        """Test that a group that does not fit is rejected before any of it is queued."""
+        manager = make_manager()
+        scheduler = BatchScheduler(manager, max_wait_ms=0, client_max_queue_size=2)
+
+        with pytest.raises(QueueFullError):
+            await scheduler.submit_many(["a", "b", "c"], client="bulk")
+
+        assert scheduler.queue_depth == 0
+        assert scheduler.client_rejected == {"bulk": 1}
+        manager.predict.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_failed_text_cancels_its_group(self):
+        """Test that one failing text fails the group at once and its queued siblings never run."""
+        release = asyncio.Event()
+
+        async def predict(texts, timer=None, lookup=True):
+            if texts == ["boom"]:
+                raise Exception("Prediction failed")
+            await release.wait()
+            return [{"label": "POSITIVE", "score": 1.0} for _ in texts]
+
+        manager = make_manager(side_effect=predict)
+        scheduler = BatchScheduler(manager, max_batch_size=1, max_wait_ms=0, max_concurrent_batches=1)
+
+        with pytest.raises(Exception, match="Prediction failed"):
+            await asyncio.wait_for(scheduler.submit_many(["boom", "a", "b"]), 1)
+        release.set()
+        await asyncio.sleep(0.01)
+
+        assert ["b"] not in [call.args[0] for call in manager.predict.await_args_list]
+
+
+class TestLengthBucketing:
+    def test_bucket_by_length_groups_similar_lengths(self):
+        """Test that indices are sorted by length and chunked."""
+        buckets = bucket_by_length([50, 3, 40, 2, 10], bucket_size=2)
+        assert buckets == [[3, 1], [4, 2], [0]]
+
+    @pytest.mark.asyncio
+    async def test_predict_in_buckets_pads_per_bucket(self):
+        """Test that each sub-batch holds similar lengths and results keep input order."""
+        manager = make_manager()
+        manager.token_lengths = AsyncMock(side_effect=lambda texts: [len(t) for t in texts])
+        texts = ["aaaaaaaa", "a", "aaaaaaa", "aa"]
+
+        results = await predict_in_buckets(manager, texts, bucket_size=2)
+
+        assert [r["score"] for r in results] == [8, 1, 7, 2]
+        batches = [call.args[0] for call in manager.predict.await_args_list]
+        assert batches == [["a", "aa"], ["aaaaaaa", "aaaaaaaa"]]
+
+    @pytest.mark.asyncio
+    async def test_predict_in_buckets_isolates_failures(self):
+        """Test that a failing sub-batch only affects its own items."""
+        def flaky(texts):
+            if "boom" in texts:
+                raise Exception("Prediction failed")
+            return [{"label": "POSITIVE", "score": 1.0} for _ in texts]
+
+        manager = make_manager(side_effect=flaky)
+        manager.token_lengths = AsyncMock(side_effect=lambda texts: [len(t) for t in texts])
+
+        results = await predict_in_buckets(manager, ["ok", "boom", "longer ok"], bucket_size=1)
+
+        assert results[0]["label"] == "POSITIVE"
+        assert isinstance(results[1], Exception)
+        assert results[2]["label"] == "POSITIVE"
+
+    @pytest.mark.asyncio
+    async def test_predict_in_buckets_pauses_before_each_sub_batch(self):
+        """Test that the pause hook runs before every sub-batch."""
+        events = []
+        manager = make_manager()
+        manager.token_lengths = AsyncMock(side_effect=lambda texts: [len(t) for t in texts])
+        manager.predict.side_effect = lambda texts: events.append("predict") or [{"score": 1}] * len(texts)
+
+        async def pause():
+            events.append("pause")
+
+        await predict_in_buckets(manager, ["a", "bb", "ccc"], bucket_size=2, pause=pause)
+
+        assert events == ["pause", "predict", "pause", "predict"]
@@ -0,0 +1,93 @@
+import pytest
+import json
+from unittest.mock import Mock, patch
+from scripts import bulk_score
+from scripts.bulk_score import bulk_score as run_bulk_score, iter_chunks
+
+
+@pytest.fixture(autouse=True)
+def torch():
+    """Undo the thread count set by the worker initializer, which runs in-process here."""
+    import torch
+    threads = torch.get_num_threads()
+    yield torch
+    torch.set_num_threads(threads)
+
+
+class InlinePool:
+    """Process pool stand-in that runs the initializer and every task in the test process.
+
+    Results of the task numbered ``fail_on`` raise, as if its worker had died.
+    """
+
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+        self.tasks = 0
+
+    def __call__(self, processes, initializer, initargs):
+        initializer(*initargs)
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def apply_async(self, func, args):
+        self.tasks += 1
+        value = func(*args)
+        if self.tasks == self.fail_on:
+            return Mock(get=Mock(side_effect=RuntimeError("worker died")))
+        return Mock(get=Mock(return_value=value))
+
+
+def write_corpus(path, count):
+    path.write_text("".join(json.dumps({"text": f"text {i}", "id": i}) + "\n" for i in range(count)))
+
+
+def run(tmp_path, pool, workers=1):
+    model = Mock(side_effect=lambda texts, **kw: [{"label": "POSITIVE", "score": 0.5} for _ in texts])
+    model.tokenizer = None
+    with patch.object(bulk_score.multiprocessing, "get_context", return_value=Mock(Pool=pool)), \
+            patch('app.models.build_pipeline', return_value=model):
+        return run_bulk_score(str(tmp_path / "in.jsonl"), str(tmp_path / "out.jsonl"), id_field="id",
+                              workers=workers, batch_size=2, chunk_size=3)
+
+
+class TestIterChunks:
+    def test_chunks_skip_scored_and_blank_lines(self, tmp_path):
+        """Test that chunks start after the checkpoint, skip blank lines and keep line numbers."""
+        path = tmp_path / "in.jsonl"
+        path.write_text('{"text": "a"}\n\n{"text": "b"}\nnot json\n{"body": "c"}\n{"text": "d"}\n')
+
+        chunks = list(iter_chunks(str(path), start_line=2, chunk_size=2, text_field="text"))
+
+        assert [[item[0] for item in chunk] for chunk in chunks] == [[2, 3], [4, 5]]
+        assert chunks[0][0] == (2, None, "b", None)
+        assert chunks[0][1][3].startswith("Invalid JSON")
+        assert chunks[1][0][3] == "Missing or empty 'text' field"
+
+
+class TestBulkScore:
+    def test_worker_threads_split_the_cores(self, tmp_path, torch):
+        """Test that each worker gets its share of the cores rather than all of them."""
+        write_corpus(tmp_path / "in.jsonl", 2)
+        with patch.object(bulk_score.os, "cpu_count", return_value=8):
+            run(tmp_path, InlinePool(), workers=4)
+        assert torch.get_num_threads() == 2
+
+    def test_resume_after_crash_neither_duplicates_nor_skips(self, tmp_path):
+        """Test that output past the checkpoint is truncated and scoring resumes at the next line."""
+        write_corpus(tmp_path / "in.jsonl", 10)
+        with pytest.raises(RuntimeError, match="worker died"):
+            run(tmp_path, InlinePool(fail_on=2))
+        # A partial line written after the last checkpoint
+        with open(tmp_path / "out.jsonl", "ab") as f:
+            f.write(b'{"line": 3, "lab')
+
+        run(tmp_path, InlinePool())
+
+        records = [json.loads(line) for line in (tmp_path / "out.jsonl").read_text().splitlines()]
+        assert [record["line"] for record in records] == list(range(10))
+        assert [record["id"] for record in records] == list(range(10))
@@ -0,0 +1,64 @@
+import pytest
+from unittest.mock import patch
+from app.cache import PredictionCache, cache_key, normalize_text
+
+
+class TestCacheKey:
+    def test_normalize_text_collapses_whitespace(self):
+        """Test that whitespace differences normalize to the same text."""
+        assert normalize_text("  I love\tthis \n product ") == "I love this product"
+
+    def test_equivalent_texts_share_key(self):
+        """Test that normalized-equal texts produce the same key."""
+        assert cache_key("good  movie", "model") == cache_key(" good movie", "model")
+
+    def test_key_depends_on_model_identity(self):
+        """Test that different models or revisions never share entries."""
+        base = cache_key("good movie", "model-a", "v1")
+        assert base != cache_key("good movie", "model-b", "v1")
+        assert base != cache_key("good movie", "model-a", "v2")
+
+
+class TestPredictionCache:
+    def test_hit_and_miss_counters(self):
+        """Test that lookups update hit and miss counters."""
+        cache = PredictionCache(max_size=10, ttl_seconds=60)
+        assert cache.get("k") is None
+        cache.set("k", {"label": "POSITIVE", "score": 0.9})
+        assert cache.get("k") == {"label": "POSITIVE", "score": 0.9}
+
+        stats = cache.get_stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["size"] == 1
+
+    def test_lru_eviction(self):
+        """Test that the least recently used entry is evicted when full."""
+        cache = PredictionCache(max_size=2, ttl_seconds=60)
+        cache.set("a", {"score": 1})
+        cache.set("b", {"score": 2})
+        cache.get("a")  # "b" is now least recently used
+        cache.set("c", {"score": 3})
+
+        assert cache.get("b") is None
+        assert cache.get("a") == {"score": 1}
+        assert cache.get("c") == {"score": 3}
+        assert cache.evictions == 1
+
+    def test_ttl_expiration(self):
+        """Test that entries expire after their TTL."""
+        cache = PredictionCache(max_size=10, ttl_seconds=5)
+        with patch("app.cache.time.monotonic", return_value=100.0):
+            cache.set("k", {"score": 1})
+        with patch("app.cache.time.monotonic", return_value=106.0):
+            assert cache.get("k") is None
+
+        assert cache.expirations == 1
+        assert len(cache) == 0
+
+    def test_cached_values_are_copies(self):
+        """Test that callers cannot mutate cached predictions."""
+        cache = PredictionCache(max_size=10, ttl_seconds=60)
+        cache.set("k", {"score": 1})
+        cache.get("k")["score"] = 2
+        assert cache.get("k") == {"score": 1}
@@ -0,0 +1,124 @@
+import pytest
+import asyncio
+import time
+from unittest.mock import Mock
+from app.batching import BatchScheduler
+from app.cache import PredictionCache
+from app.cascade import CascadeClassifier, choose_threshold, evaluate, features, load_cascade
+from app.models import ModelManager
+
+TEXTS = ["i love it", "love this so much", "great product", "i hate it", "hate this", "terrible product"] * 20
+LABELS = ["POSITIVE", "POSITIVE", "POSITIVE", "NEGATIVE", "NEGATIVE", "NEGATIVE"] * 20
+
+
+@pytest.fixture
+def cascade():
+    return CascadeClassifier.train(TEXTS, LABELS, model="model-a@", dim=1024)
+
+
+class TestFeatures:
+    def test_unigrams_and_bigrams(self):
+        """Test that word order matters through bigrams and hashing is stable."""
+        assert features("not good", 2 ** 20) != features("good not", 2 ** 20)
+        assert len(features("not good", 2 ** 20)) == 3
+        assert features("Not GOOD", 2 ** 20) == features("not good", 2 ** 20)
+
+
+class TestCascadeClassifier:
+    def test_confident_texts_answered(self, cascade):
+        """Test that confident texts get pipeline-shaped answers and the rest are deferred."""
+        cascade.threshold = 0.8
+        results = cascade.classify(["i love it", "i hate it", "the box arrived"])
+
+        assert results[0]["label"] == "POSITIVE"
+        assert results[0]["score"] >= 0.8
+        assert results[1]["label"] == "NEGATIVE"
+        assert results[2] is None
+        assert cascade.get_stats()["short_circuited"] == 2
+        assert cascade.get_stats()["deferred"] == 1
+
+    def test_needs_two_labels(self):
+        """Test that training data with one label is rejected."""
+        with pytest.raises(ValueError):
+            CascadeClassifier.train(["good", "great"], ["POSITIVE", "POSITIVE"], model="model-a@")
+
+    def test_save_and_load(self, cascade, tmp_path):
+        """Test that a saved cascade scores like the original."""
+        path = str(tmp_path / "cascade.json")
+        cascade.save(path)
+
+        loaded = load_cascade(path, "model-a@", threshold=0.9)
+
+        assert loaded.threshold == 0.9
+        assert loaded.labels == ["NEGATIVE", "POSITIVE"]
+        assert loaded.probability("i love it") == pytest.approx(cascade.probability("i love it"), abs=1e-4)
+
+    def test_other_model_or_missing_file_ignored(self, cascade, tmp_path):
+        """Test that a cascade is only used in front of the model it was distilled from."""
+        path = str(tmp_path / "cascade.json")
+        cascade.save(path)
+
+        assert load_cascade(path, "model-b@", threshold=0.9) is None
+        assert load_cascade(str(tmp_path / "missing.json"), "model-a@", threshold=0.9) is None
+
+
+class TestEvaluation:
+    def test_agreement_per_threshold(self, cascade):
+        """Test that stricter thresholds short-circuit less but never agree less."""
+        texts = ["i love it", "i hate it", "the box arrived"]
+        rows = evaluate(cascade, texts, ["POSITIVE", "NEGATIVE", "POSITIVE"], [0.5, 0.99])
+
+        assert rows[0]["short_circuit"] == 1.0
+        assert rows[1]["short_circuit"] <= rows[0]["short_circuit"]
+        assert rows[1]["agreement"] >= rows[0]["agreement"]
+
+    def test_choose_threshold(self):
+        """Test that the threshold short-circuiting the most within the agreement target wins."""
+        rows = [
+            {"threshold": 0.7, "short_circuit": 0.9, "answered_agreement": 0.9, "agreement": 0.91},
+            {"threshold": 0.9, "short_circuit": 0.6, "answered_agreement": 0.99, "agreement": 0.994},
+            {"threshold": 0.99, "short_circuit": 0.2, "answered_agreement": 1.0, "agreement": 1.0},
+        ]
+        assert choose_threshold(rows, 0.99)["threshold"] == 0.9
+        assert choose_threshold(rows, 1.01) is None
+
+
+class TestCascadeInModelManager:
+    @pytest.mark.asyncio
+    async def test_only_deferred_texts_reach_model(self, cascade):
+        """Test that confident texts skip the model and results keep input order."""
+        manager = ModelManager(model_name="model-a")
+        manager.model = Mock(side_effect=lambda texts, **kwargs: [{"label": "MODEL", "score": 0.5}] * len(texts))
+        manager.prediction_cache = PredictionCache(10, 60)
+        cascade.threshold = 0.8
+        manager.cascade = cascade
+
+        results = await manager.predict(["i love it", "the box arrived", "i hate it"])
+
+        assert [r["label"] for r in results] == ["POSITIVE", "MODEL", "NEGATIVE"]
+        assert manager.model.call_args.args[0] == ["the box arrived"]
+        # Only model predictions are cached
+        assert manager.prediction_cache.get_stats()["size"] == 1
+
+    @pytest.mark.asyncio
+    async def test_confident_texts_skip_the_queue(self, cascade):
+        """Test that short-circuited texts return while a batch of deferred texts is running."""
+        def slow_model(texts, **kwargs):
+            time.sleep(0.3)
+            return [{"label": "MODEL", "score": 0.5} for _ in texts]
+
+        manager = ModelManager(model_name="model-a")
+        manager.model = Mock(side_effect=slow_model)
+        cascade.threshold = 0.8
+        manager.cascade = cascade
+        scheduler = BatchScheduler(manager, max_batch_size=8, max_wait_ms=0)
+
+        deferred = asyncio.create_task(scheduler.submit("the box arrived"))
+        await asyncio.sleep(0.05)
+        start = time.perf_counter()
+        result = await scheduler.submit("i love it")
+
+        assert time.perf_counter() - start < 0.1
+        assert result["label"] == "POSITIVE"
+        assert (await deferred)["label"] == "MODEL"
+        assert manager.model.call_count == 1
@@ -0,0 +1,86 @@
+import re
+import pytest
+from app.documents import aggregate_windows, split_windows
+from app.exceptions import ModelError, ValidationError
+
+
+class WordTokenizer:
+    """Fast-tokenizer stand-in with one token per word and [CLS]/[SEP] special tokens."""
+
+    is_fast = True
+    model_max_length = 512
+
+    def num_special_tokens_to_add(self, pair=False):
+        return 2
+
+    def __call__(self, text, add_special_tokens=True, return_offsets_mapping=False, verbose=True):
+        matches = list(re.finditer(r"\S+", text))
+        encoded = {"input_ids": list(range(len(matches)))}
+        if return_offsets_mapping:
+            encoded["offset_mapping"] = [match.span() for match in matches]
+        return encoded
+
+
+class TestSplitWindows:
+    def test_windows_overlap_by_stride(self):
+        """Test that windows fit the token budget and overlap by the stride."""
+        text = " ".join(f"w{i}" for i in range(20))
+
+        windows = split_windows(WordTokenizer(), text, window_tokens=10, stride=2)
+
+        # 8 body tokens per window, advancing by 6
+        assert [count for _, count in windows] == [8, 8, 8]
+        assert windows[0][0] == "w0 w1 w2 w3 w4 w5 w6 w7"
+        assert windows[1][0].startswith("w6 w7 ")
+        assert windows[-1][0] == "w12 w13 w14 w15 w16 w17 w18 w19"
+
+    def test_short_text_is_one_window(self):
+        """Test that text within the budget is returned unchanged."""
+        assert split_windows(WordTokenizer(), "short and sweet", 10, 2) == [("short and sweet", 3)]
+
+    def test_windows_scale_linearly(self):
+        """Test that tokens sent to the model grow linearly with document length."""
+        for words in (1000, 10000, 100000):
+            windows = split_windows(WordTokenizer(), "word " * words, 100, 10)
+            # Each window of 98 body tokens advances by 88, plus at most one partial window
+            assert sum(count for _, count in windows) <= words * 98 / 88 + 98
+
+    def test_without_tokenizer_splits_words(self):
+        """Test the whitespace fallback when the model has no tokenizer."""
+        windows = split_windows(None, "a b c d e", window_tokens=3, stride=1)
+        assert windows == [("a b c", 3), ("c d e", 3)]
+
+    def test_stride_must_leave_room_to_advance(self):
+        """Test that a stride as large as the window is rejected."""
+        with pytest.raises(ModelError):
+            split_windows(WordTokenizer(), "a b c", window_tokens=4, stride=2)
+
+
+class TestAggregateWindows:
+    results = [
+        {"label": "POSITIVE", "score": 0.9},
+        {"label": "NEGATIVE", "score": 0.6},
+        {"label": "NEGATIVE", "score": 0.7},
+    ]
+
+    def test_mean_weights_by_tokens(self):
+        """Test that the mean strategy weights each window by its token count."""
+        label, score = aggregate_windows(self.results, [500, 100, 100], "mean")
+        # POSITIVE: (0.9*500 + 0.4*100 + 0.3*100) / 700
+        assert label == "POSITIVE"
+        assert score == pytest.approx(520 / 700)
+
+    def test_max_takes_most_confident_window(self):
+        """Test that the max strategy follows the most confident window."""
+        assert aggregate_windows(self.results, [1, 1, 1], "max") == ("POSITIVE", 0.9)
+
+    def test_majority_votes_by_window(self):
+        """Test that the majority strategy counts window labels."""
+        label, score = aggregate_windows(self.results, [500, 100, 100], "majority")
+        assert label == "NEGATIVE"
+        assert score == pytest.approx(0.65)
+
+    def test_unknown_strategy(self):
+        """Test that an unknown strategy is a validation error."""
+        with pytest.raises(ValidationError):
+            aggregate_windows(self.results, [1, 1, 1], "median")
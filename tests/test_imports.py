@@ -0,0 +1,39 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+# Seconds `import app.main` may take in a fresh interpreter; override on slow CI machines
+IMPORT_TIME_BUDGET = float(os.environ.get("IMPORT_TIME_BUDGET_SECONDS", "3.0"))
+HEAVY_MODULES = ("torch", "transformers", "onnxruntime", "huggingface_hub")
+
+PROBE = f"""
+import json, sys, time
+start = time.perf_counter()
+import app.main
+print(json.dumps({{
+    "seconds": time.perf_counter() - start,
+    "loaded": [name for name in {HEAVY_MODULES!r} if name in sys.modules],
+}}))
+"""
+
+
+def import_app():
+    """Import app.main in a fresh interpreter, so nothing is cached from other tests."""
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=Path(__file__).parent.parent,
+        capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+class TestImportTime:
+    def test_heavy_libraries_not_imported(self):
+        """Test that importing the app leaves torch and transformers until a model loads."""
+        assert import_app()["loaded"] == []
+
+    def test_import_within_budget(self):
+        """Test that importing the app stays within the startup budget."""
+        seconds = import_app()["seconds"]
+        assert seconds < IMPORT_TIME_BUDGET, f"import app.main took {seconds:.2f}s"
@@ -0,0 +1,216 @@
+import pytest
+import asyncio
+import io
+import json
+import time
+from unittest.mock import AsyncMock, Mock
+from app.batching import BatchScheduler
+from app.exceptions import NotFoundError, ValidationError
+from app.jobs import JobManager
+from app.models import ModelManager
+from app.registry import ModelRegistry
+
+
+def echo_model(texts, **kwargs):
+    return [{"label": "POSITIVE", "score": len(text) / 100} for text in texts]
+
+
+def make_jobs(directory, model=None, **kwargs):
+    """Create a job manager over a registry whose default model is already loaded."""
+    manager = ModelManager(model_name="default")
+    manager.model = model or Mock(side_effect=echo_model)
+    manager.token_lengths = AsyncMock(side_effect=lambda texts: [len(t) for t in texts])
+    registry = ModelRegistry(manager, BatchScheduler(manager), models=[])
+    return JobManager(registry, directory=str(directory), **kwargs)
+
+
+def read_results(jobs, job_id):
+    return [json.loads(line) for line in b"".join(jobs.iter_results(job_id)).splitlines()]
+
+
+async def run_next(jobs):
+    state, lock = jobs._claim()
+    try:
+        await jobs.process(state)
+    finally:
+        lock.close()
+
+
+class TestJobSubmission:
+    @pytest.mark.asyncio
+    async def test_text_job_scored_in_order(self, tmp_path):
+        """Test that a list job is scored line by line, with invalid texts reported per line."""
+        jobs = make_jobs(tmp_path, chunk_size=2)
+        job = await jobs.submit_texts(["good", "", "fine", "great"])
+        assert job["status"] == "queued"
+        assert job["total"] == 4
+
+        await run_next(jobs)
+
+        status = jobs.status(job["id"])
+        assert (status["status"], status["processed"], status["failed"]) == ("completed", 4, 1)
+        results = read_results(jobs, job["id"])
+        assert [r["line"] for r in results] == [0, 1, 2, 3]
+        assert results[0]["score"] == 0.04
+        assert "error" in results[1]
+
+    @pytest.mark.asyncio
+    async def test_uploaded_jsonl_with_ids(self, tmp_path):
+        """Test that uploads use the given text and id fields and skip blank lines."""
+        jobs = make_jobs(tmp_path)
+        upload = io.BytesIO(b'{"body": "nice", "key": "a"}\n\nnot json\n{"body": "meh", "key": "b"}')
+        job = await jobs.submit_file(upload, text_field="body", id_field="key")
+        assert job["total"] == 3
+
+        await run_next(jobs)
+
+        results = read_results(jobs, job["id"])
+        assert results[0] == {"line": 0, "id": "a", "label": "POSITIVE", "score": 0.04}
+        assert results[1]["error"].startswith("Invalid JSON")
+        assert results[2]["id"] == "b"
+
+    def test_upload_limits(self, tmp_path):
+        """Test that oversized and empty uploads are rejected without leaving a job behind."""
+        jobs = make_jobs(tmp_path)
+        with pytest.raises(ValidationError):
+            jobs.create_from_file(io.BytesIO(b'{"text": "x"}\n' * 100), max_bytes=50)
+        with pytest.raises(ValidationError):
+            jobs.create_from_file(io.BytesIO(b"\n\n"))
+        assert list(tmp_path.iterdir()) == []
+
+    @pytest.mark.asyncio
+    async def test_unknown_model_rejected(self, tmp_path):
+        """Test that jobs for models that are not configured are refused up front."""
+        with pytest.raises(ValidationError):
+            await make_jobs(tmp_path).submit_texts(["good"], model="not-configured")
+
+    def test_unknown_job(self, tmp_path):
+        """Test that missing and malformed job ids are not found."""
+        jobs = make_jobs(tmp_path)
+        with pytest.raises(NotFoundError):
+            jobs.status("0" * 32)
+        with pytest.raises(NotFoundError):
+            jobs.status("../state")
+
+
+class TestJobProcessing:
+    @pytest.mark.asyncio
+    async def test_resume_from_checkpoint(self, tmp_path):
+        """Test that a restarted worker continues after the last checkpoint without duplicates."""
+        calls = []
+
+        def crash_on_second_chunk(texts, **kwargs):
+            calls.append(list(texts))
+            if len(calls) == 2:
+                raise asyncio.CancelledError()  # the process dies mid-job
+            return echo_model(texts)
+
+        jobs = make_jobs(tmp_path, Mock(side_effect=crash_on_second_chunk), chunk_size=2)
+        job = await jobs.submit_texts(["a", "bb", "ccc", "dddd", "eeeee"])
+        with pytest.raises(asyncio.CancelledError):
+            await run_next(jobs)
+        # A partial write after the checkpoint is discarded on resume
+        with open(tmp_path / job["id"] / "results.jsonl", "ab") as f:
+            f.write(b'{"line": 2, "label": "PARTIAL"')
+        assert jobs.status(job["id"])["status"] == "running"
+
+        model = Mock(side_effect=echo_model)
+        restarted = make_jobs(tmp_path, model, chunk_size=2)
+        await run_next(restarted)
+
+        assert [call.args[0] for call in model.call_args_list] == [["ccc", "dddd"], ["eeeee"]]
+        assert [r["line"] for r in read_results(restarted, job["id"])] == [0, 1, 2, 3, 4]
+        assert restarted.status(job["id"])["status"] == "completed"
+
+    @pytest.mark.asyncio
+    async def test_cancel_stops_after_chunk(self, tmp_path):
+        """Test that a cancelled job stops and keeps the results scored so far."""
+        jobs = make_jobs(tmp_path)
+        job = await jobs.submit_texts(["good", "bad"])
+        assert jobs.cancel(job["id"])["status"] == "cancelled"
+
+        await run_next(jobs)
+
+        assert jobs.status(job["id"])["status"] == "cancelled"
+        assert read_results(jobs, job["id"]) == []
+
+    @pytest.mark.asyncio
+    async def test_results_synced_before_checkpoint(self, tmp_path, monkeypatch):
+        """Test that results reach the disk before the checkpoint that counts them."""
+        import os
+        events = []
+        fsync = os.fsync
+
+        def record_fsync(fd):
+            events.append(os.path.basename(os.readlink(f"/proc/self/fd/{fd}")))
+            fsync(fd)
+
+        monkeypatch.setattr("app.jobs.os.fsync", record_fsync)
+        jobs = make_jobs(tmp_path, chunk_size=1)
+        job = await jobs.submit_texts(["good", "bad"])
+        events.clear()
+
+        await run_next(jobs)
+
+        assert events == ["state.json.tmp", "results.jsonl", "state.json.tmp", "results.jsonl",
+                         "state.json.tmp", "state.json.tmp"]
+
+    @pytest.mark.asyncio
+    async def test_claimed_job_not_shared(self, tmp_path):
+        """Test that a job locked by one worker is not picked up by another."""
+        jobs = make_jobs(tmp_path)
+        await jobs.submit_texts(["good"])
+        state, lock = jobs._claim()
+        try:
+            assert make_jobs(tmp_path)._claim() is None
+        finally:
+            lock.close()
+
+    @pytest.mark.asyncio
+    async def test_yields_to_interactive_requests(self, tmp_path):
+        """Test that jobs wait while interactive requests are busy, but not forever."""
+        jobs = make_jobs(tmp_path, max_yield_ms=50)
+
+        start = time.perf_counter()
+        await jobs._yield_to_interactive(Mock(busy=True))
+        assert time.perf_counter() - start >= 0.05
+
+        start = time.perf_counter()
+        await jobs._yield_to_interactive(Mock(busy=False))
+        assert time.perf_counter() - start < 0.05
+
+    @pytest.mark.asyncio
+    async def test_finished_jobs_expire_after_retention(self, tmp_path):
+        """Test that the scan deletes finished jobs past their retention and keeps the rest."""
+        jobs = make_jobs(tmp_path, retention_hours=1)
+        old = await jobs.submit_texts(["good"])
+        await run_next(jobs)
+        recent = await jobs.submit_texts(["bad"])
+        await run_next(jobs)
+        pending = await jobs.submit_texts(["fine"])
+        state = jobs._read_state(old["id"])
+        state["finished_at"] -= 2 * 3600
+        jobs._write_state(state)
+
+        state, lock = jobs._claim()
+        lock.close()
+
+        assert state["id"] == pending["id"]
+        assert not (tmp_path / old["id"]).exists()
+        assert jobs.status(recent["id"])["status"] == "completed"
+        assert jobs.jobs_expired == 1
+
+    @pytest.mark.asyncio
+    async def test_background_worker_runs_submitted_jobs(self, tmp_path):
+        """Test that the started worker picks up a new job without waiting for the poll."""
+        jobs = make_jobs(tmp_path, poll_seconds=60)
+        jobs.start()
+        try:
+            job = await jobs.submit_texts(["good"])
+            for _ in range(100):
+                if jobs.status(job["id"])["status"] == "completed":
+                    break
+                await asyncio.sleep(0.01)
+            assert jobs.status(job["id"])["status"] == "completed"
+        finally:
+            await jobs.stop()
@@ -0,0 +1,63 @@
+import io
+import json
+import logging
+import queue
+import sys
+from app.logs import AccessLog, DroppingQueueHandler, JsonFormatter, dumps
+
+
+class TestJsonLogging:
+    def test_dumps_matches_json(self):
+        """Test that records serialize to standard JSON."""
+        record = {"event": "request_completed", "status_code": 200, "duration_ms": 1.5}
+        assert json.loads(dumps(record)) == record
+
+    def test_formatter_serializes_dict_messages(self):
+        """Test that dict messages become JSON and strings pass through."""
+        formatter = JsonFormatter()
+        record = logging.LogRecord("test", logging.INFO, __file__, 1, {"a": 1}, None, None)
+        assert json.loads(formatter.format(record)) == {"a": 1}
+        record = logging.LogRecord("test", logging.INFO, __file__, 1, "plain", None, None)
+        assert formatter.format(record) == "plain"
+
+    def test_full_queue_drops_and_counts(self):
+        """Test that a full queue drops records instead of blocking."""
+        handler = DroppingQueueHandler(queue.Queue(maxsize=1))
+        for message in ("first", "second", "third"):
+            handler.handle(logging.LogRecord("test", logging.INFO, __file__, 1, message, None, None))
+
+        assert handler.queue.qsize() == 1
+        assert handler.dropped == 2
+
+
+class TestAccessLog:
+    def test_sampling_keeps_errors_and_slow_requests(self):
+        """Test that sampled-out successes never hide errors or slow requests."""
+        access_log = AccessLog(sample_rate=0.0, slow_request_ms=100, name="test.sampling")
+
+        assert access_log.should_log(200, 5) is False
+        assert access_log.should_log(404, 5) is True
+        assert access_log.should_log(500, 5) is True
+        assert access_log.should_log(200, 150) is True
+
+    def test_writes_to_stderr_by_default(self):
+        """Test that request logs stay on stderr, where logging wrote them before."""
+        assert AccessLog(name="test.default").output.stream is sys.stderr
+
+    def test_full_sample_rate_logs_everything(self):
+        """Test that the default rate logs every successful request."""
+        access_log = AccessLog(sample_rate=1.0, name="test.full")
+        assert all(access_log.should_log(200, 1) for _ in range(100))
+
+    def test_records_written_by_background_thread(self):
+        """Test that logged records reach the stream as JSON lines after stop."""
+        stream = io.StringIO()
+        access_log = AccessLog(stream=stream, name="test.writer")
+
+        access_log.log({"event": "request_completed", "status_code": 200})
+        access_log.log({"event": "request_completed", "status_code": 500})
+        access_log.stop()
+
+        lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+        assert [line["status_code"] for line in lines] == [200, 500]
+        assert access_log.dropped == 0
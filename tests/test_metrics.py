@@ -0,0 +1,73 @@
+import pytest
+from app.metrics import Histogram
+from app.middleware import MetricsCollector
+
+
+class TestHistogram:
+    def test_observe_fills_single_bucket(self):
+        """Test that each sample lands in the first bucket whose bound covers it."""
+        histogram = Histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+        histogram.observe(0.05)
+        histogram.observe(0.1)
+        histogram.observe(0.5)
+        histogram.observe(3.0)
+
+        text = histogram.render()
+
+        assert 'latency_seconds_bucket{le="0.1"} 2' in text
+        assert 'latency_seconds_bucket{le="1.0"} 3' in text
+        assert 'latency_seconds_bucket{le="+Inf"} 4' in text
+        assert "latency_seconds_count 4" in text
+        assert "# TYPE latency_seconds histogram" in text
+
+    def test_labels_are_tracked_separately(self):
+        """Test that each label combination gets its own series."""
+        histogram = Histogram("latency_seconds", "Latency", buckets=(1.0,), label_names=("route",))
+        histogram.observe(0.5, "/a")
+        histogram.observe(0.5, "/b")
+        histogram.observe(0.5, "/b")
+
+        text = histogram.render()
+
+        assert 'latency_seconds_count{route="/a"} 1' in text
+        assert 'latency_seconds_count{route="/b"} 2' in text
+        assert histogram.totals() == (1.5, 3)
+
+    def test_quantile_interpolates_within_bucket(self):
+        """Test that quantiles are estimated from bucket boundaries."""
+        histogram = Histogram("latency_seconds", "Latency", buckets=(0.1, 0.2, 0.4))
+        for _ in range(50):
+            histogram.observe(0.05)
+        for _ in range(50):
+            histogram.observe(0.3)
+
+        assert histogram.quantile(0.5) == pytest.approx(0.1)
+        assert histogram.quantile(0.99) == pytest.approx(0.2 + 0.2 * 49 / 50)
+        assert histogram.quantile(0.5, "missing") is None
+
+    def test_render_summary(self):
+        """Test that summaries expose p50/p95/p99 with sum and count."""
+        histogram = Histogram("latency_seconds", "Latency", buckets=(1.0,), label_names=("route",))
+        histogram.observe(0.5, "/a")
+
+        text = histogram.render_summary("latency_quantiles_seconds", "Latency quantiles")
+
+        assert "# TYPE latency_quantiles_seconds summary" in text
+        for q in ("0.5", "0.95", "0.99"):
+            assert f'latency_quantiles_seconds{{route="/a",quantile="{q}"}}' in text
+        assert 'latency_quantiles_seconds_count{route="/a"} 1' in text
+
+
+class TestMetricsCollector:
+    def test_record_latency_uses_status_class(self):
+        """Test that latencies are labelled by route, method and status class."""
+        collector = MetricsCollector()
+        collector.record_latency(20.0, route="/api/v1/analyze", method="POST", status_code=201)
+        collector.record_latency(40.0, route="/api/v1/analyze", method="POST", status_code=503)
+
+        text = collector.render_latency()
+
+        assert 'route="/api/v1/analyze",method="POST",status="2xx"' in text
+        assert 'route="/api/v1/analyze",method="POST",status="5xx"' in text
+        assert collector.get_average_latency() == pytest.approx(30.0)
+        assert collector.get_metrics_summary()["latency_samples"] == 2
@@ -0,0 +1,74 @@
+import io
+import pytest
+from app.logs import AccessLog
+from app.middleware import MetricsCollector, ObservabilityMiddleware
+
+
+def make_middleware(app):
+    """Wrap a raw ASGI app with a fresh collector and an in-memory access log."""
+    collector = MetricsCollector()
+    access_log = AccessLog(stream=io.StringIO(), name="test.middleware")
+    return ObservabilityMiddleware(app, collector, access_log), collector
+
+
+async def call(middleware, scope_type="http"):
+    """Invoke the middleware once and return the scope and sent messages."""
+    scope = {"type": scope_type, "method": "GET", "path": "/x", "headers": []}
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        sent.append(message)
+
+    await middleware(scope, receive, send)
+    return scope, sent
+
+
+async def ok_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+class TestObservabilityMiddleware:
+    @pytest.mark.asyncio
+    async def test_request_id_in_state_and_header(self):
+        """Test that the request id is shared between scope state and the response header."""
+        middleware, collector = make_middleware(ok_app)
+
+        scope, sent = await call(middleware)
+
+        headers = dict(sent[0]["headers"])
+        assert headers[b"x-request-id"].decode() == scope["state"]["request_id"]
+        assert collector.requests_total == 1
+        assert collector.errors_total == 0
+
+    @pytest.mark.asyncio
+    async def test_exception_counted_as_error(self):
+        """Test that unhandled exceptions are counted and re-raised."""
+        async def failing_app(scope, receive, send):
+            raise RuntimeError("boom")
+
+        middleware, collector = make_middleware(failing_app)
+
+        with pytest.raises(RuntimeError):
+            await call(middleware)
+
+        assert collector.requests_total == 1
+        assert collector.errors_total == 1
+        assert collector.request_duration.quantile(0.5, "unmatched", "GET", "5xx") is not None
+
+    @pytest.mark.asyncio
+    async def test_non_http_scopes_pass_through(self):
+        """Test that lifespan and websocket scopes are not measured."""
+        seen = []
+
+        async def app(scope, receive, send):
+            seen.append(scope["type"])
+
+        middleware, collector = make_middleware(app)
+        await call(middleware, scope_type="lifespan")
+
+        assert seen == ["lifespan"]
+        assert collector.requests_total == 0
@@ -1,10 +1,17 @@
 import pytest
 import asyncio
 from unittest.mock import Mock, patch, AsyncMock
-from app.models import ModelManager
+from app.models import ModelManager, ProcessPoolPipeline
 from app.exceptions import ModelError
 
 
+@pytest.fixture(autouse=True)
+def local_model_path():
+    """Resolve models to a fake local path so loading never touches the hub cache."""
+    with patch('app.backends.resolve_model_path', side_effect=lambda name, revision=None: name) as mock_resolve:
+        yield mock_resolve
+
+
 class TestModelManager:
     def test_init(self):
         """Test ModelManager initialization."""
@@ -14,8 +21,8 @@ class TestModelManager:
         assert manager.cache_dir == "./model_cache"
         assert manager.lock is not None
 
-    @patch('app.models.pipeline')
-    def test_load_model(self, mock_pipeline):
+    @patch('app.backends.pipeline')
+    def test_load_model(self, mock_pipeline, local_model_path):
         """Test private _load_model method."""
         mock_model = Mock()
         mock_pipeline.return_value = mock_model
@@ -23,14 +30,16 @@ class TestModelManager:
         manager = ModelManager()
         manager._load_model()
         
+        local_model_path.assert_called_once_with(manager.model_name, manager.model_revision)
         mock_pipeline.assert_called_once_with(
             "sentiment-analysis",
-            model=manager.model_name
+            model=manager.model_name,
+            model_kwargs={"use_safetensors": True}
         )
         assert manager.model == mock_model
 
     @pytest.mark.asyncio
-    @patch('app.models.pipeline')
+    @patch('app.backends.pipeline')
     async def test_get_model_lazy_loading(self, mock_pipeline):
         """Test that get_model loads model only once."""
         mock_model = Mock()
@@ -51,7 +60,7 @@ class TestModelManager:
         mock_pipeline.assert_called_once()  # Still only called once
 
     @pytest.mark.asyncio
-    @patch('app.models.pipeline')
+    @patch('app.backends.pipeline')
     async def test_get_model_concurrent_calls(self, mock_pipeline):
         """Test that concurrent calls to get_model only load once."""
         mock_model = Mock()
@@ -72,7 +81,7 @@ class TestModelManager:
         mock_pipeline.assert_called_once()
 
     @pytest.mark.asyncio
-    @patch('app.models.pipeline')
+    @patch('app.backends.pipeline')
     async def test_get_model_handles_exceptions(self, mock_pipeline):
         """Test that get_model handles loading exceptions."""
         mock_pipeline.side_effect = Exception("Model loading failed")
@@ -84,4 +93,214 @@ class TestModelManager:
             await manager.get_model()
         
         # Model should still be None after failed load
-        assert manager.model is None
\ No newline at end of file
+        assert manager.model is None
+
+    @pytest.mark.asyncio
+    async def test_predict_batches_texts(self):
+        """Test that predict sends all texts to the model in one call."""
+        mock_model = Mock()
+        mock_model.return_value = [
+            {"label": "POSITIVE", "score": 0.9},
+            {"label": "NEGATIVE", "score": 0.8}
+        ]
+        
+        manager = ModelManager()
+        manager.model = mock_model
+        
+        results = await manager.predict(["good", "bad"])
+        
+        assert [r["label"] for r in results] == ["POSITIVE", "NEGATIVE"]
+        mock_model.assert_called_once_with(["good", "bad"], batch_size=2, truncation=True)
+
+    @pytest.mark.asyncio
+    async def test_predict_result_count_mismatch(self):
+        """Test that predict rejects a model returning the wrong number of results."""
+        mock_model = Mock()
+        mock_model.return_value = [{"label": "POSITIVE", "score": 0.9}]
+        
+        manager = ModelManager()
+        manager.model = mock_model
+        
+        with pytest.raises(ModelError, match="1 results for 2 inputs"):
+            await manager.predict(["good", "bad"])
+
+    @pytest.mark.asyncio
+    @patch('app.backends.pipeline')
+    async def test_load_model_runs_in_executor(self, mock_pipeline):
+        """Test that model loading happens on an executor thread, not the event loop."""
+        import threading
+        load_threads = []
+        mock_pipeline.side_effect = lambda *args, **kwargs: load_threads.append(
+            threading.current_thread().name
+        ) or Mock()
+        
+        manager = ModelManager()
+        await manager.get_model()
+        
+        assert load_threads[0].startswith("inference")
+        manager.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_predict_does_not_block_event_loop(self):
+        """Test that a slow forward pass leaves the event loop free."""
+        import threading
+        release = threading.Event()
+        
+        def slow_model(texts, **kwargs):
+            release.wait(timeout=5)
+            return [{"label": "POSITIVE", "score": 0.9} for _ in texts]
+        
+        manager = ModelManager()
+        manager.model = slow_model
+        
+        prediction = asyncio.ensure_future(manager.predict(["slow"]))
+        
+        # Other coroutines keep running while inference is in progress
+        await asyncio.sleep(0.05)
+        assert not prediction.done()
+        
+        release.set()
+        results = await prediction
+        assert results[0]["label"] == "POSITIVE"
+        manager.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_token_lengths_uses_tokenizer(self):
+        """Test that token lengths come from the pipeline's tokenizer."""
+        mock_model = Mock()
+        mock_model.tokenizer.return_value = {"input_ids": [[101, 2, 102], [101, 102]]}
+        
+        manager = ModelManager()
+        manager.model = mock_model
+        
+        assert await manager.token_lengths(["a b", ""]) == [3, 2]
+        mock_model.tokenizer.assert_called_once_with(["a b", ""], truncation=True)
+        manager.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_predict_uses_prediction_cache(self):
+        """Test that repeated texts are served from the cache without a forward pass."""
+        from app.cache import PredictionCache
+        mock_model = Mock()
+        mock_model.side_effect = lambda texts, **kwargs: [
+            {"label": "POSITIVE", "score": 0.9} for _ in texts
+        ]
+        
+        manager = ModelManager()
+        manager.model = mock_model
+        manager.prediction_cache = PredictionCache(max_size=10, ttl_seconds=60)
+        
+        await manager.predict(["good", "great"])
+        results = await manager.predict(["great ", "new"])
+        
+        assert [r["label"] for r in results] == ["POSITIVE", "POSITIVE"]
+        # Only the unseen text reaches the model on the second call
+        mock_model.assert_called_with(["new"], batch_size=1, truncation=True)
+        assert manager.prediction_cache.hits == 1
+        manager.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_predict_uses_result_store(self, tmp_path):
+        """Test that results stored by an earlier process are reused and new ones written."""
+        from app.cache import PredictionCache
+        from app.store import ResultStore, model_identity
+        mock_model = Mock()
+        mock_model.side_effect = lambda texts, **kwargs: [
+            {"label": "POSITIVE", "score": 0.9} for _ in texts
+        ]
+        
+        previous = ModelManager()
+        previous.model = mock_model
+        previous.result_store = ResultStore(str(tmp_path / "results.db"), [model_identity(previous.model_name)])
+        await previous.predict(["good", "great"])
+        previous.shutdown()
+        
+        manager = ModelManager()
+        manager.model = mock_model
+        manager.prediction_cache = PredictionCache(max_size=10, ttl_seconds=60)
+        manager.result_store = ResultStore(str(tmp_path / "results.db"), [model_identity(manager.model_name)])
+        results = await manager.predict(["good", "new", "great"])
+        
+        assert [r["label"] for r in results] == ["POSITIVE"] * 3
+        mock_model.assert_called_with(["new"], batch_size=1, truncation=True)
+        assert manager.result_store.hits == 2
+        assert manager.result_store.writes == 1
+        # Store hits also fill the in-memory cache
+        assert len(manager.prediction_cache) == 3
+        manager.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_warmup_runs_each_sequence_length(self):
+        """Test that warmup runs one inference per length and marks the model ready."""
+        mock_model = Mock()
+        mock_model.side_effect = lambda texts, **kwargs: [
+            {"label": "POSITIVE", "score": 0.9} for _ in texts
+        ]
+        
+        manager = ModelManager()
+        manager.model = mock_model
+        assert manager.ready is False
+        
+        await manager.warmup([8, 32])
+        
+        assert mock_model.call_count == 2
+        word_counts = [len(call.args[0][0].split()) for call in mock_model.call_args_list]
+        assert word_counts == [6, 30]
+        assert manager.ready is True
+        assert manager.warmup_seconds is not None
+        assert manager.time_to_first_inference is not None
+        manager.shutdown()
+
+    @pytest.mark.asyncio
+    @patch('app.backends.pipeline')
+    async def test_lazy_load_marks_model_ready(self, mock_pipeline):
+        """Test that a model loaded on first use, without eager warmup, passes readiness."""
+        manager = ModelManager()
+        assert manager.ready is False
+
+        await manager.get_model()
+
+        assert manager.ready is True
+        manager.shutdown()
+
+    @pytest.mark.asyncio
+    @patch('app.backends.pipeline')
+    async def test_get_model_records_load_time(self, mock_pipeline):
+        """Test that loading records how long it took."""
+        manager = ModelManager()
+        assert manager.load_seconds is None
+        
+        await manager.get_model()
+        
+        assert manager.load_seconds >= 0
+        manager.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_predict_records_stage_timings(self):
+        """Test that an uninstrumented model call is timed as the forward stage."""
+        from app.timing import StageTimer
+        mock_model = Mock()
+        mock_model.return_value = [{"label": "POSITIVE", "score": 0.9}]
+        
+        manager = ModelManager()
+        manager.model = mock_model
+        timer = StageTimer()
+        
+        await manager.predict(["good"], timer=timer)
+        
+        assert list(timer.stages) == ["forward"]
+        assert manager.stage_duration.quantile(0.5, "forward") is not None
+        assert manager.batch_size.totals() == (1, 1)
+        manager.shutdown()
+
+
+class TestProcessPoolPipeline:
+    @patch('app.models.load_tokenizer')
+    @patch('app.models.ProcessPoolExecutor')
+    @patch('app.models.os.cpu_count', return_value=8)
+    def test_workers_split_the_cores(self, mock_cpus, mock_pool, mock_tokenizer):
+        """Test that each model process gets its share of torch threads and the parent a tokenizer."""
+        model = ProcessPoolPipeline("some-model", workers=4, backend="pytorch")
+
+        assert mock_pool.call_args.kwargs["initargs"] == ("some-model", "pytorch", 2)
+        assert model.tokenizer is mock_tokenizer.return_value
@@ -0,0 +1,109 @@
+import pytest
+import asyncio
+import threading
+import time
+from app.profiling import RequestProfiler, RequestProfilingMiddleware, SamplingProfiler, capture_cpu_profile
+
+
+def busy_loop(stop: threading.Event):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+class TestSamplingProfiler:
+    def test_samples_other_threads(self):
+        """Test that a busy thread's stack shows up in folded format."""
+        stop = threading.Event()
+        worker = threading.Thread(target=busy_loop, args=(stop,), name="busy-worker")
+        worker.start()
+        profiler = SamplingProfiler(interval=0.001)
+        try:
+            profiler.start()
+            time.sleep(0.1)
+            profiler.stop()
+        finally:
+            stop.set()
+            worker.join()
+
+        lines = profiler.collapsed().splitlines()
+        busy = [line for line in lines if line.startswith("busy-worker;")]
+        assert busy and any("busy_loop (test_profiling.py:" in line for line in busy)
+        # Each line is "frame;frame;... count"
+        assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+        assert not any(line.startswith("sampling-profiler;") for line in lines)
+        assert profiler.samples > 0
+
+    def test_stop_without_waiting(self):
+        """Test that a sampler stopped without joining exits and a restart samples again."""
+        profiler = SamplingProfiler(interval=0.001)
+        profiler.start()
+        first = profiler._thread
+        profiler.stop(wait=False)
+        profiler.start()
+        time.sleep(0.02)
+        profiler.stop()
+
+        first.join(1)
+        assert not first.is_alive()
+        assert profiler.samples > 0
+
+    def test_reset_clears_stacks(self):
+        """Test that reset drops accumulated samples."""
+        profiler = SamplingProfiler()
+        profiler.sample()
+        profiler.reset()
+        assert profiler.collapsed() == ""
+        assert profiler.samples == 0
+
+    @pytest.mark.asyncio
+    async def test_capture_cpu_profile_includes_event_loop(self):
+        """Test that a timed capture samples the event loop thread while it waits."""
+        content = await capture_cpu_profile(0.05, 0.005)
+        assert "_run_once (base_events.py:" in content
+
+
+    @pytest.mark.asyncio
+    async def test_capture_cpu_profile_joins_sampler_off_the_loop(self, monkeypatch):
+        """Test that waiting for the sampler thread to finish never blocks the event loop."""
+        import threading
+        stopped_on = []
+        stop = SamplingProfiler.stop
+
+        def record_stop(profiler, wait=True):
+            stopped_on.append(threading.get_ident())
+            stop(profiler, wait)
+
+        monkeypatch.setattr(SamplingProfiler, "stop", record_stop)
+        await capture_cpu_profile(0.01, 0.005)
+        assert stopped_on and threading.get_ident() not in stopped_on
+
+class TestRequestProfiler:
+    @pytest.mark.asyncio
+    async def test_every_nth_request_profiled(self):
+        """Test that only every Nth request runs under the sampler."""
+        request_profiler = RequestProfiler(every_n=3, interval=0.001)
+        running = []
+
+        async def app(scope, receive, send):
+            running.append(request_profiler.profiler.running)
+            await asyncio.sleep(0.01)
+
+        middleware = RequestProfilingMiddleware(app, request_profiler)
+        for _ in range(6):
+            await middleware({"type": "http"}, None, None)
+
+        assert running == [False, False, True, False, False, True]
+        assert request_profiler.summary()["profiled"] == 2
+        assert request_profiler.profiler.samples > 0
+        assert not request_profiler.profiler.running
+
+    @pytest.mark.asyncio
+    async def test_overlapping_requests_share_sampler(self):
+        """Test that the sampler keeps running until the last profiled request finishes."""
+        request_profiler = RequestProfiler(every_n=1, interval=0.001)
+        request_profiler.begin()
+        request_profiler.begin()
+        request_profiler.end()
+        assert request_profiler.profiler.running
+        request_profiler.end()
+        assert not request_profiler.profiler.running
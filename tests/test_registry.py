@@ -0,0 +1,142 @@
+import pytest
+import asyncio
+import time
+from unittest.mock import Mock, patch
+from app.batching import BatchScheduler
+from app.exceptions import ValidationError
+from app.models import ModelManager
+from app.registry import ModelRegistry, estimate_model_bytes
+
+
+def make_registry(models=("a", "b", "c"), budget=None):
+    """Create a registry whose default model is already loaded."""
+    default = ModelManager(model_name="default")
+    default.model = Mock()
+    return ModelRegistry(default, BatchScheduler(default), models=models, memory_budget_bytes=budget)
+
+
+def slow_pipeline(model_name, backend=None):
+    time.sleep(0.05)
+    return Mock(name=model_name)
+
+
+class TestModelRegistry:
+    def test_default_model_is_reused(self):
+        """Test that the default manager is registered rather than recreated."""
+        registry = make_registry()
+        assert registry.get().manager is registry.default
+        assert registry.get("default").manager is registry.default
+
+    def test_new_models_batch_at_the_default_size(self):
+        """Test that other models pick up the default scheduler's (autotuned) batch size."""
+        registry = make_registry()
+        registry.get().scheduler.max_batch_size = 24
+        assert registry.get("a").scheduler.max_batch_size == 24
+
+    def test_unknown_model_rejected(self):
+        """Test that only configured models can be requested."""
+        with pytest.raises(ValidationError):
+            make_registry().get("not-configured")
+
+    @pytest.mark.asyncio
+    @patch('app.models.build_pipeline', side_effect=slow_pipeline)
+    async def test_concurrent_loads_are_deduplicated(self, mock_build):
+        """Test that concurrent requests for an unloaded model share one load."""
+        registry = make_registry()
+
+        async def use():
+            async with registry.acquire("a") as entry:
+                return entry.manager
+
+        managers = await asyncio.gather(*(use() for _ in range(5)))
+
+        assert mock_build.call_count == 1
+        assert len(set(map(id, managers))) == 1
+        assert registry.loads["a"] == 1
+
+    @pytest.mark.asyncio
+    @patch('app.registry.estimate_model_bytes', return_value=100)
+    @patch('app.models.build_pipeline', side_effect=slow_pipeline)
+    async def test_least_recently_used_evicted_over_budget(self, mock_build, mock_size):
+        """Test that the least recently used model is evicted once the budget is exceeded."""
+        registry = make_registry(budget=350)
+
+        for name in ("a", "b", "a", "c"):
+            async with registry.acquire(name):
+                pass
+
+        # default (pinned) + a + c fit; b was least recently used
+        assert registry.resident() == ["default", "a", "c"]
+        assert registry.evictions["b"] == 1
+
+    @pytest.mark.asyncio
+    @patch('app.registry.estimate_model_bytes', return_value=100)
+    @patch('app.models.build_pipeline', side_effect=slow_pipeline)
+    async def test_models_in_use_are_not_evicted(self, mock_build, mock_size):
+        """Test that a model serving a request survives eviction."""
+        registry = make_registry(budget=150)
+
+        async with registry.acquire("a"):
+            async with registry.acquire("b"):
+                assert set(registry.resident()) == {"default", "a", "b"}
+
+        async with registry.acquire("c"):
+            pass
+        assert registry.resident() == ["default", "c"]
+
+    @pytest.mark.asyncio
+    @patch('app.registry.estimate_model_bytes', return_value=100)
+    @patch('app.models.build_pipeline', side_effect=slow_pipeline)
+    async def test_eviction_keeps_shared_result_store_open(self, mock_build, mock_size):
+        """Test that evicting a model does not close the result store the default model owns."""
+        registry = make_registry(budget=150)
+        registry.default.result_store = store = Mock()
+        registry.default.owns_result_store = True
+
+        for name in ("a", "b"):
+            async with registry.acquire(name):
+                pass
+
+        assert registry.evictions["a"] == 1
+        store.close.assert_not_called()
+        registry.default.shutdown()
+        store.close.assert_called_once_with()
+
+    def test_metrics_per_model(self):
+        """Test that load, eviction and residency metrics are labelled by model."""
+        content = make_registry().render_metrics()
+        assert 'app_model_loads_total{model="default"} 1' in content
+        assert 'app_model_resident{model="default"} 1' in content
+        assert 'app_model_resident{model="a"} 0' in content
+        assert 'app_model_evictions_total{model="b"} 0' in content
+
+
+class TestEstimateModelBytes:
+    def test_counts_torch_parameters(self):
+        """Test that a torch model's size is its parameter and buffer bytes."""
+        import torch
+        pipeline = Mock()
+        pipeline.model = torch.nn.Linear(10, 10)
+        assert estimate_model_bytes(pipeline) == (10 * 10 + 10) * 4
+
+    def test_counts_int8_packed_weights(self):
+        """Test that dynamically quantized layers are not counted as empty."""
+        import torch
+        pipeline = Mock()
+        pipeline.model = torch.ao.quantization.quantize_dynamic(
+            torch.nn.Sequential(torch.nn.Linear(64, 64)), {torch.nn.Linear}, dtype=torch.qint8
+        )
+        assert estimate_model_bytes(pipeline) >= 64 * 64
+
+    def test_process_pool_counts_every_worker_copy(self, tmp_path):
+        """Test that a process pool is sized from its weights files times its workers."""
+        from app.models import ProcessPoolPipeline
+        (tmp_path / "model.safetensors").write_bytes(b"x" * 1000)
+        pipeline = ProcessPoolPipeline.__new__(ProcessPoolPipeline)
+        pipeline.model_name = str(tmp_path)
+        pipeline.workers = 3
+        assert estimate_model_bytes(pipeline) == 3000
+
+    def test_unknown_models_report_zero(self):
+        """Test that models without weights to inspect are counted as zero."""
+        assert estimate_model_bytes(object()) == 0
@@ -0,0 +1,19 @@
+import pytest
+from unittest.mock import patch
+from app.serve import serve
+
+
+class TestServe:
+    @pytest.mark.parametrize("setting, value", [
+        ("inference_executor", "process"),
+        ("inference_backend", "onnx"),
+        ("autotune", "startup"),
+    ])
+    def test_unsupported_configuration_falls_back_to_uvicorn(self, setting, value):
+        """Test that configurations that cannot pre-fork still serve instead of exiting."""
+        with patch(f'app.serve.settings.{setting}', value), \
+                patch('app.serve._serve_uvicorn') as mock_uvicorn, \
+                patch('app.serve._fork_worker') as mock_fork:
+            serve()
+        mock_uvicorn.assert_called_once_with()
+        mock_fork.assert_not_called()
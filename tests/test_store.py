@@ -0,0 +1,107 @@
+import pytest
+import multiprocessing
+from app.store import ResultStore, model_identity
+
+MODEL = model_identity("model-a", "v1")
+
+
+def write_from_child(path):
+    ResultStore(path, models=[MODEL]).put_many(MODEL, {"child": {"label": "NEGATIVE", "score": 0.2}})
+
+
+@pytest.fixture
+def store_path(tmp_path):
+    return str(tmp_path / "results.db")
+
+
+class TestResultStore:
+    def test_bulk_put_and_get(self, store_path):
+        """Test that many results round-trip in one call and misses are omitted."""
+        store = ResultStore(store_path, models=[MODEL])
+        store.put_many(MODEL, {"a": {"label": "POSITIVE", "score": 0.9}, "b": {"label": "NEGATIVE", "score": 0.8}})
+
+        found = store.get_many(["a", "b", "c"])
+
+        assert found == {"a": {"label": "POSITIVE", "score": 0.9}, "b": {"label": "NEGATIVE", "score": 0.8}}
+        assert store.get_stats()["hits"] == 2
+        assert store.get_stats()["misses"] == 1
+        store.close()
+
+    def test_results_survive_restart(self, store_path):
+        """Test that a new store on the same file sees earlier results."""
+        store = ResultStore(store_path, models=[MODEL])
+        store.put_many(MODEL, {"a": {"label": "POSITIVE", "score": 0.9}})
+        store.close()
+
+        assert ResultStore(store_path, models=[MODEL]).get_many(["a"]) == {"a": {"label": "POSITIVE", "score": 0.9}}
+
+    def test_shared_between_processes(self, store_path):
+        """Test that a result written by another worker process is visible."""
+        store = ResultStore(store_path, models=[MODEL])
+        assert store.get_many(["child"]) == {}
+
+        process = multiprocessing.get_context("fork").Process(target=write_from_child, args=(store_path,))
+        process.start()
+        process.join(10)
+
+        assert store.get_many(["child"]) == {"child": {"label": "NEGATIVE", "score": 0.2}}
+        store.close()
+
+    def test_model_change_invalidates_results(self, store_path):
+        """Test that results of a model or revision no longer configured are deleted."""
+        old = ResultStore(store_path, models=[MODEL])
+        old.put_many(MODEL, {"a": {"label": "POSITIVE", "score": 0.9}})
+        old.close()
+
+        store = ResultStore(store_path, models=[model_identity("model-a", "v2")])
+
+        assert store.get_many(["a"]) == {}
+        assert len(store) == 0
+
+    def test_compaction_keeps_recently_read(self, store_path):
+        """Test that compaction drops the least recently read results beyond the limit."""
+        store = ResultStore(store_path, models=[MODEL], max_entries=2, compact_every=100)
+        store.put_many(MODEL, {"a": {"score": 1}})
+        store.put_many(MODEL, {"b": {"score": 2}})
+        store.put_many(MODEL, {"c": {"score": 3}})
+        store.get_many(["a"])
+
+        store.compact()
+
+        assert set(store.get_many(["a", "b", "c"])) == {"a", "c"}
+        assert store.compacted == 1
+        store.close()
+
+    def test_reads_do_not_write(self, store_path):
+        """Test that hits only buffer their read time until the next write."""
+        store = ResultStore(store_path, models=[MODEL])
+        store.put_many(MODEL, {"a": {"score": 1}})
+        conn = store._connect()
+        changes = conn.total_changes
+
+        store.get_many(["a"])
+
+        assert conn.total_changes == changes
+        assert list(store._touched) == ["a"]
+        store.put_many(MODEL, {"b": {"score": 2}})
+        assert store._touched == {}
+        store.close()
+
+    def test_compaction_runs_after_writes(self, store_path):
+        """Test that the store compacts itself once enough results were written."""
+        store = ResultStore(store_path, models=[MODEL], max_entries=3, compact_every=5)
+        store.put_many(MODEL, {str(i): {"score": i} for i in range(5)})
+
+        assert len(store) == 3
+        store.close()
+
+    def test_database_errors_are_misses(self, tmp_path):
+        """Test that an unusable database degrades to misses instead of raising."""
+        directory = tmp_path / "not-a-file"
+        directory.mkdir()
+        store = ResultStore(str(directory), models=[MODEL])
+
+        store.put_many(MODEL, {"a": {"score": 1}})
+
+        assert store.get_many(["a"]) == {}
+        assert store.get_stats()["errors"] == 2
@@ -0,0 +1,36 @@
+import os
+from unittest.mock import patch
+from app.system import _read_kb_fields, node_memory, process_memory, worker_id
+
+
+class TestSystemMemory:
+    def test_read_kb_fields_converts_to_bytes(self, tmp_path):
+        """Test that /proc style kB values are parsed into bytes."""
+        proc_file = tmp_path / "status"
+        proc_file.write_text("Name:\tpython\nVmRSS:\t  2048 kB\nThreads:\t4\n")
+
+        fields = _read_kb_fields(str(proc_file))
+
+        assert fields["VmRSS"] == 2048 * 1024
+        assert fields["Threads"] == 4
+        assert "Name" not in fields
+
+    def test_read_kb_fields_missing_file(self, tmp_path):
+        """Test that an unreadable file yields no fields instead of failing."""
+        assert _read_kb_fields(str(tmp_path / "missing")) == {}
+
+    def test_process_memory_reports_current_process(self):
+        """Test that the current process reports a non-zero resident size."""
+        memory = process_memory()
+        assert set(memory) == {"rss", "pss", "shared", "private"}
+        if os.path.exists("/proc/self/status"):
+            assert memory["rss"] > 0
+
+    def test_node_memory_keys(self):
+        """Test that node memory exposes total and available bytes."""
+        assert set(node_memory()) == {"total", "available"}
+
+    def test_worker_id_from_environment(self):
+        """Test that the worker id comes from the pre-fork server's environment."""
+        with patch.dict(os.environ, {"APP_WORKER_ID": "3"}):
+            assert worker_id() == "3"
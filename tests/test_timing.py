@@ -0,0 +1,62 @@
+import threading
+from unittest.mock import Mock
+from app.timing import StageTimer, activate, instrument_pipeline, server_timing_header, stage
+
+
+class TestStageTimer:
+    def test_stage_records_only_when_active(self):
+        """Test that stages are a no-op without an active timer."""
+        with stage("forward"):
+            pass
+
+        timer = StageTimer()
+        with activate(timer):
+            with stage("forward"):
+                pass
+            with stage("forward"):
+                pass
+
+        assert list(timer.stages) == ["forward"]
+        assert timer.stages["forward"] >= 0
+
+    def test_timer_is_thread_local(self):
+        """Test that a timer activated on one thread is not visible on another."""
+        timer = StageTimer()
+        other = StageTimer()
+
+        def work():
+            with activate(other):
+                with stage("tokenization"):
+                    pass
+
+        with activate(timer):
+            thread = threading.Thread(target=work)
+            thread.start()
+            thread.join()
+
+        assert timer.stages == {}
+        assert "tokenization" in other.stages
+
+
+class TestInstrumentPipeline:
+    def test_wraps_pipeline_steps_and_counts_tokens(self):
+        """Test that preprocess, forward and postprocess are timed and tokens counted."""
+        input_ids = Mock(shape=(1, 7))
+        pipeline = Mock()
+        pipeline.preprocess.return_value = {"input_ids": input_ids}
+
+        instrument_pipeline(pipeline)
+        timer = StageTimer()
+        with activate(timer):
+            pipeline.preprocess("text")
+            pipeline.preprocess("more text")
+            pipeline.forward({})
+            pipeline.postprocess({})
+
+        assert set(timer.stages) == {"tokenization", "forward", "postprocess"}
+        assert timer.tokens == 14
+
+    def test_server_timing_header_in_stage_order(self):
+        """Test that the header lists known stages in order, in milliseconds."""
+        header = server_timing_header({"forward": 0.0125, "queue_wait": 0.002})
+        assert header == "queue_wait;dur=2.00, forward;dur=12.50"